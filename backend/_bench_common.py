@@ -0,0 +1,54 @@
+"""
+計測スクリプト（bench_db_modes.py / load_test.py / profile_startup.py）の共通処理
+サーバー起動用の空きポート・起動待ち、パーセンタイル、計測結果に記録するリビジョンと --env の解析。
+httpx が必要です（requirements.txt）。
+"""
+
+import os
+import asyncio
+import re
+import socket
+import subprocess
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("サーバーが起動しませんでした")
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def parse_env(values: list) -> dict:
+    env = {}
+    for value in values:
+        if not re.match(r"^[A-Z_][A-Z0-9_]*=", value):
+            raise SystemExit(f"--env は KEY=VALUE の形式で指定してください: {value}")
+        key, _, setting = value.partition("=")
+        env[key] = setting
+    return env
@@ -0,0 +1,87 @@
+"""
+プロセス内キャッシュ
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLCache:
+    """件数上限（LRU）と有効期限（TTL）付きのスレッドセーフなキャッシュ"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 無効化のたびに進む世代番号（読み込み中に無効化された値を登録しないため）
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """現在の世代番号（DBから読み込む前に取得して set() に渡す）"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """キャッシュから取得（期限切れ・未登録の場合は None）"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> bool:
+        """キャッシュに登録（上限を超えた場合は最も古いものを破棄）
+
+        generation を指定した場合、その後に無効化があれば登録しない（古い値の再登録防止）
+        """
+        if self.maxsize <= 0:
+            return False
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return True
+
+    def values(self) -> list:
+        """有効期限内の値（登録・参照が古い順、ヒット数には数えない）"""
+        now = time.monotonic()
+        with self._lock:
+            return [value for value, expires_at in self._data.values() if expires_at > now]
+
+    def invalidate(self, key: Hashable) -> None:
+        """指定キーを無効化"""
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        """全エントリを無効化"""
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        """ヒット率などの統計情報"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -8,11 +8,90 @@ class Settings:
     # データベース設定
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./attendance.db")
     
+    # 非同期モード（主要エンドポイントのDBアクセスに aiosqlite / asyncpg を使う）
+    DB_ASYNC: bool = os.getenv("DB_ASYNC", "false").lower() == "true"
+    
+    # コネクションプール設定（ファイルベースのSQLite・PostgreSQL）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    
+    # SQLite PRAGMA設定（接続ごとに適用、cache_size は負の値でKiB指定）
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+    SQLITE_TEMP_STORE: str = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    
     # JWT設定
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # 認証ユーザーキャッシュ設定（件数上限・有効期限秒）
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+    # プロセス外での権限変更（共有世代）を確認する間隔ミリ秒（0で確認しない）
+    PRINCIPAL_GENERATION_CHECK_MS: float = float(os.getenv("PRINCIPAL_GENERATION_CHECK_MS", "1000"))
+    
+    # bcrypt設定（専用ワーカー数・待ち行列上限・起動時に調整するコストの目標時間）
+    BCRYPT_WORKERS: int = int(os.getenv("BCRYPT_WORKERS", "2"))
+    BCRYPT_MAX_QUEUE: int = int(os.getenv("BCRYPT_MAX_QUEUE", "16"))
+    BCRYPT_TARGET_MS: float = float(os.getenv("BCRYPT_TARGET_MS", "250"))
+    BCRYPT_MIN_ROUNDS: int = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+    BCRYPT_MAX_ROUNDS: int = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+    BCRYPT_ROUNDS: Optional[int] = int(os.getenv("BCRYPT_ROUNDS")) if os.getenv("BCRYPT_ROUNDS") else None
+    
+    # レポート設定（ストリーミング出力時に1回で読み込む行数）
+    REPORT_STREAM_BATCH_SIZE: int = int(os.getenv("REPORT_STREAM_BATCH_SIZE", "1000"))
+    
+    # ページネーション設定（limit未指定時の件数・上限件数）
+    PAGE_SIZE_DEFAULT: int = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+    PAGE_SIZE_MAX: int = int(os.getenv("PAGE_SIZE_MAX", "200"))
+    
+    # 打刻のグループコミット（まとめて書き込むまでの待ち時間ミリ秒・1回の最大件数）
+    PUNCH_GROUP_COMMIT: bool = os.getenv("PUNCH_GROUP_COMMIT", "false").lower() == "true"
+    PUNCH_BATCH_WINDOW_MS: float = float(os.getenv("PUNCH_BATCH_WINDOW_MS", "5"))
+    PUNCH_BATCH_MAX: int = int(os.getenv("PUNCH_BATCH_MAX", "64"))
+    
+    # 打刻イベントの勤怠記録・ロールアップへの反映（バックグラウンドで反映する間隔ミリ秒（0で無効）・1回に読むイベント数）
+    PUNCH_PROJECTION_INTERVAL_MS: float = float(os.getenv("PUNCH_PROJECTION_INTERVAL_MS", "1000"))
+    PUNCH_PROJECTION_BATCH: int = int(os.getenv("PUNCH_PROJECTION_BATCH", "5000"))
+    
+    # 打刻一括取り込み設定（1トランザクションあたりの勤怠記録数・レスポンスに含めるエラー行数・リクエストボディのバイト数の上限）
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+    IMPORT_MAX_ERRORS: int = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+    IMPORT_MAX_BYTES: int = int(os.getenv("IMPORT_MAX_BYTES", str(20 * 1024 * 1024)))
+    
+    # 始業時刻（HH:MM形式、これより後の出勤を遅刻として集計）
+    WORK_START_TIME: str = os.getenv("WORK_START_TIME", "09:00")
+    
+    # 所定労働時間（これを超えた労働時間を残業として集計）
+    STANDARD_WORK_HOURS: float = float(os.getenv("STANDARD_WORK_HOURS", "8"))
+    
+    # この件数以上のレポートはNumPyによる一括計算を使う
+    VECTORIZE_MIN_ROWS: int = int(os.getenv("VECTORIZE_MIN_ROWS", "5000"))
+    
+    # メトリクス（/metrics、トークン設定時は Authorization: Bearer <トークン> が必要）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN: Optional[str] = os.getenv("METRICS_TOKEN") or None
+    
+    # 遅いクエリのログ（この時間以上かかったクエリを警告ログに出力、0で無効）
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "200"))
+    
+    # クエリプロファイル（X-Query-Profile ヘッダー）の保存件数・保存秒数
+    QUERY_PROFILE_KEEP: int = int(os.getenv("QUERY_PROFILE_KEEP", "100"))
+    QUERY_PROFILE_TTL: float = float(os.getenv("QUERY_PROFILE_TTL", "3600"))
+    
+    # 管理者向けライブフィード（GET /admin/live）の接続ごとの待ち行列の上限・最大接続数・キープアライブの間隔（秒）
+    LIVE_FEED_QUEUE_SIZE: int = int(os.getenv("LIVE_FEED_QUEUE_SIZE", "100"))
+    LIVE_FEED_MAX_CLIENTS: int = int(os.getenv("LIVE_FEED_MAX_CLIENTS", "1000"))
+    LIVE_FEED_HEARTBEAT_SECONDS: float = float(os.getenv("LIVE_FEED_HEARTBEAT_SECONDS", "15"))
+    
+    # 起動時に未適用のマイグレーションを適用する（false の場合は python migrate.py で適用）
+    AUTO_MIGRATE: bool = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
+    
     # CORS設定
     ALLOWED_ORIGINS: list = ["*"]  # 本番環境では具体的なドメインを指定
     
@@ -1,18 +1,158 @@
 """
 データベース設定とセッション管理
 """
-from sqlalchemy import create_engine
+import time
+from typing import TYPE_CHECKING, Union
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from .config import settings
+from .query_log import record_query, record_query_error
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# 接続ごとに適用するPRAGMA（busy_timeout はジャーナルモード変更時のロック待ちにも効くよう先頭）
+SQLITE_PRAGMAS = {
+    "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    "journal_mode": settings.SQLITE_JOURNAL_MODE,
+    "synchronous": settings.SQLITE_SYNCHRONOUS,
+    "cache_size": settings.SQLITE_CACHE_SIZE,
+    "temp_store": settings.SQLITE_TEMP_STORE,
+    "mmap_size": settings.SQLITE_MMAP_SIZE,
+}
+
+# PRAGMAの読み出し値（数値）と設定名の対応
+_PRAGMA_NAMES = {
+    "synchronous": {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"},
+    "temp_store": {0: "DEFAULT", 1: "FILE", 2: "MEMORY"},
+}
+
+def _engine_options(database_url: str, async_mode: bool = False) -> dict:
+    """接続先に合わせたエンジン作成オプション"""
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite":
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_pre_ping": True,
+        }
+    options = {"connect_args": {"check_same_thread": False}}
+    if url.database and url.database != ":memory:" and "mode=memory" not in database_url:
+        # ファイルベースのSQLiteはQueuePool（インメモリは接続ごとに別DBになるため既定のまま）
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+        if async_mode:
+            # aiosqlite のファイルDBは既定で NullPool（毎回接続）のため明示する
+            options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+# 非同期モードで使うドライバ
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_database_url(database_url: str) -> str:
+    """DATABASE_URL を非同期ドライバのURLに変換"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"非同期モードに未対応のデータベースです: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """新しいSQLite接続にPRAGMAを適用"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+# 書き込み用セッションのトランザクション開始方法（execution_options の sqlite_begin）
+SQLITE_BEGIN_OPTION = "sqlite_begin"
+
+def _sqlite_begin(conn):
+    """sqlite_begin="IMMEDIATE" の接続では、トランザクションの開始時に書き込みロックを取る
+
+    読み込みから始まるトランザクションが後から書き込みロックに昇格しようとすると、
+    同時に書き込む他の接続と待ち合って busy_timeout 後に database is locked になるため、
+    書き込み用のセッションは最初に書き込みロックを取り、他の書き込みの完了を順に待つ。
+    それ以外の接続はドライバの既定（最初の書き込みの直前に BEGIN）のまま。
+    """
+    mode = conn.get_execution_options().get(SQLITE_BEGIN_OPTION)
+    if mode:
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+def is_lock_error(exc: BaseException) -> bool:
+    """ロック待ちのタイムアウト（SQLiteの database is locked など）か"""
+    return isinstance(exc, OperationalError) and "locked" in str(exc.orig).lower()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    record_query(statement, parameters, executemany, time.perf_counter() - started)
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    # before_cursor_execute の後に失敗した場合は after_cursor_execute が呼ばれないため取り除く
+    if started:
+        started.pop()
+    record_query_error(context.statement)
+
+def _listen_queries(engine) -> None:
+    """クエリの実行時間を query_log に記録（遅いクエリのログ・プロファイル・メトリクス）"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
 
 # SQLAlchemy エンジン作成
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(engine, "begin", _sqlite_begin)
+_listen_queries(engine)
+
+# 非同期エンジン（DB_ASYNC=true のときのみ作成、ドライバは requirements.txt 参照）
+async_engine = None
+AsyncSessionLocal = None
+AsyncWriteSessionLocal = None
+if settings.DB_ASYNC:
+    # 同期モードの起動時間に影響しないよう、非同期モードでのみ読み込む
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        async_database_url(settings.DATABASE_URL), **_engine_options(settings.DATABASE_URL, async_mode=True)
+    )
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        event.listen(async_engine.sync_engine, "begin", _sqlite_begin)
+    _listen_queries(async_engine.sync_engine)
+    # コミット後もレスポンス生成時に遅延読み込みが起きないよう expire_on_commit=False
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    # 書き込み用（打刻）: SQLiteでは BEGIN IMMEDIATE で書き込みを順に実行する
+    AsyncWriteSessionLocal = async_sessionmaker(
+        async_engine.execution_options(**{SQLITE_BEGIN_OPTION: "IMMEDIATE"}),
+        autoflush=False, expire_on_commit=False
+    )
 
 # セッションファクトリ
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 書き込み用（打刻イベントの反映）: SQLiteでは BEGIN IMMEDIATE で書き込みを順に実行する
+WriteSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine.execution_options(**{SQLITE_BEGIN_OPTION: "IMMEDIATE"})
+)
 
 # ベースクラス
 Base = declarative_base()
@@ -25,6 +165,66 @@ def get_db() -> Session:
     finally:
         db.close()
 
+async def get_async_db() -> "AsyncSession":
+    """非同期データベースセッションの依存性注入"""
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def get_async_write_db() -> "AsyncSession":
+    """読み込み・書き込みを1トランザクションで行う処理（打刻）の非同期データベースセッション"""
+    async with AsyncWriteSessionLocal() as session:
+        yield session
+
+# 主要エンドポイント（打刻・ログイン・レポート）が使うセッション（DB_ASYNC で切り替え）
+get_session = get_async_db if settings.DB_ASYNC else get_db
+get_write_session = get_async_write_db if settings.DB_ASYNC else get_db
+
+async def run_db(db: Union[Session, "AsyncSession"], fn, *args, **kwargs):
+    """セッションを第1引数に取る同期関数を実行
+
+    非同期セッションでは run_sync() によりイベントループ上で非同期ドライバを使い、
+    同期セッションではスレッドプールで実行する。
+    """
+    if isinstance(db, Session):
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+    return await db.run_sync(fn, *args, **kwargs)
+
+def upsert_insert(db: Session, model):
+    """接続先の方言に合わせた ON CONFLICT 対応の INSERT を返す"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise RuntimeError(f"UPSERTに未対応のデータベースです: {dialect}")
+
+def database_diagnostics() -> dict:
+    """接続先・コネクションプール・有効なPRAGMAの状態を返す"""
+    diagnostics = {
+        "dialect": engine.dialect.name,
+        "driver": engine.dialect.driver,
+        "pool": engine.pool.status(),
+        "async": settings.DB_ASYNC,
+    }
+    if async_engine is not None:
+        diagnostics["async_driver"] = async_engine.dialect.driver
+        diagnostics["async_pool"] = async_engine.pool.status()
+    if engine.dialect.name != "sqlite":
+        return diagnostics
+
+    pragmas = {}
+    with engine.connect() as conn:
+        for name, configured in SQLITE_PRAGMAS.items():
+            active = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+            pragmas[name] = {
+                "configured": configured,
+                "active": _PRAGMA_NAMES.get(name, {}).get(active, active),
+            }
+    diagnostics["sqlite_version"] = engine.dialect.dbapi.sqlite_version
+    diagnostics["pragmas"] = pragmas
+    return diagnostics
+
 def create_tables():
-    """全テーブルを作成"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """全テーブルを作成（未適用のマイグレーションを適用）"""
+    from .migrations import migrate
+    migrate(engine)
\ No newline at end of file
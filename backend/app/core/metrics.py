@@ -0,0 +1,205 @@
+"""
+メトリクス（Prometheusのテキスト形式で /metrics から出力）
+
+MetricsMiddleware がリクエストごとにルートのパステンプレート単位のレイテンシ・ステータスコード・
+処理中のリクエスト数を記録する。DBクエリの件数と時間は query_log.py がエンジンイベントから記録する。
+記録はロック付きの加算だけで外部ライブラリに依存しないため、本番環境でも有効のまま運用できる。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _format(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def render_samples(name: str, kind: str, help_text: str, samples: Dict[tuple, float],
+                   label_names: Tuple[str, ...] = ()) -> str:
+    """ラベルの値ごとの値をテキスト形式に変換（出力時に読み取る値用）"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for values, value in samples.items():
+        lines.append(f"{name}{_labels(label_names, values)} {_format(value)}")
+    return "\n".join(lines)
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    """単調増加するカウンタ"""
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+        return render_samples(self.name, self.kind, self.help, values, self.label_names)
+
+class Gauge(Counter):
+    """増減する値"""
+    kind = "gauge"
+
+    def dec(self, *label_values, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+    @contextmanager
+    def time(self, *label_values):
+        """with ブロックの実行時間（秒）を値に設定"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.set(time.perf_counter() - started, *label_values)
+
+class Histogram(_Metric):
+    """バケットごとの件数・合計・件数を持つヒストグラム"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # ラベルの値 -> [バケットごとの件数（+Inf を含む、累積しない）..., 合計]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """with ブロックの実行時間（秒）を記録"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self) -> str:
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = self._header()
+        for values, counts in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            labels = _labels(self.label_names, values)
+            lines.append(f"{self.name}_sum{labels} {_format(counts[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return "\n".join(lines)
+
+class MetricsRegistry:
+    """メトリクスの一覧（登録順に出力）"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self, extra: Iterable[str] = ()) -> str:
+        """全メトリクスをテキスト形式で出力（extra は出力時に読み取った値）"""
+        return "\n".join([metric.render() for metric in self._metrics] + list(extra)) + "\n"
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "HTTPリクエスト数", ("method", "route", "status")))
+REQUEST_DURATION = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTPリクエストの処理時間（レスポンス送信完了まで）", ("method", "route")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "処理中のHTTPリクエスト数"))
+REQUEST_DB_QUERIES = registry.register(Histogram(
+    "http_request_db_queries", "1リクエストあたりのDBクエリ数", ("method", "route"), COUNT_BUCKETS))
+REQUEST_DB_DURATION = registry.register(Histogram(
+    "http_request_db_duration_seconds", "1リクエストあたりのDBクエリ時間の合計", ("method", "route")))
+DB_QUERY_DURATION = registry.register(Histogram(
+    "db_query_duration_seconds", "DBクエリの実行時間", ("statement",), QUERY_BUCKETS))
+DB_QUERY_ERRORS = registry.register(Counter(
+    "db_query_errors_total", "エラーになったDBクエリ数", ("statement",)))
+BCRYPT_DURATION = registry.register(Histogram(
+    "bcrypt_duration_seconds", "bcryptの処理時間", ("operation",)))
+BCRYPT_IN_FLIGHT = registry.register(Gauge(
+    "bcrypt_in_flight", "bcrypt専用プールで実行中・待機中の件数"))
+BCRYPT_REJECTED = registry.register(Counter(
+    "bcrypt_rejected_total", "bcryptの待ち行列が上限に達して拒否したリクエスト数"))
+STARTUP_DURATION = registry.register(Gauge(
+    "app_startup_seconds", "起動処理の各段階の所要時間", ("phase",)))
+
+class MetricsMiddleware:
+    """リクエストのレイテンシ・ステータスコードを記録するASGIミドルウェア
+
+    ラベルにはルートのパステンプレート（/correction-request/{request_id}/approve など）を使い、
+    どのルートにも一致しないリクエストは "unmatched" にまとめる。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_DURATION.observe(elapsed, method, route)
@@ -0,0 +1,348 @@
+"""
+バージョン管理付きのスキーマ変更（マイグレーション）
+
+適用済みのマイグレーションは schema_migrations テーブルに記録する。
+起動時は check_schema() で適用済みの最新バージョンを1回だけ確認し、
+スキーマの作成・変更は `python migrate.py` で明示的に行う（AUTO_MIGRATE=true で起動時にも適用）。
+マイグレーションは MIGRATIONS の末尾に追加し、既存のデータベースに対して安全に実行できるように書く。
+各バージョンのテーブル・インデックスは、そのバージョン時点の定義をこのモジュールに固定して持つ
+（現在のモデルから作成すると、新規のデータベースでは以降のマイグレーションが空振りするため）。
+旧版 backend/main.py が作成したデータベースにも既にテーブルがあるため、作成は存在確認をしてから行う。
+このモジュールは app.core.database に依存しないため、
+レガシーな backend/main.py からも利用できる。
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    bindparam, func, inspect, select, text,
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+ATTENDANCE_UNIQUE_INDEX = "ux_attendance_records_user_date"
+
+def _has_index(conn: Connection, table: str, name: str) -> bool:
+    return any(ix["name"] == name for ix in inspect(conn).get_indexes(table))
+
+def _has_column(conn: Connection, table: str, name: str) -> bool:
+    return any(column["name"] == name for column in inspect(conn).get_columns(table))
+
+def merge_duplicate_attendance_records(conn: Connection) -> int:
+    """同一ユーザー・同一日付の重複勤怠記録を1件に統合し、削除件数を返す
+
+    最小IDの記録を残し、出勤・休憩開始は最も早い時刻、退勤・休憩終了は
+    最も遅い時刻を採用する。メモは結合し、修正申請の参照は残す記録へ付け替える。
+    """
+    groups = conn.execute(text(
+        "SELECT user_id, date FROM attendance_records "
+        "GROUP BY user_id, date HAVING COUNT(*) > 1"
+    )).fetchall()
+
+    removed = 0
+    for user_id, date in groups:
+        rows = conn.execute(text(
+            "SELECT id, clock_in, clock_out, break_start, break_end, notes "
+            "FROM attendance_records WHERE user_id = :user_id AND date = :date ORDER BY id"
+        ), {"user_id": user_id, "date": date}).fetchall()
+
+        keep_id = rows[0].id
+        drop_ids = [row.id for row in rows[1:]]
+
+        def pick(column, chooser):
+            values = [getattr(row, column) for row in rows if getattr(row, column) is not None]
+            return chooser(values) if values else None
+
+        notes = [row.notes for row in rows if row.notes]
+        conn.execute(text(
+            "UPDATE attendance_records SET clock_in = :clock_in, clock_out = :clock_out, "
+            "break_start = :break_start, break_end = :break_end, notes = :notes WHERE id = :id"
+        ), {
+            "id": keep_id,
+            "clock_in": pick("clock_in", min),
+            "clock_out": pick("clock_out", max),
+            "break_start": pick("break_start", min),
+            "break_end": pick("break_end", max),
+            "notes": "\n".join(notes) if notes else None,
+        })
+
+        for drop_id in drop_ids:
+            conn.execute(text(
+                "UPDATE correction_requests SET attendance_record_id = :keep_id "
+                "WHERE attendance_record_id = :drop_id"
+            ), {"keep_id": keep_id, "drop_id": drop_id})
+            conn.execute(text("DELETE FROM attendance_records WHERE id = :id"), {"id": drop_id})
+        removed += len(drop_ids)
+
+    return removed
+
+# 各バージョン時点のスキーマ（適用済みのものは変更しない。モデルの変更は新しいバージョンで追加する）
+_schema = MetaData()
+
+# version 1: 初期スキーマ
+_users = Table(
+    "users", _schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String, unique=True, index=True, nullable=False),
+    Column("email", String, unique=True, index=True, nullable=False),
+    Column("hashed_password", String, nullable=False),
+    Column("full_name", String, nullable=False),
+    Column("is_admin", Boolean),
+    Column("created_at", DateTime),
+)
+_attendance_records = Table(
+    "attendance_records", _schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("date", String, nullable=False),
+    Column("clock_in", DateTime),
+    Column("clock_out", DateTime),
+    Column("break_start", DateTime),
+    Column("break_end", DateTime),
+    Column("notes", Text),
+    Column("status", String),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+_correction_requests = Table(
+    "correction_requests", _schema,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("attendance_record_id", Integer, ForeignKey("attendance_records.id")),
+    Column("requested_date", String, nullable=False),
+    Column("requested_clock_in", DateTime),
+    Column("requested_clock_out", DateTime),
+    Column("requested_break_start", DateTime),
+    Column("requested_break_end", DateTime),
+    Column("requested_notes", Text),
+    Column("reason", Text, nullable=False),
+    Column("status", String),
+    Column("admin_notes", Text),
+    Column("approved_by", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+# version 3: 申請一覧のキーセットページネーション用（version 1 のテーブルに含めないよう名前と列で持つ）
+_CORRECTION_REQUEST_INDEXES = [
+    ("ix_correction_requests_user_created", "user_id, created_at, id"),
+    ("ix_correction_requests_status_created", "status, created_at, id"),
+    ("ix_correction_requests_created", "created_at, id"),
+]
+
+# version 4: ユーザー別・月別の勤怠集計
+_monthly_attendance_rollups = Table(
+    "monthly_attendance_rollups", _schema,
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("month", String, primary_key=True),
+    Column("record_count", Integer, nullable=False),
+    Column("worked_seconds", Float, nullable=False),
+    Column("break_seconds", Float, nullable=False),
+    Column("days_present", Integer, nullable=False),
+    Column("late_count", Integer, nullable=False),
+    Column("absent_count", Integer, nullable=False),
+    Column("updated_at", DateTime),
+)
+
+# version 6: 勤怠記録への管理操作の監査ログ
+_audit_events = Table(
+    "audit_events", _schema,
+    Column("id", Integer, primary_key=True),
+    Column("actor_id", Integer, ForeignKey("users.id")),
+    Column("action", String, nullable=False),
+    Column("target_type", String, nullable=False),
+    Column("target_id", Integer, nullable=False),
+    Column("correction_request_id", Integer, ForeignKey("correction_requests.id")),
+    Column("reason", Text),
+    Column("before", JSON(none_as_null=True)),
+    Column("after", JSON(none_as_null=True)),
+    Column("created_at", DateTime, nullable=False),
+    Index("ix_audit_events_target", "target_type", "target_id", "created_at", "id"),
+    Index("ix_audit_events_created", "created_at", "id"),
+)
+
+# version 7: 打刻・修正のイベントログ
+_punch_events = Table(
+    "punch_events", _schema,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+    Column("date", String, nullable=False),
+    Column("seq", Integer, nullable=False),
+    Column("action", String, nullable=False),
+    Column("occurred_at", DateTime, nullable=False),
+    Column("notes", Text),
+    Column("state", JSON(none_as_null=True)),
+    Column("actor_id", Integer, ForeignKey("users.id")),
+    Column("created_at", DateTime, nullable=False),
+    Index("ux_punch_events_user_date_seq", "user_id", "date", "seq", unique=True),
+)
+
+# version 10: 認証ユーザーキャッシュの共有世代（1行のみ）
+_principal_generation = Table(
+    "principal_generation", _schema,
+    Column("id", Integer, primary_key=True),
+    Column("generation", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+def _create_tables(conn: Connection) -> None:
+    for table in (_users, _attendance_records, _correction_requests):
+        table.create(bind=conn, checkfirst=True)
+
+def _attendance_unique_index(conn: Connection) -> None:
+    if _has_index(conn, "attendance_records", ATTENDANCE_UNIQUE_INDEX):
+        return
+    merge_duplicate_attendance_records(conn)
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {ATTENDANCE_UNIQUE_INDEX} "
+        "ON attendance_records (user_id, date)"
+    ))
+
+def _create_missing_indexes(conn: Connection) -> None:
+    for name, columns in _CORRECTION_REQUEST_INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON correction_requests ({columns})"))
+
+def _create_rollups(conn: Connection) -> None:
+    # テーブルのみ作成し、この時点では空のまま（集計は break_seconds 列を使うため、
+    # 勤怠記録の列がそろう version 8 で既存の記録から作成する）
+    _monthly_attendance_rollups.create(bind=conn, checkfirst=True)
+
+def _clamp_future_updated_at(conn: Connection) -> None:
+    # 以前の打刻は updated_at を現地時刻で記録していたため、UTC より先の時刻を現在時刻（UTC）にそろえる
+    # （勤怠記録の ETag は updated_at の最大値で変更を検出する）
+    now = datetime.utcnow()
+    conn.execute(text(
+        "UPDATE attendance_records SET updated_at = :now WHERE updated_at > :now"
+    ).bindparams(bindparam("now", type_=DateTime)), {"now": now})
+
+def _create_audit_events(conn: Connection) -> None:
+    _audit_events.create(bind=conn, checkfirst=True)
+
+def _create_punch_events(conn: Connection) -> None:
+    _punch_events.create(bind=conn, checkfirst=True)
+
+# version 8: 月別ロールアップの作成（version 8 時点の勤怠記録の列と集計規則で固定）
+# （休憩時間は break_seconds があればそれを、なければ break_start〜break_end。出勤・退勤の両方がある記録のみ計上）
+_ROLLUP_BACKFILL = """
+INSERT INTO monthly_attendance_rollups
+    (user_id, month, record_count, worked_seconds, break_seconds, days_present, late_count, absent_count, updated_at)
+SELECT user_id, month, COUNT(id), COALESCE(SUM(span - break_total), 0), COALESCE(SUM(break_total), 0),
+       COUNT(DISTINCT CASE WHEN clock_in IS NOT NULL THEN date END), COALESCE(SUM(late), 0), COALESCE(SUM(absent), 0), :now
+FROM (
+    SELECT r.id, r.user_id, r.date, r.clock_in, SUBSTR(r.date, 1, 7) AS month,
+           CASE WHEN r.clock_in IS NOT NULL AND r.clock_out IS NOT NULL
+                THEN {clock_span} ELSE 0 END AS span,
+           CASE WHEN r.clock_in IS NULL OR r.clock_out IS NULL THEN 0
+                WHEN r.break_seconds IS NOT NULL THEN r.break_seconds
+                WHEN r.break_start IS NOT NULL AND r.break_end IS NOT NULL THEN {break_span}
+                ELSE 0 END AS break_total,
+           CASE WHEN r.status = 'late' THEN 1
+                WHEN r.clock_in IS NOT NULL AND {clock_in_time} > :work_start THEN 1
+                ELSE 0 END AS late,
+           CASE WHEN r.status = 'absent' OR r.clock_in IS NULL THEN 1 ELSE 0 END AS absent
+    FROM attendance_records r JOIN users u ON u.id = r.user_id
+) records
+GROUP BY user_id, month
+"""
+
+def _seconds_sql(dialect: str, start: str, end: str) -> str:
+    if dialect == "postgresql":
+        return f"EXTRACT(EPOCH FROM ({end} - {start}))"
+    return f"(julianday({end}) - julianday({start})) * 86400"
+
+def _attendance_break_seconds(conn: Connection) -> None:
+    # 複数回の休憩の合計（NULL の記録は従来どおり break_start〜break_end を休憩時間とする）
+    if not _has_column(conn, "attendance_records", "break_seconds"):
+        conn.execute(text("ALTER TABLE attendance_records ADD COLUMN break_seconds FLOAT"))
+    # version 4 で作成したロールアップを勤怠記録から作成する（既存の行は作り直す）
+    from .config import settings
+    dialect = conn.dialect.name
+    clock_in_time = (
+        "TO_CHAR(r.clock_in, 'HH24:MI:SS')" if dialect == "postgresql" else "strftime('%H:%M:%S', r.clock_in)"
+    )
+    conn.execute(text("DELETE FROM monthly_attendance_rollups"))
+    conn.execute(text(_ROLLUP_BACKFILL.format(
+        clock_span=_seconds_sql(dialect, "r.clock_in", "r.clock_out"),
+        break_span=_seconds_sql(dialect, "r.break_start", "r.break_end"),
+        clock_in_time=clock_in_time,
+    )).bindparams(bindparam("now", type_=DateTime)), {
+        "now": datetime.utcnow(), "work_start": settings.WORK_START_TIME + ":00",
+    })
+
+def _punch_events_projected(conn: Connection) -> None:
+    # 勤怠記録に反映済みかをイベントごとのフラグで持つ（反映は services/punch_projection.py が後から行う）
+    # これまでの打刻は勤怠記録と同じトランザクションで反映済みのため、既存のイベントは反映済みにする
+    false, true = ("0", "1") if conn.dialect.name == "sqlite" else ("FALSE", "TRUE")
+    if not _has_column(conn, "punch_events", "projected"):
+        conn.execute(text(f"ALTER TABLE punch_events ADD COLUMN projected BOOLEAN NOT NULL DEFAULT {false}"))
+        conn.execute(text(f"UPDATE punch_events SET projected = {true}"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_punch_events_unprojected "
+        f"ON punch_events (user_id, date) WHERE projected = {false}"
+    ))
+
+def _create_principal_generation(conn: Connection) -> None:
+    _principal_generation.create(bind=conn, checkfirst=True)
+    if conn.execute(text("SELECT COUNT(*) FROM principal_generation")).scalar() == 0:
+        conn.execute(_principal_generation.insert().values(id=1, generation=0, updated_at=datetime.utcnow()))
+
+# (バージョン, 名前, 適用する関数) ※追加のみ。適用済みのものは変更しない
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create_tables", _create_tables),
+    (2, "attendance_records_user_date_unique", _attendance_unique_index),
+    (3, "create_missing_indexes", _create_missing_indexes),
+    (4, "create_monthly_rollups", _create_rollups),
+    (5, "attendance_records_updated_at_utc", _clamp_future_updated_at),
+    (6, "create_audit_events", _create_audit_events),
+    (7, "create_punch_events", _create_punch_events),
+    (8, "attendance_records_break_seconds", _attendance_break_seconds),
+    (9, "punch_events_projected", _punch_events_projected),
+    (10, "create_principal_generation", _create_principal_generation),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(engine: Engine) -> int:
+    """適用済みの最新バージョン（未管理のデータベースは 0）"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+    except DBAPIError:
+        # schema_migrations テーブルがない（存在確認のクエリを省くため例外で判定する）
+        return 0
+
+def migrate(engine: Engine) -> List[str]:
+    """未適用のマイグレーションを順に適用し、適用した名前を返す（1件ごとにコミット）"""
+    schema_migrations.create(bind=engine, checkfirst=True)
+    version = current_version(engine)
+    applied = []
+    for number, name, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            apply(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=number, name=name, applied_at=datetime.utcnow()
+            ))
+        applied.append(name)
+    return applied
+
+def check_schema(engine: Engine, auto_migrate: bool = False) -> int:
+    """起動時のスキーマ確認（クエリ1回）。古い場合は auto_migrate なら適用し、そうでなければエラー"""
+    version = current_version(engine)
+    if version >= LATEST_VERSION:
+        return version
+    if auto_migrate:
+        migrate(engine)
+        return LATEST_VERSION
+    raise RuntimeError(
+        f"データベースのスキーマが古いです（バージョン {version} / 最新 {LATEST_VERSION}）。"
+        "'python migrate.py' を実行してください"
+    )
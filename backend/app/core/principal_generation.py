@@ -0,0 +1,27 @@
+"""
+認証ユーザーキャッシュの共有世代（プロセス間の無効化）
+
+認証ユーザーキャッシュ（security.principal_cache）はワーカープロセスごとのため、
+APIの外（create_admin.py・旧版 backend/main.py・他のワーカー）でユーザーの権限を変更しても無効化されない。
+権限を変更する処理は同じトランザクションで bump_principal_generation() を呼び、
+APIの各プロセスは PRINCIPAL_GENERATION_CHECK_MS ごとに世代を読み、変わっていればキャッシュを空にする。
+このモジュールは app.core.database に依存しないため、管理スクリプト・旧版の backend/main.py からも利用できる。
+"""
+from datetime import datetime
+from typing import Union
+
+from sqlalchemy import DateTime, bindparam, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+Bind = Union[Session, Connection]
+
+def bump_principal_generation(bind: Bind) -> None:
+    """世代を進める（ユーザーの権限を変更するトランザクション内で呼ぶ。コミットは呼び出し側）"""
+    bind.execute(text(
+        "UPDATE principal_generation SET generation = generation + 1, updated_at = :now WHERE id = 1"
+    ).bindparams(bindparam("now", type_=DateTime)), {"now": datetime.utcnow()})
+
+def read_principal_generation(bind: Bind) -> int:
+    """現在の世代"""
+    return bind.execute(text("SELECT generation FROM principal_generation WHERE id = 1")).scalar()
@@ -0,0 +1,209 @@
+"""
+SQLクエリの記録（遅いクエリのログ・リクエストごとのプロファイル）
+
+database.py のエンジンイベントが全クエリの実行時間を record_query() に渡す。
+- SLOW_QUERY_MS 以上かかったクエリは、発生元のルート・パラメータの形とともに警告ログに出力する
+- 管理者が X-Query-Profile: 1 ヘッダー付きでリクエストすると、そのリクエストのクエリを記録し、
+  件数・合計時間・重複（同じSQLの繰り返し）と最も遅いクエリの実行計画（EXPLAIN）を
+  プロファイルとして保存する。レスポンスには X-Query-Profile-Id などのヘッダーを付け、
+  内容は GET /admin/query-profiles/{id} で取得する
+- リクエストごとのクエリ数・時間はメトリクスにも記録する
+プロファイルはレスポンスの送信開始までのクエリが対象（ストリーミング中のクエリは含まない）。
+"""
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+
+from .cache import TTLCache
+from .config import settings
+from .metrics import DB_QUERY_DURATION, DB_QUERY_ERRORS, REQUEST_DB_DURATION, REQUEST_DB_QUERIES
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Query-Profile"
+PROFILE_ID_HEADER = "X-Query-Profile-Id"
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_TIME_HEADER = "X-Query-Time-Ms"
+
+STATEMENT_TYPES = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+# プロファイルに保存するクエリ数・SQLの文字数の上限
+_MAX_STATEMENTS = 500
+_MAX_SQL_LENGTH = 2000
+
+# 保存済みプロファイル（ID -> 内容）
+query_profiles = TTLCache(maxsize=settings.QUERY_PROFILE_KEEP, ttl=settings.QUERY_PROFILE_TTL)
+
+class RequestQueries:
+    """1リクエスト分のクエリの集計（profile が True の場合は各クエリも記録）"""
+    __slots__ = ("scope", "count", "seconds", "profile", "statements", "slowest", "user")
+
+    def __init__(self, scope: dict, profile: bool = False):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.profile = profile
+        self.statements = []
+        self.slowest = None  # (秒, SQL, パラメータ)
+        self.user = None
+
+    def route(self) -> str:
+        route = getattr(self.scope.get("route"), "path", None) or "unmatched"
+        return f"{self.scope.get('method', '')} {route}"
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+def statement_type(statement: str) -> str:
+    head = statement[:32].lstrip()[:6].upper()
+    return head if head in STATEMENT_TYPES else "OTHER"
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """パラメータの形（件数、executemany の場合は 行数x件数）"""
+    if executemany:
+        rows = len(parameters)
+        return f"{rows}x{len(parameters[0]) if rows else 0}"
+    return str(len(parameters)) if parameters else "0"
+
+def set_request_user(user) -> None:
+    """認証済みユーザーを記録（プロファイルの権限確認に使う）"""
+    current = _current.get()
+    if current is not None:
+        current.user = user
+
+def record_query(statement: str, parameters, executemany: bool, elapsed: float) -> None:
+    """クエリ1件の実行時間を記録（エンジンイベントから呼ばれる）"""
+    if settings.METRICS_ENABLED:
+        DB_QUERY_DURATION.observe(elapsed, statement_type(statement))
+    current = _current.get()
+    if current is not None:
+        current.count += 1
+        current.seconds += elapsed
+        if current.profile:
+            if len(current.statements) < _MAX_STATEMENTS:
+                current.statements.append((statement, parameters_shape(parameters, executemany), elapsed))
+            if current.slowest is None or elapsed > current.slowest[0]:
+                current.slowest = (elapsed, statement, parameters[0] if executemany and parameters else parameters)
+
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning(
+            "遅いクエリ %.1fms (%s, パラメータ %s): %s",
+            elapsed * 1000,
+            current.route() if current is not None else "リクエスト外",
+            parameters_shape(parameters, executemany),
+            " ".join(statement.split())[:_MAX_SQL_LENGTH],
+        )
+
+def record_query_error(statement: Optional[str]) -> None:
+    """エラーになったクエリを記録"""
+    if settings.METRICS_ENABLED:
+        DB_QUERY_ERRORS.inc(statement_type(statement or ""))
+
+def explain(statement: str, parameters) -> dict:
+    """クエリの実行計画（SQLiteは EXPLAIN QUERY PLAN、それ以外は EXPLAIN）"""
+    from .database import engine
+
+    # 実行計画の取得自体はリクエストのクエリとして数えない
+    _current.set(None)
+    sqlite = engine.dialect.name == "sqlite"
+    try:
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql(
+                ("EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN ") + statement,
+                parameters if parameters is not None else ()
+            ).fetchall()
+    except Exception as e:
+        return {"plan": [], "full_scans": [], "error": str(e)}
+    plan = [row[-1] if sqlite else row[0] for row in rows]
+    return {
+        "plan": plan,
+        # インデックスを使わないテーブルの全件走査
+        "full_scans": [line for line in plan if sqlite and line.startswith("SCAN") and "USING" not in line],
+    }
+
+def build_profile(current: RequestQueries, elapsed: float) -> dict:
+    """記録したクエリからプロファイルを作成（実行計画を除く）"""
+    groups = {}
+    for statement, _, seconds in current.statements:
+        group = groups.setdefault(statement, [0, 0.0])
+        group[0] += 1
+        group[1] += seconds
+    duplicates = sorted(
+        ({"statement": statement[:_MAX_SQL_LENGTH], "count": count, "total_ms": round(seconds * 1000, 3)}
+         for statement, (count, seconds) in groups.items() if count > 1),
+        key=lambda d: d["count"], reverse=True
+    )
+    return {
+        "id": uuid.uuid4().hex,
+        "route": current.route(),
+        "path": current.scope.get("path"),
+        "query_string": current.scope.get("query_string", b"").decode("latin-1"),
+        "user": getattr(current.user, "username", None),
+        "created_at": datetime.utcnow().isoformat(),
+        "request_ms": round(elapsed * 1000, 3),
+        "query_count": current.count,
+        "query_ms": round(current.seconds * 1000, 3),
+        "duplicates": duplicates,
+        "statements": [
+            {"statement": statement[:_MAX_SQL_LENGTH], "parameters": shape, "ms": round(seconds * 1000, 3)}
+            for statement, shape, seconds in current.statements
+        ],
+        "slowest": None,
+    }
+
+class QueryLogMiddleware:
+    """リクエストごとのクエリを集計し、管理者が要求した場合はプロファイルを作成するASGIミドルウェア"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = any(
+            name.lower() == PROFILE_HEADER.lower().encode() and value.strip() in (b"1", b"true")
+            for name, value in scope.get("headers", [])
+        )
+        current = RequestQueries(scope, profile=requested)
+        token = _current.set(current)
+        started = time.perf_counter()
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start" and current.profile and getattr(current.user, "is_admin", False):
+                headers = list(message.get("headers", []))
+                headers.extend(await self._publish(current, time.perf_counter() - started))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _current.reset(token)
+            if settings.METRICS_ENABLED:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                REQUEST_DB_QUERIES.observe(current.count, scope["method"], route)
+                REQUEST_DB_DURATION.observe(current.seconds, scope["method"], route)
+
+    @staticmethod
+    async def _publish(current: RequestQueries, elapsed: float) -> list:
+        """プロファイルを保存し、レスポンスに付けるヘッダーを返す"""
+        current.profile = False
+        profile = build_profile(current, elapsed)
+        if current.slowest is not None:
+            seconds, statement, parameters = current.slowest
+            profile["slowest"] = {
+                "statement": statement[:_MAX_SQL_LENGTH],
+                "ms": round(seconds * 1000, 3),
+                **await run_in_threadpool(explain, statement, parameters),
+            }
+        query_profiles.set(profile["id"], profile)
+        return [
+            (PROFILE_ID_HEADER.encode(), profile["id"].encode()),
+            (QUERY_COUNT_HEADER.encode(), str(profile["query_count"]).encode()),
+            (QUERY_TIME_HEADER.encode(), str(profile["query_ms"]).encode()),
+        ]
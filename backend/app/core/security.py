@@ -1,26 +1,171 @@
 """
 認証とセキュリティ関連の設定
 """
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 import bcrypt
 from fastapi import HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from .cache import TTLCache
 from .config import settings
-from .database import get_db
+from .database import SessionLocal, get_session, run_db
+from .metrics import BCRYPT_DURATION, BCRYPT_IN_FLIGHT, BCRYPT_REJECTED
+from .principal_generation import read_principal_generation
+from .query_log import set_request_user
+from ..schemas.user import UserResponse
+
+logger = logging.getLogger(__name__)
 
 # セキュリティ
 security = HTTPBearer()
 
+# 認証ユーザーキャッシュ（ユーザー名 -> UserResponse）
+# ユーザー情報を変更するエンドポイントは invalidate_principal() を呼ぶこと
+# 権限（is_admin）を変更する処理は bump_principal_generation() も呼び、他のプロセスのキャッシュも無効化する
+# （DBの直接編集など、世代を進めない変更は反映まで最大 PRINCIPAL_CACHE_TTL 秒かかる）
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+def cache_principal(user, generation: Optional[int] = None) -> UserResponse:
+    """ユーザーのスナップショットをキャッシュに登録
+
+    generation にはDBから読み込む前の principal_cache.generation を渡す。
+    読み込み中に invalidate_principal() が走っていれば登録しない。
+    """
+    principal = UserResponse.model_validate(user)
+    principal_cache.set(principal.username, principal, generation=generation)
+    return principal
+
+def invalidate_principal(*usernames: str) -> None:
+    """ユーザー情報の変更時にキャッシュを無効化"""
+    for username in usernames:
+        if username:
+            principal_cache.invalidate(username)
+
+class PrincipalGenerationWatcher:
+    """共有世代（principal_generation）を一定間隔で読み、変わっていれば認証ユーザーキャッシュを空にする"""
+
+    def __init__(self, interval_ms: float = 1000.0):
+        self.interval = interval_ms / 1000
+        self.generation: Optional[int] = None
+        self.invalidations = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def check(self) -> bool:
+        """世代を読み、前回から変わっていればキャッシュを空にして True を返す（初回は記録のみ）"""
+        db = SessionLocal()
+        try:
+            generation = read_principal_generation(db)
+        finally:
+            db.close()
+        changed = self.generation is not None and generation != self.generation
+        if changed:
+            principal_cache.clear()
+            self.invalidations += 1
+        self.generation = generation
+        return changed
+
+    async def start(self) -> None:
+        """現在の世代を記録し、確認タスクを開始（interval が 0 の場合は確認しない）"""
+        await run_in_threadpool(self.check)
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.check)
+            except Exception:
+                # 読み込みに失敗した場合は次の周期で再試行する
+                logger.exception("認証ユーザーキャッシュの世代の確認に失敗しました")
+
+principal_watcher = PrincipalGenerationWatcher(interval_ms=settings.PRINCIPAL_GENERATION_CHECK_MS)
+
+# bcrypt専用のワーカープール（共有スレッドプールを打刻リクエストに残すため）
+_hash_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(settings.BCRYPT_WORKERS + settings.BCRYPT_MAX_QUEUE)
+
+# 現在のbcryptコスト（起動時に calibrate_bcrypt_rounds() で決定）
+bcrypt_rounds: int = settings.BCRYPT_ROUNDS or 12
+
+def calibrate_bcrypt_rounds(target_ms: float = settings.BCRYPT_TARGET_MS) -> int:
+    """目標時間に収まる最大のbcryptコストを計測して設定"""
+    global bcrypt_rounds
+    if settings.BCRYPT_ROUNDS:
+        bcrypt_rounds = settings.BCRYPT_ROUNDS
+        return bcrypt_rounds
+    
+    # コストが1増えるごとに計算量は2倍になる
+    rounds = settings.BCRYPT_MIN_ROUNDS
+    started = time.perf_counter()
+    bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    while rounds < settings.BCRYPT_MAX_ROUNDS and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    
+    bcrypt_rounds = rounds
+    return bcrypt_rounds
+
+def needs_rehash(hashed_password: str) -> bool:
+    """保存済みハッシュのコストが現在の設定と異なるか"""
+    try:
+        return int(hashed_password.split('$')[2]) != bcrypt_rounds
+    except (IndexError, ValueError):
+        return False
+
 def hash_password(password: str) -> str:
     """パスワードをハッシュ化"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    with BCRYPT_DURATION.time("hash"):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds)).decode('utf-8')
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """パスワードを検証"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    with BCRYPT_DURATION.time("verify"):
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+async def _run_hashing(func, *args):
+    """bcrypt専用プールで実行（待ち行列が上限に達している場合は即座に429）"""
+    if not _hash_slots.acquire(blocking=False):
+        BCRYPT_REJECTED.inc()
+        raise HTTPException(
+            status_code=429,
+            detail="ログインが混み合っています。しばらくしてから再度お試しください",
+            headers={"Retry-After": "1"}
+        )
+    BCRYPT_IN_FLIGHT.inc()
+    try:
+        return await asyncio.wrap_future(_hash_executor.submit(func, *args))
+    finally:
+        BCRYPT_IN_FLIGHT.dec()
+        _hash_slots.release()
+
+async def hash_password_async(password: str) -> str:
+    """パスワードをbcrypt専用プールでハッシュ化"""
+    return await _run_hashing(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """パスワードをbcrypt専用プールで検証"""
+    return await _run_hashing(verify_password, password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """JWTアクセストークンを作成"""
@@ -34,8 +179,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """JWTトークンを検証してユーザー名を返す"""
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """JWTトークンを検証してユーザー名を返す（HS256の検証は軽いためスレッドプールを使わない）"""
     try:
         token = credentials.credentials
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
@@ -46,15 +191,24 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="無効なトークン")
 
-def get_current_user(username: str = Depends(verify_token), db: Session = Depends(get_db)):
-    """現在のユーザーを取得"""
+def _load_principal(db: Session, username: str, generation: int) -> Optional[UserResponse]:
     from ..models.user import User
     user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-    return user
+    return cache_principal(user, generation) if user is not None else None
+
+async def get_current_user(username: str = Depends(verify_token), db: Session = Depends(get_session)) -> UserResponse:
+    """現在のユーザーを取得（キャッシュ済みならDBを参照しない）"""
+    principal = principal_cache.get(username)
+    if principal is None:
+        # 読み込みより前の世代を控え、読み込み中に無効化された古い値を登録しない
+        generation = principal_cache.generation
+        principal = await run_db(db, _load_principal, username, generation)
+        if principal is None:
+            raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
+    set_request_user(principal)
+    return principal
 
-def get_current_admin_user(current_user = Depends(get_current_user)):
+async def get_current_admin_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """管理者ユーザーを取得"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="管理者権限が必要です")
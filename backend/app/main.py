@@ -1,18 +1,64 @@
 """
 勤怠管理システム - メインアプリケーション
 """
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
+
+from .core.config import settings
+from .core.database import engine, async_engine, is_lock_error
+from .core.metrics import STARTUP_DURATION, MetricsMiddleware
+from .core.migrations import check_schema
+from .core.query_log import PROFILE_ID_HEADER, QUERY_COUNT_HEADER, QUERY_TIME_HEADER, QueryLogMiddleware
+from .core.security import calibrate_bcrypt_rounds, principal_watcher
+from .routers import auth, attendance, admin, corrections, metrics, reports
+from .services.etag import ETAG_HEADER
+from .services.pagination import NEXT_CURSOR_HEADER
+from .services.presence import presence_index
+from .services.punch_buffer import punch_buffer
+from .services.punch_projection import catch_up, punch_projector
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時の準備と終了時の後始末"""
+    # スキーマのバージョンを確認（未適用のマイグレーションがあれば起動しない）
+    with STARTUP_DURATION.time("schema_check"):
+        check_schema(engine, auto_migrate=settings.AUTO_MIGRATE)
+    # 前回の終了時に未反映だった打刻を勤怠記録・ロールアップに反映
+    with STARTUP_DURATION.time("punch_projection"):
+        catch_up()
+    # 今日の勤怠記録から在席状況のインデックスを作成
+    with STARTUP_DURATION.time("presence_index"):
+        presence_index.rebuild()
+    # bcryptコストを目標時間に合わせて調整
+    with STARTUP_DURATION.time("bcrypt_calibration"):
+        calibrate_bcrypt_rounds()
+    if settings.PUNCH_GROUP_COMMIT:
+        await punch_buffer.start()
+    await punch_projector.start()
+    # プロセス外での権限変更を検出して認証ユーザーキャッシュを空にする
+    await principal_watcher.start()
 
-from .core.database import engine
-from .models import Base
-from .routers import auth, attendance, admin, corrections, reports
+    yield
 
-# データベーステーブル作成
-Base.metadata.create_all(bind=engine)
+    # グループコミットの待ち行列に残った打刻を書き込み、勤怠記録に反映してから止める
+    await punch_buffer.stop()
+    await punch_projector.stop()
+    await principal_watcher.stop()
+    await run_in_threadpool(catch_up)
+    # 非同期モードのコネクションプールを閉じる
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # FastAPIアプリケーション
-app = FastAPI(title="勤怠管理システム", version="1.0.0")
+app = FastAPI(title="勤怠管理システム", version="1.0.0", lifespan=lifespan)
 
 # CORS設定
 app.add_middleware(
@@ -21,14 +67,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER, PROFILE_ID_HEADER, QUERY_COUNT_HEADER, QUERY_TIME_HEADER],
 )
 
+# リクエストごとのクエリの集計とプロファイル（X-Query-Profile ヘッダー）
+app.add_middleware(QueryLogMiddleware)
+
+# メトリクス（リクエストのレイテンシの記録と /metrics）
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(OperationalError)
+async def handle_operational_error(request: Request, exc: OperationalError):
+    """ロック待ちのタイムアウトは一時的な混雑として 503 を返す（それ以外は従来どおり 500）"""
+    if is_lock_error(exc):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "データベースが混雑しています。しばらくしてから再度お試しください"},
+            headers={"Retry-After": "1"}
+        )
+    raise exc
+
 # ルーター登録
 app.include_router(auth.router)
 app.include_router(attendance.router)
 app.include_router(admin.router)
 app.include_router(corrections.router)
 app.include_router(reports.router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
+
+# モジュールの読み込み時間（app.main 内の import を含む）
+STARTUP_DURATION.set(time.perf_counter() - _import_started, "import")
 
 @app.get("/")
 def read_root():
@@ -3,6 +3,9 @@
 """
 from .user import User
 from .attendance import AttendanceRecord, CorrectionRequest
+from .rollup import MonthlyAttendanceRollup
+from .audit import AuditEvent
+from .punch_event import PunchEvent
 from ..core.database import Base
 
-__all__ = ["User", "AttendanceRecord", "CorrectionRequest", "Base"]
\ No newline at end of file
+__all__ = ["User", "AttendanceRecord", "CorrectionRequest", "MonthlyAttendanceRollup", "AuditEvent", "PunchEvent", "Base"]
\ No newline at end of file
@@ -1,7 +1,7 @@
 """
 勤怠記録モデル
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..core.database import Base
@@ -16,11 +16,22 @@ class AttendanceRecord(Base):
     clock_out = Column(DateTime)
     break_start = Column(DateTime)
     break_end = Column(DateTime)
+    # 休憩時間の合計（秒）。複数回の休憩では break_start は最初の開始、break_end は最後の終了
+    # NULL の場合は break_start〜break_end を休憩時間とする
+    break_seconds = Column(Float)
     notes = Column(Text)
     status = Column(String, default="present")  # present, absent, late, early_leave
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    user = relationship("User", back_populates="attendance_records")
+    correction_requests = relationship("CorrectionRequest", back_populates="record")
+
+    # 1ユーザー1日1レコード（打刻はこの一意制約に対するUPSERTで行う）
+    __table_args__ = (
+        Index("ux_attendance_records_user_date", "user_id", "date", unique=True),
+    )
+
     def __repr__(self):
         return f"<AttendanceRecord(id={self.id}, user_id={self.user_id}, date='{self.date}')>"
 
@@ -43,5 +54,16 @@ class CorrectionRequest(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    requester = relationship("User", foreign_keys=[user_id], back_populates="correction_requests")
+    approver = relationship("User", foreign_keys=[approved_by])
+    record = relationship("AttendanceRecord", back_populates="correction_requests")
+
+    # 申請一覧のキーセットページネーション用（created_at降順, id降順）
+    __table_args__ = (
+        Index("ix_correction_requests_user_created", "user_id", "created_at", "id"),
+        Index("ix_correction_requests_status_created", "status", "created_at", "id"),
+        Index("ix_correction_requests_created", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<CorrectionRequest(id={self.id}, user_id={self.user_id}, status='{self.status}')>"
\ No newline at end of file
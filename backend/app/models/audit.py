@@ -0,0 +1,34 @@
+"""
+監査ログモデル
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index
+from datetime import datetime
+from ..core.database import Base
+
+class AuditEvent(Base):
+    """勤怠記録への管理操作の監査ログ（追記専用）
+
+    勤怠記録の行に操作ログを追記すると、履歴の取得のたびに読まれる行が肥大化するため、
+    変更前後の値をこのテーブルに1操作1行で記録する。更新・削除は行わない。
+    """
+    __tablename__ = "audit_events"
+    
+    id = Column(Integer, primary_key=True)
+    actor_id = Column(Integer, ForeignKey("users.id"))  # 操作した管理者のID
+    action = Column(String, nullable=False)  # attendance_corrected, correction_approved など
+    target_type = Column(String, nullable=False)  # attendance_record
+    target_id = Column(Integer, nullable=False)
+    correction_request_id = Column(Integer, ForeignKey("correction_requests.id"))  # 申請承認の場合
+    reason = Column(Text)
+    before = Column(JSON(none_as_null=True))  # 変更前の値（新規作成時は NULL）
+    after = Column(JSON(none_as_null=True))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 対象記録ごとの履歴と、全体の新しい順の一覧（キーセットページネーション用）
+        Index("ix_audit_events_target", "target_type", "target_id", "created_at", "id"),
+        Index("ix_audit_events_created", "created_at", "id"),
+    )
+
+    def __repr__(self):
+        return f"<AuditEvent(id={self.id}, action='{self.action}', target_id={self.target_id})>"
@@ -0,0 +1,40 @@
+"""
+打刻イベントモデル
+"""
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Text, JSON, ForeignKey, Index, false
+from datetime import datetime
+from ..core.database import Base
+
+class PunchEvent(Base):
+    """打刻・修正のイベントログ（追記専用、勤怠記録の元データ）
+
+    勤怠記録（attendance_records）は (user_id, date) ごとのイベントを seq 順に
+    畳み込んだ結果のキャッシュで、services/punch_projection.py が後から反映する
+    （services/punch_events.py の replay で再作成できる）。
+    seq は (user_id, date) ごとの連番で、一意制約により同時打刻の競合を検出する。
+    projected は勤怠記録に反映済みか（反映時に、畳み込んだイベントだけを反映済みにする）。
+    """
+    __tablename__ = "punch_events"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(String, nullable=False)  # YYYY-MM-DD形式
+    seq = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)  # clock_in, clock_out, break_start, break_end, snapshot, correction
+    occurred_at = Column(DateTime, nullable=False)
+    notes = Column(Text)
+    state = Column(JSON(none_as_null=True))  # snapshot / correction の場合の記録全体の値
+    actor_id = Column(Integer, ForeignKey("users.id"))  # 修正した管理者のID
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    projected = Column(Boolean, nullable=False, default=False, server_default=false())
+
+    __table_args__ = (
+        Index("ux_punch_events_user_date_seq", "user_id", "date", "seq", unique=True),
+        # 未反映のイベントだけの部分インデックス（反映待ちの日の検索用）
+        Index("ix_punch_events_unprojected", "user_id", "date",
+              sqlite_where=projected == false(), postgresql_where=projected == false()),
+    )
+
+    def __repr__(self):
+        return f"<PunchEvent(id={self.id}, user_id={self.user_id}, date='{self.date}', action='{self.action}')>"
+
@@ -0,0 +1,27 @@
+"""
+勤怠集計（ロールアップ）モデル
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from datetime import datetime
+from ..core.database import Base
+
+class MonthlyAttendanceRollup(Base):
+    """ユーザー別・月別の勤怠集計
+
+    勤怠記録を変更する処理と同じトランザクションで差分更新する。
+    日別の集計は (user_id, date) で一意な勤怠記録そのものに相当する。
+    """
+    __tablename__ = "monthly_attendance_rollups"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM形式
+    record_count = Column(Integer, nullable=False, default=0)
+    worked_seconds = Column(Float, nullable=False, default=0)
+    break_seconds = Column(Float, nullable=False, default=0)
+    days_present = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<MonthlyAttendanceRollup(user_id={self.user_id}, month='{self.month}')>"
@@ -2,6 +2,7 @@
 ユーザーモデル
 """
 from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..core.database import Base
 
@@ -16,5 +17,12 @@ class User(Base):
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    attendance_records = relationship("AttendanceRecord", back_populates="user")
+    correction_requests = relationship(
+        "CorrectionRequest",
+        foreign_keys="CorrectionRequest.user_id",
+        back_populates="requester"
+    )
+
     def __repr__(self):
         return f"<User(id={self.id}, username='{self.username}', full_name='{self.full_name}')>"
\ No newline at end of file
@@ -1,46 +1,201 @@
 """
 管理者関連のAPIルーター
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 
-from ..core.database import get_db
-from ..core.security import get_current_admin_user
-from ..models import User, AttendanceRecord
-from ..schemas import AttendanceCorrection, UserResponse
-from ..services.attendance_utils import time_string_to_datetime, validate_attendance_times, create_log_entry
+from ..core.config import settings
+from ..core.database import get_db, database_diagnostics
+from ..core.query_log import query_profiles
+from ..core.security import get_current_admin_user, principal_cache
+from ..models import User, AttendanceRecord, AuditEvent
+from ..schemas import AttendanceCorrection, AuditEventResponse, UserResponse
+from ..services.attendance_utils import time_string_to_datetime, validate_attendance_times
+from ..services.audit import audit_event, audit_state, write_audit_events
+from ..services.live_feed import LiveFeedFull, Subscriber, live_feed, sse_message
+from ..services.punch_buffer import punch_buffer
+from ..services.punch_events import append_correction_events
+from ..services.pagination import page_size, paginate_desc
+from ..services.presence import PRESENCE_STATES, presence_change, presence_index
+from ..services.punch_import import IMPORT_RECOMMENDED_ROWS, import_punches
+from ..services.punch_projection import catch_up, project_days
+from ..services.rollups import apply_rollup_delta, snapshot
 
 router = APIRouter(prefix="/admin", tags=["管理者"])
 
 @router.get("/users", response_model=List[UserResponse])
-def get_all_users(db: Session = Depends(get_db), admin: User = Depends(get_current_admin_user)):
+def get_all_users(db: Session = Depends(get_db), admin: UserResponse = Depends(get_current_admin_user)):
     """全ユーザー一覧取得（管理者のみ）"""
     users = db.query(User).all()
     return users
 
+@router.get("/cache-stats")
+def get_cache_stats(admin: UserResponse = Depends(get_current_admin_user)):
+    """プロセス内キャッシュの統計情報（管理者のみ）"""
+    return {"principal": principal_cache.stats()}
+
+@router.get("/punch-buffer")
+def get_punch_buffer_stats(admin: UserResponse = Depends(get_current_admin_user)):
+    """打刻のグループコミットの統計情報（バッチサイズ・書き込み時間、管理者のみ）"""
+    return punch_buffer.stats()
+
+@router.get("/database")
+def get_database_diagnostics(admin: UserResponse = Depends(get_current_admin_user)):
+    """データベース接続設定と有効なPRAGMAの確認（管理者のみ）"""
+    return database_diagnostics()
+
+async def _live_stream(subscriber: Subscriber):
+    # 購読を始めてからスナップショットを取る（取得中の打刻を取りこぼさない。重複は後のイベントが優先）
+    # スナップショットは在席状況のインデックスから返す（接続のたびにDBを読まない）
+    try:
+        yield sse_message("snapshot", presence_index.snapshot())
+        while True:
+            message = await subscriber.get(settings.LIVE_FEED_HEARTBEAT_SECONDS)
+            if message is None:
+                # 読み出しが遅れて待ち行列があふれた（再接続してスナップショットから再開させる）
+                yield sse_message("resync", {"reason": "overflow"})
+                return
+            yield message or b": keepalive\n\n"
+    finally:
+        live_feed.unsubscribe(subscriber)
+
+@router.get("/live")
+async def get_live_feed(admin: UserResponse = Depends(get_current_admin_user)):
+    """在席状況のライブフィード（Server-Sent Events、管理者のみ）
+
+    接続時に今日の在席状況（snapshot、GET /admin/presence と同じ内容をインデックスから）を送り、
+    以降は打刻（punch）と修正申請の作成（correction_request）をコミット後に配信する。
+    読み出しが遅れて待ち行列があふれた場合は resync を送って切断する（再接続でスナップショットから再開）。
+    Authorization ヘッダーが必要なため EventSource では接続できず、再接続はクライアントが行う。
+    """
+    try:
+        subscriber = live_feed.subscribe()
+    except LiveFeedFull:
+        raise HTTPException(status_code=503, detail="ライブフィードの接続数が上限に達しています")
+    return StreamingResponse(
+        _live_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # 送信を始める前に切断されるとストリームの finally は実行されないため、購読の解除はここでも行う
+        background=BackgroundTask(live_feed.unsubscribe, subscriber)
+    )
+
+@router.get("/presence")
+async def get_presence(state: Optional[str] = None, admin: UserResponse = Depends(get_current_admin_user)):
+    """今日の在席状況（管理者のみ）
+
+    状態（working / on_break / clocked_out）ごとの件数と、今日の記録のあるユーザーの状態・その状態になった時刻を
+    メモリ上のインデックスから返す（DBは読まない）。記録のないユーザーは not_clocked_in（一覧には含めない）。
+    """
+    if state is not None and state not in PRESENCE_STATES:
+        raise HTTPException(status_code=400, detail="無効な在席状況です")
+    return presence_index.snapshot(state)
+
+@router.get("/presence/{user_id}")
+async def get_user_presence(user_id: int, admin: UserResponse = Depends(get_current_admin_user)):
+    """指定ユーザーの今日の在席状況（管理者のみ、DBは読まない）"""
+    return presence_index.get(user_id)
+
+@router.get("/query-profiles")
+def get_query_profiles(admin: UserResponse = Depends(get_current_admin_user)):
+    """保存済みのクエリプロファイルの一覧（新しい順、管理者のみ）"""
+    return [
+        {key: profile[key] for key in ("id", "route", "path", "user", "created_at", "request_ms", "query_count", "query_ms")}
+        for profile in reversed(query_profiles.values())
+    ]
+
+@router.get("/query-profiles/{profile_id}")
+def get_query_profile(profile_id: str, admin: UserResponse = Depends(get_current_admin_user)):
+    """クエリプロファイル（クエリ一覧・重複・最も遅いクエリの実行計画、管理者のみ）"""
+    profile = query_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="プロファイルが見つかりません")
+    return profile
+
+async def _read_import_body(request: Request) -> bytes:
+    """取り込みデータを IMPORT_MAX_BYTES まで読み込む（超えた時点で読み込みを止めて 413）
+
+    打刻は (ユーザー, 日付) ごとに時刻順で検証するため全件を解析してから書き込むが、
+    リクエストボディを上限なしにメモリへ読み込まないようにする。
+    """
+    limit = settings.IMPORT_MAX_BYTES
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"取り込みデータが大きすぎます（上限 {limit} バイト）。"
+               f"1リクエストあたり {IMPORT_RECOMMENDED_ROWS:,} 件程度に分割して送信してください"
+    )
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise too_large
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+@router.post("/punches/import")
+async def import_punch_data(
+    request: Request,
+    format: str = "csv",
+    db: Session = Depends(get_db),
+    admin: UserResponse = Depends(get_current_admin_user)
+):
+    """打刻データの一括取り込み（管理者のみ）
+
+    リクエストボディに csv / json / ndjson 形式で (user_id または username, timestamp, action, notes) を送る。
+    CSVはヘッダー行が必要。規則に合わない行は取り込まず、行番号付きのエラーとして返す。
+
+    (ユーザー, 日付) ごとに時刻順で検証するため、ボディ（IMPORT_MAX_BYTES まで、既定 20MiB）を読み込み、
+    全行を解析してから書き込む（ボディと解析した行を同時にメモリに持つ）。上限を超えるデータは 413 を返す。
+    数十万件の移行は、クライアント側で1リクエストあたり IMPORT_RECOMMENDED_ROWS（100,000）件程度に分割し、
+    日付順に送る（同じ日の打刻は同じリクエストにまとめるか、前のリクエストより後の時刻だけを送る）。
+    """
+    body = await _read_import_body(request)
+    result = await run_in_threadpool(import_punches, db, body, format)
+    if result["applied"]:
+        # 取り込んだ打刻を勤怠記録に反映し、日付・順序は任意のため在席状況のインデックスは作り直す
+        await run_in_threadpool(catch_up)
+        await run_in_threadpool(presence_index.rebuild, db)
+    return result
+
 @router.post("/attendance/correct")
 def correct_attendance(
     correction: AttendanceCorrection,
     db: Session = Depends(get_db),
-    admin: User = Depends(get_current_admin_user)
+    admin: UserResponse = Depends(get_current_admin_user)
 ):
-    """勤怠記録の直接修正（管理者のみ）"""
+    """勤怠記録の直接修正（管理者のみ）
+
+    同じ日の打刻と同時に書き込んで打刻イベントの seq が競合した場合は、修正を取り消して 409 を返す。
+    """
     # 対象ユーザーの存在確認
     target_user = db.query(User).filter(User.id == correction.user_id).first()
     if not target_user:
         raise HTTPException(status_code=404, detail="対象ユーザーが見つかりません")
     
-    # 該当日の記録を取得または作成
+    # 該当日の記録を取得または作成（未反映の打刻があれば先に反映する）
+    project_days(db, [(correction.user_id, correction.date)])
     record = db.query(AttendanceRecord).filter(
         AttendanceRecord.user_id == correction.user_id,
         AttendanceRecord.date == correction.date
     ).first()
     
+    before = snapshot(record)
+    audit_before = audit_state(record)
     if not record:
         record = AttendanceRecord(
             user_id=correction.user_id,
-            date=correction.date
+            date=correction.date,
+            status="present"
         )
         db.add(record)
     
@@ -53,6 +208,9 @@ def correct_attendance(
         record.break_start = time_string_to_datetime(correction.date, correction.break_start)
     if correction.break_end is not None:
         record.break_end = time_string_to_datetime(correction.date, correction.break_end)
+    if correction.break_start is not None or correction.break_end is not None:
+        # 休憩時刻を指定した修正は1回の休憩（break_start〜break_end）として扱う
+        record.break_seconds = None
     if correction.notes is not None:
         record.notes = correction.notes
     
@@ -60,14 +218,50 @@ def correct_attendance(
     validate_attendance_times(record.clock_in, record.clock_out, 
                              record.break_start, record.break_end)
     
-    # ログエントリの作成
-    log_entry = create_log_entry("管理者修正", admin.username, correction.reason)
-    if record.admin_log:
-        record.admin_log += "\n" + log_entry
-    else:
-        record.admin_log = log_entry
+    # 月別ロールアップ・監査ログ・打刻イベントを同じトランザクションで更新
+    apply_rollup_delta(db, record.user_id, record.date, before, snapshot(record))
+    audit_events = [audit_event(admin.id, "attendance_corrected", record, audit_before, reason=correction.reason)]
+    write_audit_events(db, audit_events)
+    try:
+        append_correction_events(db, audit_events)
+    except IntegrityError:
+        # 同じ日の打刻と seq が競合した
+        db.rollback()
+        raise HTTPException(status_code=409, detail="勤怠記録が同時に更新されました。再度お試しください")
+    change = presence_change(record)
     
     db.commit()
+    presence_index.apply_changes([change])
     db.refresh(record)
     
-    return {"message": "勤怠記録を修正しました", "record_id": record.id}
\ No newline at end of file
+    return {"message": "勤怠記録を修正しました", "record_id": record.id}
+
+@router.get("/audit-events", response_model=List[AuditEventResponse])
+def get_audit_events(
+    response: Response,
+    target_id: Optional[int] = None,
+    actor_id: Optional[int] = None,
+    action: Optional[str] = None,
+    correction_request_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    admin: UserResponse = Depends(get_current_admin_user)
+):
+    """監査ログの新しい順の一覧（管理者のみ）
+
+    常にページ単位で返し、次ページのカーソルを X-Next-Cursor ヘッダーで返す。
+    target_id は勤怠記録のID。
+    """
+    query = db.query(AuditEvent)
+    if target_id is not None:
+        query = query.filter(AuditEvent.target_type == "attendance_record", AuditEvent.target_id == target_id)
+    if actor_id is not None:
+        query = query.filter(AuditEvent.actor_id == actor_id)
+    if action:
+        query = query.filter(AuditEvent.action == action)
+    if correction_request_id is not None:
+        query = query.filter(AuditEvent.correction_request_id == correction_request_id)
+    
+    return paginate_desc(query, AuditEvent.created_at, AuditEvent.id,
+                         cursor, page_size(limit), response, parse=datetime.fromisoformat)
@@ -1,54 +1,184 @@
 """
 勤怠関連のAPIルーター
+
+DBアクセスは run_db() 経由で行い、DB_ASYNC=true では非同期ドライバで、
+それ以外ではスレッドプールで実行する。
+打刻は打刻イベントの追記だけを行い、勤怠記録への反映はバックグラウンドで行う（services/punch_projection.py）。
+勤怠記録の取得は書き込みロックを取らず、未反映の打刻がある日はイベントを畳み込んだ値をメモリ上で返す。
+今日の勤怠と勤怠履歴は ETag を返し、If-None-Match が一致する場合は1クエリだけで（記録を読み込まずに）304 を返す。
+勤怠履歴は必要な列だけを取得し、fast_json で直接エンコードする。
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 
-from ..core.database import get_db
-from ..models import User, AttendanceRecord
-from ..schemas import AttendanceAction, AttendanceResponse
-from ..services.attendance_utils import validate_attendance_times
-
-# 依存性注入のための関数（循環インポート回避）
-def get_current_user(db: Session = Depends(get_db)) -> User:
-    from ..core.security import verify_token, get_db
-    from fastapi import Depends
-    username = verify_token()
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
-    return user
+from ..core.config import settings
+from ..core.database import get_session, get_write_session, run_db
+from ..core.security import get_current_user
+from ..models import AttendanceRecord, PunchEvent
+from ..schemas import AttendanceAction, AttendanceResponse, UserResponse
+from ..services.attendance_utils import total_break_seconds
+from ..services.etag import etag_matches, make_etag, not_modified, set_cache_headers
+from ..services.fast_json import dumps, json_response
+from ..services.live_feed import live_feed
+from ..services.pagination import NEXT_CURSOR_HEADER, decode_cursor, paginate_desc
+from ..services.presence import PRESENCE_AFTER_ACTION, presence_index
+from ..services.punch import apply_punch, ACTION_MESSAGES
+from ..services.punch_buffer import punch_buffer
+from ..services.punch_events import DayState, record_values, user_days
 
 router = APIRouter(prefix="/attendance", tags=["勤怠管理"])
 
-@router.get("/", response_model=List[AttendanceResponse])
-def get_attendance_records(
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """勤怠記録取得（自分の記録）"""
-    query = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == current_user.id)
+def _records_version(db: Session, user_id: int, start_date: Optional[str], end_date: Optional[str]) -> tuple:
+    """期間内の記録の件数・更新日時の最大値と、打刻イベントのIDの最大値（ETag 用、1クエリ）
+
+    記録の作成・更新（修正・承認・取り込み・打刻の反映）は必ず updated_at を UTC の現在時刻にするため、
+    最大値が変わらなければ内容も変わっていない（削除は件数で検出する）。
+    未反映の打刻は記録を変えないため、イベントのIDの最大値で検出する。
+    """
+    r, e = AttendanceRecord, PunchEvent
+    record_filters = [r.user_id == user_id]
+    event_filters = [e.user_id == user_id]
+    if start_date:
+        record_filters.append(r.date >= start_date)
+        event_filters.append(e.date >= start_date)
+    if end_date:
+        record_filters.append(r.date <= end_date)
+        event_filters.append(e.date <= end_date)
+    last_event_id = select(func.max(e.id)).where(*event_filters).scalar_subquery()
+    return tuple(db.execute(
+        select(func.count(r.id), func.max(r.updated_at), last_event_id).where(*record_filters)
+    ).one())
+
+# 一覧で取得する列（休憩の一覧以外の AttendanceResponse のフィールド）
+RECORD_FIELDS = tuple(name for name in AttendanceResponse.model_fields if name != "breaks")
+
+def _apply_day(item: dict, day: Optional[Tuple[DayState, bool]]) -> dict:
+    """打刻イベントから休憩の一覧を付け、未反映の打刻がある日はイベントを畳み込んだ値にする"""
+    if day is None:
+        # イベントのない記録は break_start〜break_end の1回の休憩
+        breaks = [(item["break_start"], item["break_end"])] if item["break_start"] else []
+    else:
+        state, pending = day
+        if pending:
+            item.update(record_values(state))
+            item["status"] = item["status"] or "present"
+        breaks = state.breaks
+    item["break_seconds"] = total_break_seconds(item["break_start"], item["break_end"], item["break_seconds"])
+    item["breaks"] = [{"start": start, "end": end} for start, end in breaks]
+    return item
+
+def _pending_item(user_id: int, date: str, day: Tuple[DayState, bool]) -> dict:
+    """勤怠記録がまだない（未反映の打刻だけの）日（id は 0）"""
+    item = dict.fromkeys(RECORD_FIELDS)
+    item.update(id=0, user_id=user_id, date=date)
+    return _apply_day(item, day)
+
+def _find_records(db: Session, user_id: int, start_date: Optional[str], end_date: Optional[str],
+                  cursor: Optional[str], limit: Optional[int], response: Response) -> bytes:
+    """勤怠記録の一覧を AttendanceResponse の形のJSONで返す（ORM・Pydanticを経由しない）
+
+    未反映の打刻は反映を待たずにイベントから求める（書き込みロックは取らない）。
+    勤怠記録がまだない日は、このページの日付の範囲に入る場合に id=0 で含める。
+    """
+    query = db.query(*[getattr(AttendanceRecord, name) for name in RECORD_FIELDS]).filter(
+        AttendanceRecord.user_id == user_id
+    )
     
     if start_date:
         query = query.filter(AttendanceRecord.date >= start_date)
     if end_date:
         query = query.filter(AttendanceRecord.date <= end_date)
     
-    records = query.order_by(AttendanceRecord.date.desc()).all()
-    return records
+    rows = paginate_desc(query, AttendanceRecord.date, AttendanceRecord.id, cursor, limit, response)
+    days = user_days(db, user_id, [row.date for row in rows], start_date, end_date)
+    items = [_apply_day(dict(zip(RECORD_FIELDS, row)), days.get(row.date)) for row in rows]
+    
+    # 記録のない日は、前ページの最後より前で、続きがある場合はこのページの最後より後のものだけ
+    dates = {row.date for row in rows}
+    before = decode_cursor(cursor)[0] if cursor is not None else None
+    after = rows[-1].date if NEXT_CURSOR_HEADER in response.headers else None
+    extra = [
+        _pending_item(user_id, date, day) for date, day in days.items()
+        if day[1] and date not in dates and (before is None or date < before) and (after is None or date > after)
+    ]
+    if extra:
+        items = sorted(items + extra, key=lambda item: (item["date"], item["id"]), reverse=True)
+    return dumps(items)
 
-@router.get("/today", response_model=AttendanceResponse)
-def get_today_attendance(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """今日の勤怠状況取得"""
-    today = datetime.now().strftime("%Y-%m-%d")
+def _find_today_record(db: Session, user_id: int, today: str) -> Optional[AttendanceResponse]:
     record = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
+        AttendanceRecord.user_id == user_id,
         AttendanceRecord.date == today
     ).first()
+    day = user_days(db, user_id, [today], today, today).get(today)
+    if record is not None:
+        item = {name: getattr(record, name) for name in RECORD_FIELDS}
+        return AttendanceResponse.model_validate(_apply_day(item, day))
+    return AttendanceResponse.model_validate(_pending_item(user_id, today, day)) if day else None
+
+def _with_breaks(db: Session, user_id: int, records: List[AttendanceRecord]) -> List[AttendanceResponse]:
+    """打刻イベントから求めた休憩の一覧を付けて返す（未反映の打刻がある日はイベントから求めた値）"""
+    dates = [record.date for record in records]
+    days = user_days(db, user_id, dates, min(dates), max(dates)) if dates else {}
+    return [
+        AttendanceResponse.model_validate(_apply_day(
+            {name: getattr(record, name) for name in RECORD_FIELDS}, days.get(record.date)
+        ))
+        for record in records
+    ]
+
+def _punch(db: Session, user_id: int, action: str, notes: Optional[str]) -> Tuple[int, datetime]:
+    # 打刻イベントを追記してコミットし、(イベントID, 打刻時刻) を返す
+    now = datetime.now()
+    event_id = apply_punch(db, user_id, action, notes, now=now)
+    db.commit()
+    return event_id, now
+
+@router.get("/", response_model=List[AttendanceResponse])
+async def get_attendance_records(
+    request: Request,
+    response: Response,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_session)
+):
+    """勤怠記録取得（自分の記録）
+
+    limit / cursor を指定するとページ単位で返し、次ページのカーソルを
+    X-Next-Cursor ヘッダーで返す。どちらも指定しない場合は全件を返す。
+    期間内の記録に変更がなければ（If-None-Match が ETag と一致すれば）304 を返す。
+    """
+    version = await run_db(db, _records_version, current_user.id, start_date, end_date)
+    etag = make_etag("records", current_user.id, start_date, end_date, limit, cursor, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    
+    body = await run_db(db, _find_records, current_user.id, start_date, end_date, cursor, limit, response)
+    return json_response(body, response)
+
+@router.get("/today", response_model=AttendanceResponse)
+async def get_today_attendance(
+    request: Request,
+    response: Response,
+    current_user: UserResponse = Depends(get_current_user),
+    db: Session = Depends(get_session)
+):
+    """今日の勤怠状況取得（変更がなければ 304）"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    version = await run_db(db, _records_version, current_user.id, today, today)
+    etag = make_etag("today", current_user.id, today, version)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_cache_headers(response, etag)
+    
+    record = await run_db(db, _find_today_record, current_user.id, today)
     
     if not record:
         # 空の記録を返す
@@ -67,72 +197,35 @@ def get_today_attendance(current_user: User = Depends(get_current_user), db: Ses
     return record
 
 @router.post("/")
-def record_attendance(
+async def record_attendance(
     attendance: AttendanceAction, 
-    current_user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user), 
+    db: Session = Depends(get_write_session)
 ):
-    """勤怠記録（出勤・退勤・休憩開始・終了）"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    current_time = datetime.now()
-    
-    # 今日の勤怠記録を取得または作成
-    record = db.query(AttendanceRecord).filter(
-        AttendanceRecord.user_id == current_user.id,
-        AttendanceRecord.date == today
-    ).first()
-    
-    if not record:
-        record = AttendanceRecord(user_id=current_user.id, date=today)
-        db.add(record)
-    
-    # アクションに応じて記録を更新
-    if attendance.action == "clock_in":
-        if record.clock_in:
-            raise HTTPException(status_code=400, detail="既に出勤記録があります")
-        record.clock_in = current_time
-        record.status = "present"
-    elif attendance.action == "clock_out":
-        if not record.clock_in:
-            raise HTTPException(status_code=400, detail="出勤記録がありません")
-        if record.clock_out:
-            raise HTTPException(status_code=400, detail="既に退勤記録があります")
-        record.clock_out = current_time
-    elif attendance.action == "break_start":
-        if not record.clock_in:
-            raise HTTPException(status_code=400, detail="出勤記録がありません")
-        if record.break_start and not record.break_end:
-            raise HTTPException(status_code=400, detail="既に休憩中です")
-        record.break_start = current_time
-    elif attendance.action == "break_end":
-        if not record.break_start:
-            raise HTTPException(status_code=400, detail="休憩開始記録がありません")
-        if record.break_end:
-            raise HTTPException(status_code=400, detail="既に休憩終了記録があります")
-        record.break_end = current_time
+    """勤怠記録（出勤・退勤・休憩開始・終了）
+
+    PUNCH_GROUP_COMMIT=true の場合は他の打刻とまとめてコミットし、コミット後に応答する。
+    勤怠記録・月別ロールアップへの反映はバックグラウンドで後から行う。
+    応答は記録した打刻イベントの event_id（勤怠記録はまだない場合があるため record_id は返さない）。
+    """
+    if settings.PUNCH_GROUP_COMMIT:
+        event_id, punched_at = await punch_buffer.submit(current_user.id, attendance.action, attendance.notes)
     else:
-        raise HTTPException(status_code=400, detail="無効なアクションです")
-    
-    if attendance.notes:
-        record.notes = attendance.notes
+        event_id, punched_at = await run_db(db, _punch, current_user.id, attendance.action, attendance.notes)
     
-    record.updated_at = current_time
-    
-    # 時刻の妥当性チェック
-    validate_attendance_times(record.clock_in, record.clock_out, 
-                             record.break_start, record.break_end)
-    
-    db.commit()
-    db.refresh(record)
-    
-    action_messages = {
-        'clock_in': '出勤を記録しました',
-        'clock_out': '退勤を記録しました', 
-        'break_start': '休憩開始を記録しました',
-        'break_end': '休憩終了を記録しました'
-    }
+    # コミット済みの打刻を、記録した打刻時刻で在席状況のインデックスに反映し、管理者のライブフィードに配信
+    presence_index.apply_punch(current_user.id, attendance.action, punched_at)
+    live_feed.publish("punch", {
+        "user_id": current_user.id,
+        "username": current_user.username,
+        "full_name": current_user.full_name,
+        "action": attendance.action,
+        "presence": PRESENCE_AFTER_ACTION.get(attendance.action),
+        "event_id": event_id,
+        "at": punched_at,
+    })
     
     return {
-        "message": action_messages.get(attendance.action, "記録しました"), 
-        "record_id": record.id
-    }
\ No newline at end of file
+        "message": ACTION_MESSAGES.get(attendance.action, "記録しました"), 
+        "event_id": event_id
+    }
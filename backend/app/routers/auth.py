@@ -1,32 +1,32 @@
 """
 認証関連のAPIルーター
+
+bcryptは専用プールで実行するため、これらのエンドポイントは async で定義し、
+DBアクセスは run_db() 経由（DB_ASYNC=true では非同期ドライバ、それ以外は共有スレッドプール）で行う。
 """
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
-from ..core.database import get_db
-from ..core.security import hash_password, verify_password, create_access_token
+from ..core.database import get_session, run_db
+from ..core.security import (
+    hash_password_async,
+    verify_password_async,
+    needs_rehash,
+    create_access_token,
+    cache_principal,
+    invalidate_principal,
+    principal_cache
+)
 from ..models import User
-from ..schemas import UserCreate, UserLogin, Token, UserResponse
+from ..schemas import UserCreate, UserLogin, Token
 
 router = APIRouter(prefix="/auth", tags=["認証"])
 
-@router.post("/register", response_model=dict)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    """新規ユーザー登録"""
-    # ユーザー名とメールの重複チェック
-    existing_user = db.query(User).filter(
-        (User.username == user.username) | (User.email == user.email)
+def _find_existing_user(db: Session, username: str, email: str):
+    return db.query(User).filter(
+        (User.username == username) | (User.email == email)
     ).first()
-    if existing_user:
-        raise HTTPException(
-            status_code=400, 
-            detail="ユーザー名またはメールアドレスが既に使用されています"
-        )
-    
-    # パスワードハッシュ化
-    hashed_password = hash_password(user.password)
-    
-    # 新規ユーザー作成
+
+def _create_user(db: Session, user: UserCreate, hashed_password: str) -> User:
     db_user = User(
         username=user.username,
         email=user.email,
@@ -36,30 +36,62 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
-    
+    return db_user
+
+def _find_user(db: Session, username: str):
+    return db.query(User).filter(User.username == username).first()
+
+def _update_password_hash(db: Session, db_user: User, hashed_password: str) -> None:
+    db_user.hashed_password = hashed_password
+    db.commit()
+    db.refresh(db_user)
+
+@router.post("/register", response_model=dict)
+async def register_user(user: UserCreate, db: Session = Depends(get_session)):
+    """新規ユーザー登録"""
+    # ユーザー名とメールの重複チェック
+    existing_user = await run_db(db, _find_existing_user, user.username, user.email)
+    if existing_user:
+        raise HTTPException(
+            status_code=400,
+            detail="ユーザー名またはメールアドレスが既に使用されています"
+        )
+
+    # パスワードハッシュ化
+    hashed_password = await hash_password_async(user.password)
+
+    # 新規ユーザー作成
+    db_user = await run_db(db, _create_user, user, hashed_password)
+    invalidate_principal(db_user.username)
+
     return {"message": "ユーザー登録が完了しました", "user_id": db_user.id}
 
 @router.post("/login", response_model=Token)
-def login_user(user: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user: UserLogin, db: Session = Depends(get_session)):
     """ユーザーログイン"""
-    db_user = db.query(User).filter(User.username == user.username).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    generation = principal_cache.generation
+    db_user = await run_db(db, _find_user, user.username)
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(
-            status_code=401, 
+            status_code=401,
             detail="ユーザー名またはパスワードが間違っています"
         )
-    
+
+    # bcryptコストが変更されていれば、平文が手元にあるこの時点で再ハッシュ
+    # 混雑時は再ハッシュを見送り、次回ログイン時に行う
+    if needs_rehash(db_user.hashed_password):
+        try:
+            new_hash = await hash_password_async(user.password)
+        except HTTPException:
+            new_hash = None
+        if new_hash:
+            await run_db(db, _update_password_hash, db_user, new_hash)
+
     access_token = create_access_token(data={"sub": db_user.username})
-    
+
+    # 直後のAPI呼び出しに備えてキャッシュを温める
     return Token(
         access_token=access_token,
         token_type="bearer",
-        user=UserResponse(
-            id=db_user.id,
-            username=db_user.username,
-            email=db_user.email,
-            full_name=db_user.full_name,
-            is_admin=db_user.is_admin,
-            created_at=db_user.created_at
-        )
-    )
\ No newline at end of file
+        user=cache_principal(db_user, generation)
+    )
@@ -1,23 +1,45 @@
 """
 修正申請関連のAPIルーター
+
+管理者向けの全申請一覧は必要な列だけを取得し、fast_json で直接エンコードする。
 """
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Response
+from sqlalchemy import case, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
 from typing import List, Optional
 from datetime import datetime
 
-from ..core.database import get_db
+from ..core.database import get_db, upsert_insert
 from ..core.security import get_current_user, get_current_admin_user
 from ..models import User, AttendanceRecord, CorrectionRequest
-from ..schemas import CorrectionRequestCreate, CorrectionRequestResponse, CorrectionRequestApproval
-from ..services.attendance_utils import time_string_to_datetime, validate_attendance_times, create_log_entry
+from ..schemas import (
+    CorrectionRequestCreate,
+    CorrectionRequestResponse,
+    CorrectionRequestAdminResponse,
+    CorrectionRequestApproval,
+    CorrectionRequestBatchApproval,
+    UserResponse,
+    UserSummary
+)
+from ..services.fast_json import dumps, json_response
+from ..services.live_feed import live_feed
+from ..services.pagination import paginate_desc
+from ..services.presence import presence_change, presence_index
+from ..services.attendance_utils import time_string_to_datetime, validate_attendance_times
+from ..services.audit import audit_event, audit_state, write_audit_events
+from ..services.punch_events import append_correction_events
+from ..services.punch_projection import project_days
+from ..services.rollups import add_rollup_delta, apply_rollup_delta, apply_rollup_deltas, snapshot
 
 router = APIRouter(prefix="/correction-request", tags=["修正申請"])
 
+DECISION_STATUSES = ("approved", "rejected")
+
 @router.post("/", response_model=dict)
 def create_correction_request(
     request: CorrectionRequestCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """修正申請の作成"""
@@ -48,7 +70,8 @@ def create_correction_request(
     # 修正申請の作成
     correction_request = CorrectionRequest(
         user_id=current_user.id,
-        attendance_record_id=request.attendance_record_id,
+        # 勤怠記録がまだない日（未反映の打刻だけの日）は一覧で id=0 になるため、記録の指定なしとして扱う
+        attendance_record_id=request.attendance_record_id or None,
         requested_date=request.requested_date,
         requested_clock_in=clock_in_dt,
         requested_clock_out=clock_out_dt,
@@ -63,91 +86,312 @@ def create_correction_request(
     db.commit()
     db.refresh(correction_request)
     
+    live_feed.publish("correction_request", {
+        "request_id": correction_request.id,
+        "user_id": current_user.id,
+        "username": current_user.username,
+        "full_name": current_user.full_name,
+        "requested_date": correction_request.requested_date,
+        "reason": correction_request.reason,
+        "created_at": correction_request.created_at,
+    })
+    
     return {"message": "修正申請を送信しました", "request_id": correction_request.id}
 
 @router.get("/", response_model=List[CorrectionRequestResponse])
 def get_correction_requests(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """自分の修正申請一覧取得"""
-    requests = db.query(CorrectionRequest).filter(
+    """自分の修正申請一覧取得（limit / cursor 指定時はページ単位）"""
+    query = db.query(CorrectionRequest).filter(
         CorrectionRequest.user_id == current_user.id
-    ).order_by(CorrectionRequest.created_at.desc()).all()
+    )
+    requests = paginate_desc(query, CorrectionRequest.created_at, CorrectionRequest.id,
+                             cursor, limit, response, parse=datetime.fromisoformat)
     
     return requests
 
-@router.get("/admin/all", response_model=List[CorrectionRequestResponse])
+# 全申請一覧で取得する列（CorrectionRequestAdminResponse の申請者・承認者以外のフィールドと、それぞれの概要）
+CORRECTION_FIELDS = tuple(CorrectionRequestResponse.model_fields)
+USER_SUMMARY_FIELDS = tuple(UserSummary.model_fields)
+
+def _user_summary(values: tuple) -> Optional[dict]:
+    return dict(zip(USER_SUMMARY_FIELDS, values)) if values[0] is not None else None
+
+@router.get("/admin/all", response_model=List[CorrectionRequestAdminResponse])
 def get_all_correction_requests(
+    response: Response,
     status: Optional[str] = None,
-    admin: User = Depends(get_current_admin_user),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    admin: UserResponse = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """全修正申請一覧取得（管理者のみ）"""
-    query = db.query(CorrectionRequest)
+    """全修正申請一覧取得（管理者のみ、limit / cursor 指定時はページ単位）"""
+    # 申請者・承認者は同じSELECTでJOINして取得（申請ごとの追加クエリを発行しない）
+    requester = aliased(User)
+    approver = aliased(User)
+    query = db.query(
+        *[getattr(CorrectionRequest, name) for name in CORRECTION_FIELDS],
+        *[getattr(requester, name).label(f"requester_{name}") for name in USER_SUMMARY_FIELDS],
+        *[getattr(approver, name).label(f"approver_{name}") for name in USER_SUMMARY_FIELDS],
+    ).outerjoin(requester, CorrectionRequest.requester).outerjoin(approver, CorrectionRequest.approver)
     
     if status:
         query = query.filter(CorrectionRequest.status == status)
     
-    requests = query.order_by(CorrectionRequest.created_at.desc()).all()
-    return requests
+    rows = paginate_desc(query, CorrectionRequest.created_at, CorrectionRequest.id,
+                         cursor, limit, response, parse=datetime.fromisoformat)
+    fields = len(CORRECTION_FIELDS)
+    users = fields + len(USER_SUMMARY_FIELDS)
+    items = []
+    for row in rows:
+        item = dict(zip(CORRECTION_FIELDS, row[:fields]))
+        item["user"] = _user_summary(row[fields:users])
+        item["approver"] = _user_summary(row[users:])
+        items.append(item)
+    return json_response(dumps(items), response)
+
+# 一括承認で記録を作成する INSERT の1文あたりの行数
+CREATE_CHUNK_SIZE = 100
+
+def _records_by_key(db: Session, keys: set) -> dict:
+    """(ユーザー, 日付) の組に一致する勤怠記録をまとめて読み込む"""
+    if not keys:
+        return {}
+    records = db.query(AttendanceRecord).filter(
+        AttendanceRecord.user_id.in_({user_id for user_id, _ in keys}),
+        AttendanceRecord.date.in_({date for _, date in keys})
+    )
+    return {(r.user_id, r.date): r for r in records if (r.user_id, r.date) in keys}
+
+def _apply_correction(db: Session, correction_request: CorrectionRequest,
+                      record: Optional[AttendanceRecord], admin_id: int, audit_events: list):
+    """承認された申請の内容を勤怠記録に反映し、(変更前のスナップショット, 記録) を返す
+
+    監査ログは audit_events に追加する（書き込みは呼び出し側）。
+    """
+    before = snapshot(record)
+    audit_before = audit_state(record)
+    if not record:
+        # 新規記録の作成
+        record = AttendanceRecord(
+            user_id=correction_request.user_id,
+            date=correction_request.requested_date,
+            status="present"
+        )
+        db.add(record)
+    
+    # 記録を更新
+    record.clock_in = correction_request.requested_clock_in
+    record.clock_out = correction_request.requested_clock_out
+    record.break_start = correction_request.requested_break_start
+    record.break_end = correction_request.requested_break_end
+    record.break_seconds = None  # 申請の休憩は1回（break_start〜break_end）
+    record.notes = correction_request.requested_notes
+    
+    audit_events.append(audit_event(
+        admin_id, "correction_approved", record, audit_before,
+        reason=correction_request.reason, correction_request_id=correction_request.id
+    ))
+    return before, record
+
+@router.post("/batch-approve")
+def batch_approve_correction_requests(
+    batch: CorrectionRequestBatchApproval,
+    admin: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """修正申請の一括承認/拒否（管理者のみ）
+
+    未処理の申請だけを1本の条件付きUPDATEで確定するため、同時に処理された申請は
+    「既に処理済み」として報告される。勤怠記録の反映を含め、全件を1回でコミットする。
+    同じ日の打刻と同時に書き込んで打刻イベントの seq が競合した場合は、全件を未処理に戻して 409 を返す。
+    """
+    results = {}
+    decisions = {}
+    for decision in batch.decisions:
+        if decision.request_id in decisions:
+            continue
+        if decision.status not in DECISION_STATUSES:
+            results[decision.request_id] = {"status": "error", "detail": "無効なステータスです"}
+            continue
+        decisions[decision.request_id] = decision
+
+    claimed = set()
+    if decisions:
+        # 未処理の申請のみを確定（他の管理者が先に処理した申請は更新されない）
+        t = CorrectionRequest
+        claimed = set(db.scalars(
+            update(t)
+            .where(t.id.in_(decisions), t.status == "pending")
+            .values(
+                status=case({i: d.status for i, d in decisions.items()}, value=t.id),
+                admin_notes=case({i: d.admin_notes for i, d in decisions.items()}, value=t.id),
+                approved_by=admin.id,
+                updated_at=datetime.utcnow()
+            )
+            .returning(t.id)
+            .execution_options(synchronize_session=False)
+        ))
+
+    unclaimed = [request_id for request_id in decisions if request_id not in claimed]
+    existing = set(db.scalars(select(CorrectionRequest.id).where(CorrectionRequest.id.in_(unclaimed))))
+    for request_id in unclaimed:
+        if request_id in existing:
+            results[request_id] = {"status": "error", "detail": "既に処理済みの申請です"}
+        else:
+            results[request_id] = {"status": "error", "detail": "修正申請が見つかりません"}
+
+    approved = db.query(CorrectionRequest).filter(
+        CorrectionRequest.id.in_([i for i in claimed if decisions[i].status == "approved"])
+    ).order_by(CorrectionRequest.id).all()
+    # 未反映の打刻があれば先に勤怠記録へ反映する（修正の変更前の値・ロールアップ差分の起点）
+    project_days(db, [(r.user_id, r.requested_date) for r in approved])
+
+    # 対象の勤怠記録をIDと (ユーザー, 日付) のINクエリでまとめて読み込む
+    records_by_id = {}
+    record_ids = {r.attendance_record_id for r in approved if r.attendance_record_id}
+    if record_ids:
+        for record in db.query(AttendanceRecord).filter(AttendanceRecord.id.in_(record_ids)):
+            records_by_id[record.id] = record
+    records_by_key = _records_by_key(db, {
+        (r.user_id, r.requested_date) for r in approved if not r.attendance_record_id
+    })
+
+    def target(correction_request):
+        if correction_request.attendance_record_id in records_by_id:
+            return records_by_id[correction_request.attendance_record_id]
+        return records_by_key.get((correction_request.user_id, correction_request.requested_date))
+
+    # 記録のない日付はまとめて作成し、RETURNING で実際に作成した (ユーザー, 日付) を受け取る
+    # （同時に作成された記録は ON CONFLICT DO NOTHING で返らないため、このバッチで作成したものとして扱わない）
+    missing = sorted({(r.user_id, r.requested_date) for r in approved if target(r) is None})
+    created = set()
+    if missing:
+        now = datetime.utcnow()
+        t = AttendanceRecord
+        # 複数行の VALUES は行数 × 列数のパラメーターになるため、SQLite の上限を超えないように分ける
+        for start in range(0, len(missing), CREATE_CHUNK_SIZE):
+            created.update(db.execute(
+                upsert_insert(db, t).values([
+                    {"user_id": user_id, "date": date, "status": "present", "created_at": now, "updated_at": now}
+                    for user_id, date in missing[start:start + CREATE_CHUNK_SIZE]
+                ]).on_conflict_do_nothing(index_elements=[t.user_id, t.date]).returning(t.user_id, t.date)
+            ).tuples())
+        records_by_key.update(_records_by_key(db, set(missing)))
+
+    deltas = {}
+    audit_events = []
+    changes = []
+    for correction_request in approved:
+        record = target(correction_request)
+        before, record = _apply_correction(db, correction_request, record, admin.id, audit_events)
+        if (record.user_id, record.date) in created:
+            # 新規作成した記録は存在しなかったものとしてロールアップ差分・監査ログを残す
+            before = None
+            audit_events[-1]["before"] = None
+            created.discard((record.user_id, record.date))
+        add_rollup_delta(deltas, record.user_id, record.date, before, snapshot(record))
+        changes.append(presence_change(record))
+
+    db.flush()
+    apply_rollup_deltas(db, deltas)
+    write_audit_events(db, audit_events)
+    try:
+        append_correction_events(db, audit_events)
+    except IntegrityError:
+        # 同じ日の打刻と seq が競合した（申請の確定も含めて全件を取り消す）
+        db.rollback()
+        raise HTTPException(status_code=409, detail="勤怠記録が同時に更新されました。再度お試しください")
+    db.commit()
+    presence_index.apply_changes(changes)
+
+    for request_id in claimed:
+        results[request_id] = {"status": decisions[request_id].status}
+    outcomes = [{"request_id": request_id, **results[request_id]} for request_id in dict.fromkeys(
+        decision.request_id for decision in batch.decisions
+    )]
+    return {
+        "results": outcomes,
+        "approved": sum(1 for o in outcomes if o["status"] == "approved"),
+        "rejected": sum(1 for o in outcomes if o["status"] == "rejected"),
+        "failed": sum(1 for o in outcomes if o["status"] == "error"),
+    }
 
 @router.put("/{request_id}/approve")
 def approve_correction_request(
     request_id: int,
     approval: CorrectionRequestApproval,
-    admin: User = Depends(get_current_admin_user),
+    admin: UserResponse = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    """修正申請の承認/拒否（管理者のみ）"""
-    # 修正申請を取得
-    correction_request = db.query(CorrectionRequest).filter(
-        CorrectionRequest.id == request_id
+    """修正申請の承認/拒否（管理者のみ）
+
+    未処理の申請だけを条件付きUPDATEで確定するため、同時に処理された申請は 409 を返す
+    （勤怠記録・ロールアップへの反映は確定した1件だけが行う）。同じ日の打刻と同時に書き込んで
+    打刻イベントの seq が競合した場合も、申請を未処理に戻して 409 を返す。
+    """
+    if approval.status not in DECISION_STATUSES:
+        raise HTTPException(status_code=400, detail="無効なステータスです")
+    t = CorrectionRequest
+    claimed = db.scalars(
+        update(t)
+        .where(t.id == request_id, t.status == "pending")
+        .values(
+            status=approval.status,
+            admin_notes=approval.admin_notes,
+            approved_by=admin.id,
+            updated_at=datetime.utcnow()
+        )
+        .returning(t.id)
+        .execution_options(synchronize_session=False)
     ).first()
+    if claimed is None:
+        exists = db.scalar(select(t.id).where(t.id == request_id))
+        db.rollback()
+        if exists is None:
+            raise HTTPException(status_code=404, detail="修正申請が見つかりません")
+        raise HTTPException(status_code=409, detail="既に処理済みの申請です")
+    correction_request = db.get(CorrectionRequest, request_id)
     
-    if not correction_request:
-        raise HTTPException(status_code=404, detail="修正申請が見つかりません")
-    
-    if correction_request.status != "pending":
-        raise HTTPException(status_code=400, detail="既に処理済みの申請です")
-    
-    # 申請のステータスを更新
-    correction_request.status = approval.status
-    correction_request.admin_notes = approval.admin_notes
-    correction_request.updated_at = datetime.now()
-    
+    changes = []
     if approval.status == "approved":
-        # 承認された場合、実際に勤怠記録を修正
+        # 承認された場合、実際に勤怠記録を修正（未反映の打刻があれば先に反映する）
+        project_days(db, [(correction_request.user_id, correction_request.requested_date)])
         record = None
         if correction_request.attendance_record_id:
             # 既存記録の修正
             record = db.query(AttendanceRecord).filter(
                 AttendanceRecord.id == correction_request.attendance_record_id
             ).first()
+        if record is None:
+            # 同じ日付の記録があればそれを修正（1ユーザー1日1レコード。申請後に記録が削除された場合も含む）
+            record = db.query(AttendanceRecord).filter(
+                AttendanceRecord.user_id == correction_request.user_id,
+                AttendanceRecord.date == correction_request.requested_date
+            ).first()
         
-        if not record:
-            # 新規記録の作成
-            record = AttendanceRecord(
-                user_id=correction_request.user_id,
-                date=correction_request.requested_date
-            )
-            db.add(record)
-        
-        # 記録を更新
-        record.clock_in = correction_request.requested_clock_in
-        record.clock_out = correction_request.requested_clock_out
-        record.break_start = correction_request.requested_break_start
-        record.break_end = correction_request.requested_break_end
-        record.notes = correction_request.requested_notes
+        audit_events = []
+        before, record = _apply_correction(db, correction_request, record, admin.id, audit_events)
         
-        # ログエントリの作成
-        log_entry = create_log_entry("申請承認", admin.username, correction_request.reason, request_id)
-        if record.admin_log:
-            record.admin_log += "\n" + log_entry
-        else:
-            record.admin_log = log_entry
+        # 月別ロールアップ・監査ログ・打刻イベントを同じトランザクションで更新
+        apply_rollup_delta(db, record.user_id, record.date, before, snapshot(record))
+        write_audit_events(db, audit_events)
+        try:
+            append_correction_events(db, audit_events)
+        except IntegrityError:
+            # 同じ日の打刻と seq が競合した（申請の確定も含めて取り消す）
+            db.rollback()
+            raise HTTPException(status_code=409, detail="勤怠記録が同時に更新されました。再度お試しください")
+        changes.append(presence_change(record))
     
     db.commit()
+    presence_index.apply_changes(changes)
     
     status_message = "承認しました" if approval.status == "approved" else "拒否しました"
     return {"message": f"修正申請を{status_message}", "request_id": request_id}
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+メトリクスのAPIルーター（Prometheusのテキスト形式）
+"""
+import hmac
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import engine, get_session
+from ..core.metrics import registry, render_samples
+from ..core.security import get_current_user, principal_cache, verify_token
+from ..services.live_feed import live_feed
+from ..services.presence import presence_index
+from ..services.punch_buffer import punch_buffer
+
+router = APIRouter(tags=["メトリクス"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+def _snapshot_metrics() -> list:
+    """キャッシュ・打刻バッファ・ライブフィード・在席状況・スレッドプール・コネクションプールの現在の値"""
+    cache = principal_cache.stats()
+    buffer = punch_buffer.stats()
+    feed = live_feed.stats()
+    presence = presence_index.stats()
+    limiter = current_default_thread_limiter().statistics()
+    pool = engine.pool
+    samples = [
+        render_samples("principal_cache_hits_total", "counter", "認証ユーザーキャッシュのヒット数", {(): cache["hits"]}),
+        render_samples("principal_cache_misses_total", "counter", "認証ユーザーキャッシュのミス数", {(): cache["misses"]}),
+        render_samples("principal_cache_entries", "gauge", "認証ユーザーキャッシュの件数", {(): cache["size"]}),
+        render_samples("punch_buffer_queued", "gauge", "グループコミット待ちの打刻数", {(): buffer["queued"]}),
+        render_samples("punch_buffer_batches_total", "counter", "グループコミットの回数", {(): buffer["batches"]}),
+        render_samples("punch_buffer_punches_total", "counter", "グループコミットした打刻数", {(): buffer["punches"]}),
+        render_samples("punch_buffer_fallbacks_total", "counter", "1件ずつの書き込みに切り替えた回数", {(): buffer["fallbacks"]}),
+        render_samples("live_feed_subscribers", "gauge", "ライブフィードの接続数", {(): feed["subscribers"]}),
+        render_samples("live_feed_events_total", "counter", "ライブフィードに配信したイベント数", {(): feed["published"]}),
+        render_samples("live_feed_dropped_total", "counter", "読み出しが遅れて切断したライブフィードの接続数", {(): feed["dropped"]}),
+        render_samples("presence_users", "gauge", "今日の在席状況ごとのユーザー数",
+                       {(state,): count for state, count in presence.items()}, ("state",)),
+        render_samples("threadpool_workers_busy", "gauge", "使用中のスレッドプールのワーカー数", {(): limiter.borrowed_tokens}),
+        render_samples("threadpool_workers_max", "gauge", "スレッドプールのワーカー数の上限", {(): limiter.total_tokens}),
+        render_samples("threadpool_queue_depth", "gauge", "スレッドプールの空き待ちの処理数", {(): limiter.tasks_waiting}),
+    ]
+    if hasattr(pool, "checkedout"):
+        samples.append(render_samples("db_pool_checked_out", "gauge", "使用中のDB接続数", {(): pool.checkedout()}))
+        samples.append(render_samples("db_pool_size", "gauge", "コネクションプールの接続数の上限（overflow を除く）", {(): pool.size()}))
+    return samples
+
+async def _authorize(request: Request, db: Session) -> None:
+    """METRICS_TOKEN または管理者のアクセストークンを確認（どちらもなければ 401、管理者でなければ 403）"""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="認証が必要です", headers={"WWW-Authenticate": "Bearer"})
+    if settings.METRICS_TOKEN and hmac.compare_digest(token, settings.METRICS_TOKEN):
+        return
+    try:
+        username = await verify_token(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        user = await get_current_user(username, db)
+    except HTTPException:
+        raise HTTPException(status_code=401, detail="認証に失敗しました", headers={"WWW-Authenticate": "Bearer"})
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="管理者権限が必要です")
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request, db: Session = Depends(get_session)):
+    """メトリクス（Authorization: Bearer に METRICS_TOKEN または管理者のアクセストークンが必要）"""
+    await _authorize(request, db)
+    return Response(registry.render(_snapshot_metrics()), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,62 +1,255 @@
 """
 レポート関連のAPIルーター
+
+DBアクセスは run_db() 経由（DB_ASYNC=true では非同期ドライバ）で行い、
+行数に比例する計算はイベントループを塞がないようスレッドプールで行う。
 """
-from fastapi import APIRouter, Depends
+import csv
+import io
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from datetime import datetime, timedelta
 
-from ..core.database import get_db
+from ..core.config import settings
+from ..core.database import get_session, run_db, SessionLocal
 from ..core.security import get_current_admin_user
-from ..models import User, AttendanceRecord
+from ..models import User, AttendanceRecord, MonthlyAttendanceRollup
+from ..schemas import UserResponse
+from ..services.aggregation import aggregate_work_hours
+from ..services.attendance_utils import calculate_work_hours
+from ..services import work_time
+from ..services.fast_json import dumps
 
 router = APIRouter(prefix="/reports", tags=["レポート"])
 
-@router.get("/attendance-summary")
-def get_attendance_summary(
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    user_id: Optional[int] = None,
-    admin: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
-):
-    """勤怠サマリーレポート（管理者のみ）"""
-    query = db.query(AttendanceRecord)
-    
+SUMMARY_FIELDS = [
+    "user_id", "date", "clock_in", "clock_out", "break_start", "break_end",
+    "work_hours", "break_hours", "status", "notes"
+]
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+def _summary_filters(start_date: Optional[str], end_date: Optional[str], user_id: Optional[int]) -> list:
+    filters = []
     if start_date:
-        query = query.filter(AttendanceRecord.date >= start_date)
+        filters.append(AttendanceRecord.date >= start_date)
     if end_date:
-        query = query.filter(AttendanceRecord.date <= end_date)
+        filters.append(AttendanceRecord.date <= end_date)
     if user_id:
-        query = query.filter(AttendanceRecord.user_id == user_id)
-    
-    records = query.all()
-    
-    summary = []
-    for record in records:
-        work_hours = 0
-        break_hours = 0
-        
-        if record.clock_in and record.clock_out:
-            total_time = record.clock_out - record.clock_in
-            work_hours = total_time.total_seconds() / 3600
-            
-            if record.break_start and record.break_end:
-                break_time = record.break_end - record.break_start
-                break_hours = break_time.total_seconds() / 3600
-                work_hours -= break_hours
-        
-        summary.append({
+        filters.append(AttendanceRecord.user_id == user_id)
+    return filters
+
+def _summary_row(record) -> dict:
+    """勤怠記録1件をサマリー行に変換"""
+    work_hours, break_hours = calculate_work_hours(
+        record.clock_in, record.clock_out, record.break_start, record.break_end, record.break_seconds
+    )
+    return {
+        "user_id": record.user_id,
+        "date": record.date,
+        "clock_in": record.clock_in,
+        "clock_out": record.clock_out,
+        "break_start": record.break_start,
+        "break_end": record.break_end,
+        "work_hours": round(work_hours, 2),
+        "break_hours": round(break_hours, 2),
+        "status": record.status,
+        "notes": record.notes
+    }
+
+def _summary_rows_vectorized(rows) -> list:
+    """大量の行の労働・休憩時間をNumPyでまとめて計算してサマリー行にする"""
+    computed = work_time.compute_work_time(work_time.to_arrays(rows))
+    work_hours = work_time.round_hours(computed["work_seconds"])
+    break_hours = work_time.round_hours(computed["break_seconds"])
+    return [
+        {
             "user_id": record.user_id,
             "date": record.date,
             "clock_in": record.clock_in,
             "clock_out": record.clock_out,
             "break_start": record.break_start,
             "break_end": record.break_end,
-            "work_hours": round(work_hours, 2),
-            "break_hours": round(break_hours, 2),
+            "work_hours": work,
+            "break_hours": breaks,
             "status": record.status,
             "notes": record.notes
-        })
+        }
+        for record, work, breaks in zip(rows, work_hours, break_hours)
+    ]
+
+def _summary_rows(records) -> list:
+    if work_time.available() and len(records) >= settings.VECTORIZE_MIN_ROWS:
+        return _summary_rows_vectorized(records)
+    return [_summary_row(record) for record in records]
+
+def _fetch_summary_rows(db: Session, filters: list) -> list:
+    """ORMオブジェクトではなく必要な列のタプルで取得（一括計算用のエポックミリ秒を含む）"""
+    dialect = db.get_bind().dialect.name
+    return db.execute(
+        select(
+            AttendanceRecord.user_id, AttendanceRecord.date,
+            AttendanceRecord.clock_in, AttendanceRecord.clock_out,
+            AttendanceRecord.break_start, AttendanceRecord.break_end, AttendanceRecord.break_seconds,
+            AttendanceRecord.status, AttendanceRecord.notes,
+            *work_time.epoch_columns(dialect)
+        ).where(*filters)
+    ).all()
+
+def _monthly_rows(db: Session, month: Optional[str], user_id: Optional[int]) -> list:
+    query = db.query(MonthlyAttendanceRollup, User).join(
+        User, User.id == MonthlyAttendanceRollup.user_id
+    )
+    if month:
+        query = query.filter(MonthlyAttendanceRollup.month == month)
+    if user_id:
+        query = query.filter(MonthlyAttendanceRollup.user_id == user_id)
     
-    return {"summary": summary, "total_records": len(summary)}
\ No newline at end of file
+    return [
+        {
+            "user_id": rollup.user_id,
+            "username": user.username,
+            "full_name": user.full_name,
+            "month": rollup.month,
+            "record_count": rollup.record_count,
+            "worked_minutes": round(rollup.worked_seconds / 60, 1),
+            "break_minutes": round(rollup.break_seconds / 60, 1),
+            "days_present": rollup.days_present,
+            "late_count": rollup.late_count,
+            "absent_count": rollup.absent_count
+        }
+        for rollup, user in query.order_by(MonthlyAttendanceRollup.month, MonthlyAttendanceRollup.user_id)
+    ]
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _stream_summary(fmt: str, filters: list) -> Iterator[str]:
+    """サマリー行を一定件数ずつ読み込み、チャンク単位で書き出す
+
+    レスポンス送信中も使えるよう、リクエストとは別のセッションで読み込む。
+    """
+    stmt = (
+        select(
+            AttendanceRecord.user_id, AttendanceRecord.date,
+            AttendanceRecord.clock_in, AttendanceRecord.clock_out,
+            AttendanceRecord.break_start, AttendanceRecord.break_end, AttendanceRecord.break_seconds,
+            AttendanceRecord.status, AttendanceRecord.notes
+        )
+        .where(*filters)
+        .order_by(AttendanceRecord.date, AttendanceRecord.user_id)
+        .execution_options(yield_per=settings.REPORT_STREAM_BATCH_SIZE)
+    )
+
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            # Excelで文字化けしないようBOMを付与
+            buffer.write("\ufeff")
+            writer.writerow(SUMMARY_FIELDS)
+
+        for partition in db.execute(stmt).partitions():
+            for record in partition:
+                row = _summary_row(record)
+                if fmt == "csv":
+                    writer.writerow([_isoformat(row[field]) for field in SUMMARY_FIELDS])
+                else:
+                    # JSONのエンドポイントと同じエンコーダー（区切りの空白なし）で1行ずつ出力
+                    buffer.write(dumps(row).decode("utf-8"))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+@router.get("/attendance-summary")
+async def get_attendance_summary(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user_id: Optional[int] = None,
+    format: str = "json",
+    admin: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_session)
+):
+    """勤怠サマリーレポート（管理者のみ）
+
+    format=ndjson / csv を指定すると、全件をメモリに載せずにストリーミングで返す。
+    """
+    filters = _summary_filters(start_date, end_date, user_id)
+
+    if format in STREAM_MEDIA_TYPES:
+        headers = {}
+        if format == "csv":
+            headers["Content-Disposition"] = 'attachment; filename="attendance-summary.csv"'
+        return StreamingResponse(
+            _stream_summary(format, filters),
+            media_type=STREAM_MEDIA_TYPES[format],
+            headers=headers
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="無効な出力形式です（json, ndjson, csv）")
+
+    records = await run_db(db, _fetch_summary_rows, filters)
+    summary = await run_in_threadpool(_summary_rows, records)
+
+    return {"summary": summary, "total_records": len(summary)}
+
+@router.get("/work-hours")
+async def get_work_hours_report(
+    period: str = "month",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user_id: Optional[int] = None,
+    admin: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_session)
+):
+    """ユーザー別・期間別の労働時間集計（管理者のみ）
+
+    period=day / week / month。集計はデータベース側の GROUP BY で行う。
+    """
+    results = await run_db(db, aggregate_work_hours, period, start_date, end_date, user_id)
+    return {"period": period, "results": results, "total_groups": len(results)}
+
+@router.get("/monthly")
+async def get_monthly_rollups(
+    month: Optional[str] = None,
+    user_id: Optional[int] = None,
+    admin: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_session)
+):
+    """月別勤怠集計（管理者のみ）
+
+    勤怠記録ではなく、差分更新済みのロールアップ（ユーザー×月）を読み込む。
+    """
+    results = await run_db(db, _monthly_rows, month, user_id)
+    return {"results": results, "total_rows": len(results)}
+
+@router.get("/work-time")
+async def get_work_time_totals(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    user_id: Optional[int] = None,
+    admin: UserResponse = Depends(get_current_admin_user),
+    db: Session = Depends(get_session)
+):
+    """ユーザー別の労働・休憩・残業・遅刻時間の合計（管理者のみ）
+
+    期間内の全記録をエポックミリ秒の配列として取得し、NumPyで一括計算する。
+    """
+    filters = _summary_filters(start_date, end_date, user_id)
+    rows = await run_db(db, work_time.fetch_work_time_rows, filters)
+    results = await run_in_threadpool(work_time.totals_from_rows, rows)
+    return {"results": results, "total_users": len(results)}
@@ -1,25 +1,36 @@
 """
 スキーマ統合ファイル
 """
-from .user import UserCreate, UserResponse, UserLogin, Token
+from .user import UserCreate, UserResponse, UserSummary, UserLogin, Token
 from .attendance import (
     AttendanceAction,
+    BreakPeriod,
     AttendanceResponse,
     AttendanceCorrection,
     CorrectionRequestCreate,
     CorrectionRequestResponse,
-    CorrectionRequestApproval
+    CorrectionRequestAdminResponse,
+    CorrectionRequestApproval,
+    CorrectionRequestDecision,
+    CorrectionRequestBatchApproval
 )
+from .audit import AuditEventResponse
 
 __all__ = [
     "UserCreate",
-    "UserResponse", 
+    "UserResponse",
+    "UserSummary",
     "UserLogin",
     "Token",
     "AttendanceAction",
+    "BreakPeriod",
     "AttendanceResponse",
     "AttendanceCorrection",
     "CorrectionRequestCreate",
     "CorrectionRequestResponse",
-    "CorrectionRequestApproval"
+    "CorrectionRequestAdminResponse",
+    "CorrectionRequestApproval",
+    "CorrectionRequestDecision",
+    "CorrectionRequestBatchApproval",
+    "AuditEventResponse"
 ]
\ No newline at end of file
@@ -1,14 +1,20 @@
 """
 勤怠関連のPydanticスキーマ
 """
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
+
+from .user import UserSummary
 
 class AttendanceAction(BaseModel):
     action: str  # "clock_in", "clock_out", "break_start", "break_end"
     notes: Optional[str] = None
 
+class BreakPeriod(BaseModel):
+    start: datetime
+    end: Optional[datetime] = None  # 休憩中は None
+
 class AttendanceResponse(BaseModel):
     id: int
     user_id: int
@@ -17,8 +23,12 @@ class AttendanceResponse(BaseModel):
     clock_out: Optional[datetime]
     break_start: Optional[datetime]
     break_end: Optional[datetime]
+    # 終了済みの休憩時間の合計（秒）。break_start / break_end は最初の休憩開始と最後の休憩終了
+    break_seconds: Optional[float] = None
     notes: Optional[str]
     status: str
+    # 1日の休憩の一覧
+    breaks: List[BreakPeriod] = []
     
     class Config:
         from_attributes = True
@@ -61,6 +71,17 @@ class CorrectionRequestResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CorrectionRequestAdminResponse(CorrectionRequestResponse):
+    """管理者向け一覧（申請者・承認者の概要を埋め込む）"""
+    user: UserSummary = Field(validation_alias="requester")
+    approver: Optional[UserSummary] = None
+
 class CorrectionRequestApproval(BaseModel):
     status: str  # approved, rejected
-    admin_notes: Optional[str] = None
\ No newline at end of file
+    admin_notes: Optional[str] = None
+
+class CorrectionRequestDecision(CorrectionRequestApproval):
+    request_id: int
+
+class CorrectionRequestBatchApproval(BaseModel):
+    decisions: List[CorrectionRequestDecision]
@@ -0,0 +1,21 @@
+"""
+監査ログのPydanticスキーマ
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class AuditEventResponse(BaseModel):
+    id: int
+    actor_id: Optional[int]
+    action: str
+    target_type: str
+    target_id: int
+    correction_request_id: Optional[int]
+    reason: Optional[str]
+    before: Optional[dict]
+    after: Optional[dict]
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
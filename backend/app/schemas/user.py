@@ -27,6 +27,15 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class UserSummary(BaseModel):
+    """他のレスポンスに埋め込むユーザー概要"""
+    id: int
+    username: str
+    full_name: str
+    
+    class Config:
+        from_attributes = True
+
 class UserLogin(BaseModel):
     username: str
     password: str
@@ -0,0 +1,120 @@
+"""
+勤怠記録のSQL集計
+
+ユーザー別・期間別（日・週・月）の労働時間、休憩時間、出勤日数、
+遅刻・欠勤件数をデータベース側の GROUP BY で計算する。
+行ごとの計算（attendance_utils.calculate_work_hours）と同じ規則で集計する:
+出勤・退勤の両方がある記録のみ労働時間を計上し、休憩はその場合のみ差し引く。
+休憩時間は break_seconds（休憩時間の合計）があればそれを、なければ break_start〜break_end を使う。
+"""
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import Date, and_, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import User, AttendanceRecord
+
+PERIODS = ("day", "week", "month")
+
+def _seconds_between(dialect: str, start, end):
+    """2つの日時の差（秒）"""
+    if dialect == "postgresql":
+        return func.extract("epoch", end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+def _time_of_day(dialect: str, value):
+    """日時の時刻部分（HH:MM:SS文字列）"""
+    if dialect == "postgresql":
+        return func.to_char(value, "HH24:MI:SS")
+    return func.strftime("%H:%M:%S", value)
+
+def _period_key(dialect: str, period: str):
+    """集計期間のキー（日: YYYY-MM-DD、週: 月曜日の日付、月: YYYY-MM）"""
+    date = AttendanceRecord.date
+    if period == "day":
+        return date
+    if period == "month":
+        return func.substr(date, 1, 7)
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc("week", cast(date, Date)), "YYYY-MM-DD")
+    # 次の日曜日（当日が日曜日ならその日）から6日戻すと、その週の月曜日になる
+    return func.date(date, "weekday 0", "-6 days")
+
+def build_work_hours_query(dialect: str, period: str,
+                           start_date: Optional[str] = None,
+                           end_date: Optional[str] = None,
+                           user_id: Optional[int] = None):
+    """集計用のSELECT文を組み立てる"""
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail="無効な集計期間です（day, week, month）")
+
+    t = AttendanceRecord
+    has_work = and_(t.clock_in.isnot(None), t.clock_out.isnot(None))
+    has_pair = and_(t.break_start.isnot(None), t.break_end.isnot(None))
+    break_seconds = case(
+        (and_(has_work, t.break_seconds.isnot(None)), t.break_seconds),
+        (and_(has_work, has_pair), _seconds_between(dialect, t.break_start, t.break_end)),
+        else_=0
+    )
+    worked_seconds = case((has_work, _seconds_between(dialect, t.clock_in, t.clock_out)), else_=0) - break_seconds
+    work_start = settings.WORK_START_TIME + ":00"
+    is_late = case(
+        (t.status == "late", 1),
+        (and_(t.clock_in.isnot(None), _time_of_day(dialect, t.clock_in) > work_start), 1),
+        else_=0
+    )
+    is_absent = case((t.status == "absent", 1), (t.clock_in.is_(None), 1), else_=0)
+    period_key = _period_key(dialect, period).label("period")
+
+    stmt = (
+        select(
+            t.user_id,
+            User.username,
+            User.full_name,
+            period_key,
+            func.count(t.id).label("record_count"),
+            func.coalesce(func.sum(worked_seconds), 0).label("worked_seconds"),
+            func.coalesce(func.sum(break_seconds), 0).label("break_seconds"),
+            func.count(func.distinct(case((t.clock_in.isnot(None), t.date)))).label("days_present"),
+            func.coalesce(func.sum(is_late), 0).label("late_count"),
+            func.coalesce(func.sum(is_absent), 0).label("absent_count"),
+        )
+        .join(User, User.id == t.user_id)
+        .group_by(t.user_id, User.username, User.full_name, period_key)
+        .order_by(t.user_id, period_key)
+    )
+
+    if start_date:
+        stmt = stmt.where(t.date >= start_date)
+    if end_date:
+        stmt = stmt.where(t.date <= end_date)
+    if user_id:
+        stmt = stmt.where(t.user_id == user_id)
+    return stmt
+
+def aggregate_work_hours(db: Session, period: str = "month",
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None,
+                         user_id: Optional[int] = None) -> List[dict]:
+    """ユーザー別・期間別の集計結果を返す"""
+    dialect = db.get_bind().dialect.name
+    stmt = build_work_hours_query(dialect, period, start_date, end_date, user_id)
+
+    results = []
+    for row in db.execute(stmt):
+        worked = int(round(row.worked_seconds))
+        results.append({
+            "user_id": row.user_id,
+            "username": row.username,
+            "full_name": row.full_name,
+            "period": row.period,
+            "record_count": row.record_count,
+            "worked_seconds": worked,
+            "break_seconds": int(round(row.break_seconds)),
+            "worked_hours": round(worked / 3600, 2),
+            "days_present": row.days_present,
+            "late_count": row.late_count,
+            "absent_count": row.absent_count,
+        })
+    return results
@@ -2,7 +2,7 @@
 勤怠関連のユーティリティ関数
 """
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import HTTPException
 
 def time_string_to_datetime(date_str: str, time_str: Optional[str]) -> Optional[datetime]:
@@ -33,15 +33,43 @@ def validate_attendance_times(clock_in: Optional[datetime],
     if break_end and clock_out and break_end >= clock_out:
         raise HTTPException(status_code=400, detail="休憩終了時刻は退勤時刻より前である必要があります")
 
-def create_log_entry(action: str, admin_username: str, reason: str, request_id: Optional[int] = None) -> str:
-    """操作ログエントリを作成"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-    base_log = f"[{action} {timestamp} by {admin_username}]"
-    
-    if request_id:
-        base_log += f" 申請ID: {request_id}"
+def total_break_seconds(break_start: Optional[datetime],
+                        break_end: Optional[datetime],
+                        break_seconds: Optional[float]) -> Optional[float]:
+    """休憩時間の合計（秒）。break_seconds がなければ break_start〜break_end（休憩が終わっていなければ None）"""
+    if break_seconds is not None:
+        return break_seconds
+    if break_start and break_end:
+        return (break_end - break_start).total_seconds()
+    return None
+
+def calculate_work_hours(clock_in: Optional[datetime],
+                         clock_out: Optional[datetime],
+                         break_start: Optional[datetime],
+                         break_end: Optional[datetime],
+                         break_seconds: Optional[float] = None) -> Tuple[float, float]:
+    """労働時間と休憩時間（時間単位）を計算
+
+    break_seconds（休憩時間の合計）があればそれを使い、なければ break_start〜break_end を休憩とする。
+    """
+    work_hours = 0
+    break_hours = 0
     
-    if reason:
-        base_log += f" {reason}"
+    if clock_in and clock_out:
+        total_time = clock_out - clock_in
+        work_hours = total_time.total_seconds() / 3600
+        
+        total_break = total_break_seconds(break_start, break_end, break_seconds)
+        if total_break is not None:
+            break_hours = total_break / 3600
+            work_hours -= break_hours
     
-    return base_log
\ No newline at end of file
+    return work_hours, break_hours
+
+def is_late(clock_in: Optional[datetime], status: Optional[str], work_start: str) -> bool:
+    """遅刻か（遅刻ステータス、または始業時刻 HH:MM より後の出勤）"""
+    if status == "late":
+        return True
+    if not clock_in:
+        return False
+    return clock_in.strftime('%H:%M:%S') > work_start + ":00"
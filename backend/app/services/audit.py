@@ -0,0 +1,60 @@
+"""
+監査ログの記録
+
+勤怠記録を変更する管理操作は、変更直後に audit_event() で変更前後の値を控え、
+コミット前に write_audit_events() で同じトランザクションに書き込む。
+"""
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..models import AttendanceRecord, AuditEvent
+
+AUDITED_FIELDS = ("clock_in", "clock_out", "break_start", "break_end", "break_seconds", "status", "notes")
+
+def audit_state(record: Optional[AttendanceRecord]) -> Optional[dict]:
+    """監査ログに残す勤怠記録の値（JSONに変換可能な形）"""
+    if record is None:
+        return None
+    state = {}
+    for field in AUDITED_FIELDS:
+        value = getattr(record, field)
+        state[field] = value.isoformat() if isinstance(value, datetime) else value
+    return state
+
+def audit_event(actor_id: int, action: str, record: AttendanceRecord, before: Optional[dict],
+                reason: Optional[str] = None, correction_request_id: Optional[int] = None) -> dict:
+    """監査ログ1件分（変更後の値はこの時点の記録から取る）"""
+    return {
+        "actor_id": actor_id,
+        "action": action,
+        "record": record,
+        "correction_request_id": correction_request_id,
+        "reason": reason,
+        "before": before,
+        "after": audit_state(record),
+        "created_at": datetime.utcnow(),
+    }
+
+def write_audit_events(db: Session, events: List[dict]) -> None:
+    """監査ログを1回の executemany で書き込む（コミットは呼び出し側）"""
+    if not events:
+        return
+    # 新規作成した記録のIDを確定させる
+    if any(event["record"].id is None for event in events):
+        db.flush()
+    db.execute(insert(AuditEvent), [
+        {
+            "actor_id": event["actor_id"],
+            "action": event["action"],
+            "target_type": "attendance_record",
+            "target_id": event["record"].id,
+            "correction_request_id": event["correction_request_id"],
+            "reason": event["reason"],
+            "before": event["before"],
+            "after": event["after"],
+            "created_at": event["created_at"],
+        }
+        for event in events
+    ])
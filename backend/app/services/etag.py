@@ -0,0 +1,49 @@
+"""
+条件付きGET（ETag / If-None-Match）
+
+記録の内容を読み込む前に、対象範囲の件数・更新日時の最大値などの小さな値から ETag を作り、
+クライアントが送った If-None-Match と一致すれば本文なしの 304 を返す。
+Cache-Control: private, no-cache により、ブラウザは応答を保存したうえで毎回再検証する
+（ブラウザの fetch は保存済みの ETag を自動で送るため、フロントエンドの変更は不要）。
+"""
+import hashlib
+from fastapi import Request, Response
+
+ETAG_HEADER = "ETag"
+
+# 利用者ごとの内容のため共有キャッシュには保存させず、毎回再検証させる
+CACHE_CONTROL = "private, no-cache"
+
+# レスポンスの形式を変えた場合は上げる（古い形式の保存済みレスポンスを使わせない）
+ETAG_FORMAT_VERSION = 1
+
+def make_etag(*parts) -> str:
+    """内容を決める値から強い ETag を作成"""
+    digest = hashlib.blake2b(repr((ETAG_FORMAT_VERSION,) + parts).encode("utf-8"), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match に ETag が含まれるか（If-None-Match の比較は弱い比較）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def set_cache_headers(response: Response, etag: str) -> None:
+    response.headers[ETAG_HEADER] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = "Authorization"
+
+def not_modified(etag: str) -> Response:
+    """本文なしの 304 Not Modified"""
+    response = Response(status_code=304)
+    set_cache_headers(response, etag)
+    return response
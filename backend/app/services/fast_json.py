@@ -0,0 +1,54 @@
+"""
+長い一覧レスポンスの高速なJSON出力
+
+ORMオブジェクト → Pydanticモデル（from_attributes）→ dict → json の変換は、一覧が長いと
+CPU時間の大半を占める。必要な列だけを行タプルとして取得し、公開しているスキーマと同じ形の
+dict にして orjson で直接エンコードする（response_model はドキュメント用に残す）。
+orjson がない環境では標準の json を使う（datetime は isoformat で同じ形式になる）。
+"""
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonなしでも標準のjsonで動作する
+    orjson = None
+
+def available() -> bool:
+    """orjsonが利用可能か"""
+    return orjson is not None
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"JSONに変換できない値です: {type(value).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Starlette の JSONResponse と同じ形式（区切りの空白なし・非ASCIIはそのまま）でエンコード"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """dict・list（エンコード済みの bytes も可）を dumps() で返すレスポンス"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+def json_response(content: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """FastJSONResponse を作成（依存性注入の response に設定したヘッダーを引き継ぐ）
+
+    エンドポイントが Response を返すと、FastAPIは注入した response のヘッダー
+    （X-Next-Cursor・ETag など）を反映しないため、ここで移す。
+    """
+    result = FastJSONResponse(content)
+    if response is not None:
+        result.raw_headers.extend(
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-length", b"content-type")
+        )
+    return result
@@ -0,0 +1,117 @@
+"""
+管理者ダッシュボード向けのライブフィード（プロセス内の pub/sub）
+
+打刻（record_attendance）と修正申請の作成（create_correction_request）がコミット後に publish() し、
+GET /admin/live（Server-Sent Events）で接続中の管理者に配信する。
+- メッセージは publish() で1回だけSSE形式にエンコードし、全購読者の待ち行列に同じ bytes を入れる
+- 購読者ごとの待ち行列は LIVE_FEED_QUEUE_SIZE 件まで。あふれた（読み出しが遅い）購読者は切断し、
+  再接続時のスナップショットで最新の状態に戻させる（他の購読者・打刻の処理は待たせない）
+- publish() はスレッドプール（同期エンドポイント）からも呼べる
+購読はワーカープロセスごとのため、複数ワーカーで起動した場合は同じワーカーでの打刻だけが配信される。
+"""
+import asyncio
+import itertools
+import threading
+from typing import Optional, Set
+
+from ..core.config import settings
+from .fast_json import dumps
+
+def sse_message(event: str, data, event_id: Optional[int] = None) -> bytes:
+    """Server-Sent Events の1メッセージ"""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append("data: " + dumps(data).decode("utf-8"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+class LiveFeedFull(Exception):
+    """購読者数が上限に達している"""
+
+class Subscriber:
+    """1接続分の待ち行列（None は切断の合図）"""
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    async def get(self, timeout: float) -> Optional[bytes]:
+        """次のメッセージ（timeout 秒届かなければ b""）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return b""
+
+    def close(self) -> None:
+        # 待ち行列を空にしてから切断の合図を入れる（満杯でも必ず入る）
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class LiveFeed:
+    """購読者への配信（購読・配信はイベントループ上、publish() はどのスレッドからでも可）"""
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = 1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: Set[Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def subscribe(self) -> Subscriber:
+        """購読を開始（上限の確認と登録を同時に行い、上限に達していれば LiveFeedFull）"""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise LiveFeedFull()
+            self._loop = asyncio.get_running_loop()
+            subscriber = Subscriber(self.queue_size)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict) -> None:
+        """イベントを配信（コミット後に呼ぶ。購読者がいなければ何もしない）"""
+        loop = self._loop
+        if not self._subscribers or loop is None:
+            return
+        with self._lock:
+            event_id = next(self._ids)
+            self.published += 1
+        message = sse_message(event, data, event_id)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(message)
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, message)
+        except RuntimeError:
+            # イベントループが終了済み（購読者もいない）
+            pass
+
+    def _dispatch(self, message: bytes) -> None:
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # 読み出しが追いつかない購読者は切断し、再接続時のスナップショットで追いつかせる
+                subscriber.dropped = True
+                subscriber.close()
+                self._subscribers.discard(subscriber)
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+live_feed = LiveFeed(queue_size=settings.LIVE_FEED_QUEUE_SIZE, max_subscribers=settings.LIVE_FEED_MAX_CLIENTS)
@@ -0,0 +1,69 @@
+"""
+キーセット（カーソル）ページネーション
+
+(並び順の列, id) の組を不透明なカーソル文字列にエンコードし、
+OFFSETを使わずに「前ページの最後の行より後」の行を取得する。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import literal, tuple_
+from sqlalchemy.orm import Query
+
+from ..core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """並び順の値とIDからカーソル文字列を作成"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, parse: Callable[[str], Any] = str) -> Tuple[Any, int]:
+    """カーソル文字列を並び順の値とIDに戻す"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return parse(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="無効なカーソルです")
+
+def page_size(limit: Optional[int]) -> int:
+    """ページサイズを上限内に丸める"""
+    if limit is None:
+        return settings.PAGE_SIZE_DEFAULT
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit は1以上を指定してください")
+    return min(limit, settings.PAGE_SIZE_MAX)
+
+def paginate_desc(query: Query, sort_column, id_column,
+                  cursor: Optional[str], limit: Optional[int],
+                  response: Response, parse: Callable[[str], Any] = str) -> List:
+    """(sort_column, id) の降順でキーセットページネーションを適用
+
+    cursor・limit のどちらも指定されない場合は従来通り全件を返す。
+    続きがある場合は次ページのカーソルを X-Next-Cursor ヘッダーで返す。
+    """
+    query = query.order_by(sort_column.desc(), id_column.desc())
+    if cursor is None and limit is None:
+        return query.all()
+
+    size = page_size(limit)
+    if cursor is not None:
+        sort_value, row_id = decode_cursor(cursor, parse)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(
+            literal(sort_value, sort_column.type), literal(row_id, id_column.type)
+        ))
+
+    rows = query.limit(size + 1).all()
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows
@@ -0,0 +1,186 @@
+"""
+今日の在席状況のインデックス（プロセス内）
+
+「今だれが出勤中・休憩中か」のたびに今日の attendance_records を読み、4つの時刻から状態を
+判定する代わりに、user_id -> (状態, その状態になった時刻) をメモリに保持する。
+- 起動時に今日の勤怠記録から1回だけ作り直す（rebuild、休憩中のユーザーは打刻イベントから今の休憩の開始を求める）
+- 打刻（record_attendance）・修正の反映（修正申請の承認・管理者の直接修正）でコミット後に更新し、
+  打刻データの一括取り込み後は作り直す
+- GET /admin/presence は状態ごとの件数と一覧をDBを読まずに返す（ユーザーごとの参照は辞書の1回の参照）
+今日の記録がないユーザーは not_clocked_in（未出勤）として扱い、インデックスには入れない。
+日付が変わった後の最初の参照・更新で空にする（前日の状態は持ち越さない）。
+インデックスはワーカープロセスごとのため、複数ワーカーで起動した場合や backend/main.py（旧版）での打刻は
+同じワーカーでの変更だけが反映される（作り直しは rebuild()）。
+"""
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..core.database import SessionLocal
+from ..models import AttendanceRecord
+from .punch_events import derive_day, load_events
+
+NOT_CLOCKED_IN = "not_clocked_in"
+WORKING = "working"
+ON_BREAK = "on_break"
+CLOCKED_OUT = "clocked_out"
+
+PRESENCE_STATES = (NOT_CLOCKED_IN, WORKING, ON_BREAK, CLOCKED_OUT)
+
+# 打刻の種類 -> 打刻後の在席状況
+PRESENCE_AFTER_ACTION = {
+    "clock_in": WORKING,
+    "break_start": ON_BREAK,
+    "break_end": WORKING,
+    "clock_out": CLOCKED_OUT,
+}
+
+def record_presence(record) -> str:
+    """今日の勤怠記録（ORM・行どちらでも可）から在席状況を求める"""
+    if record is None or record.clock_in is None:
+        return NOT_CLOCKED_IN
+    if record.clock_out is not None:
+        return CLOCKED_OUT
+    if record.break_start is not None and record.break_end is None:
+        return ON_BREAK
+    return WORKING
+
+def record_since(record, state: str) -> Optional[datetime]:
+    """その状態になった時刻（出勤中は出勤・休憩終了の遅い方）
+
+    休憩中は記録の休憩開始（複数回休憩した日は最初の休憩の開始）を返すため、
+    打刻から作り直す場合は rebuild() が今の休憩の開始に置き換える。
+    """
+    if state == CLOCKED_OUT:
+        return record.clock_out
+    if state == ON_BREAK:
+        return record.break_start
+    if state == WORKING:
+        if record.break_end is not None and record.break_end > record.clock_in:
+            return record.break_end
+        return record.clock_in
+    return None
+
+def presence_change(record) -> Tuple[int, str, str, Optional[datetime]]:
+    """勤怠記録からインデックスの更新内容 (user_id, 日付, 状態, 時刻) を作る
+
+    コミットすると ORM オブジェクトの値が失効し、参照のたびに再読み込みされるため、コミット前に呼ぶ。
+    """
+    state = record_presence(record)
+    return record.user_id, record.date, state, record_since(record, state)
+
+class PresenceIndex:
+    """user_id -> (状態, 時刻) と状態ごとの件数（更新はどのスレッドからでも可）"""
+
+    def __init__(self):
+        self._date: Optional[str] = None
+        self._entries: Dict[int, Tuple[str, Optional[datetime]]] = {}
+        self._counts: Counter = Counter()
+        self._built_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now().strftime("%Y-%m-%d")
+
+    def _roll_over(self, today: str) -> None:
+        # 日付が変わったら前日の状態を捨てる（ロック内で呼ぶ）
+        if self._date != today:
+            self._date = today
+            self._entries = {}
+            self._counts = Counter()
+
+    def _set(self, user_id: int, state: str, since: Optional[datetime]) -> None:
+        previous = self._entries.pop(user_id, None)
+        if previous is not None:
+            self._counts[previous[0]] -= 1
+        if state != NOT_CLOCKED_IN:
+            self._entries[user_id] = (state, since)
+            self._counts[state] += 1
+
+    def rebuild(self, db: Optional[Session] = None, today: Optional[str] = None) -> int:
+        """今日の勤怠記録から作り直し、インデックスに入れたユーザー数を返す
+
+        勤怠記録の休憩開始はその日の最初の休憩のため、休憩中のユーザーだけ打刻イベントを読み、
+        今の休憩の開始時刻を since にする（休憩中のユーザーがいなければ1クエリ）。
+        """
+        today = today or self._today()
+        session = db or SessionLocal()
+        try:
+            r = AttendanceRecord
+            rows = session.query(
+                r.user_id, r.clock_in, r.clock_out, r.break_start, r.break_end
+            ).filter(r.date == today, r.clock_in.isnot(None)).all()
+            entries = {}
+            for row in rows:
+                state = record_presence(row)
+                entries[row.user_id] = (state, record_since(row, state))
+            on_break = [(user_id, today) for user_id, (state, _) in entries.items() if state == ON_BREAK]
+            if on_break:
+                for (user_id, _), events in load_events(session, on_break).items():
+                    day = derive_day(events)
+                    if day.on_break:
+                        entries[user_id] = (ON_BREAK, day.breaks[-1][0])
+        finally:
+            if db is None:
+                session.close()
+
+        counts = Counter(state for state, _ in entries.values())
+        with self._lock:
+            self._date = today
+            self._entries = entries
+            self._counts = counts
+            self._built_at = datetime.now()
+        return len(entries)
+
+    def apply_punch(self, user_id: int, action: str, at: Optional[datetime] = None) -> None:
+        """コミット済みの打刻を反映"""
+        state = PRESENCE_AFTER_ACTION.get(action)
+        if state is None:
+            return
+        at = at or datetime.now()
+        with self._lock:
+            self._roll_over(at.strftime("%Y-%m-%d"))
+            self._set(user_id, state, at)
+
+    def apply_changes(self, changes: List[Tuple[int, str, str, Optional[datetime]]]) -> None:
+        """コミット済みの修正（presence_change() の結果）を反映（今日以外の日付は無視）"""
+        today = self._today()
+        with self._lock:
+            self._roll_over(today)
+            for user_id, date, state, since in changes:
+                if date == today:
+                    self._set(user_id, state, since)
+
+    def get(self, user_id: int) -> dict:
+        """1ユーザーの今日の在席状況"""
+        today = self._today()
+        with self._lock:
+            self._roll_over(today)
+            state, since = self._entries.get(user_id, (NOT_CLOCKED_IN, None))
+        return {"user_id": user_id, "date": today, "state": state, "since": since}
+
+    def snapshot(self, state: Optional[str] = None) -> dict:
+        """状態ごとの件数と、記録のあるユーザーの一覧（state を指定するとその状態のみ）"""
+        today = self._today()
+        with self._lock:
+            self._roll_over(today)
+            entries = list(self._entries.items())
+            counts = {s: self._counts[s] for s in PRESENCE_STATES if s != NOT_CLOCKED_IN}
+            built_at = self._built_at
+        users = [
+            {"user_id": user_id, "state": user_state, "since": since}
+            for user_id, (user_state, since) in sorted(entries)
+            if state is None or user_state == state
+        ]
+        return {"date": today, "built_at": built_at, "counts": counts, "users": users}
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._roll_over(self._today())
+            return {s: self._counts[s] for s in PRESENCE_STATES if s != NOT_CLOCKED_IN}
+
+presence_index = PresenceIndex()
@@ -0,0 +1,139 @@
+"""
+打刻（出勤・退勤・休憩開始・終了）の書き込み
+
+打刻は punch_events への追記（INSERT）だけで記録する。その日のイベントを畳み込んだ状態で
+従来と同じ条件・エラーメッセージの検証を行い、イベントを追記する。勤怠記録（キャッシュ）と
+月別ロールアップは services/punch_projection.py が後から反映する。
+同じ日の同時打刻は (user_id, date, seq) の一意制約で検出する。
+複数の打刻（グループコミット・一括取り込み）は plan_punches() でまとめて検証し、
+write_punch_plan() で件数によらず1回の executemany で書き込む。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..models import AttendanceRecord
+from .punch_events import (
+    PUNCH_ACTIONS, append_events, derive_day, event_row, load_day_events, load_events, load_records,
+    punch_state, state_from_record, state_values
+)
+
+ACTION_MESSAGES = {
+    'clock_in': '出勤を記録しました',
+    'clock_out': '退勤を記録しました',
+    'break_start': '休憩開始を記録しました',
+    'break_end': '休憩終了を記録しました'
+}
+
+def apply_punch(db: Session, user_id: int, action: str, notes: Optional[str] = None,
+                now: Optional[datetime] = None) -> int:
+    """打刻をイベントとして記録し、イベントIDを返す（コミットは呼び出し側）"""
+    if action not in PUNCH_ACTIONS:
+        raise HTTPException(status_code=400, detail="無効なアクションです")
+    now = now or datetime.now()
+    today = now.strftime("%Y-%m-%d")
+
+    rows = []
+    events = load_day_events(db, user_id, today)
+    if events:
+        state = derive_day(events)
+        seq = events[-1].seq
+    else:
+        # イベント導入前の記録や、イベントのない記録（generate_dataset.py など）はスナップショットを起点にする
+        record = db.query(AttendanceRecord).filter(
+            AttendanceRecord.user_id == user_id,
+            AttendanceRecord.date == today
+        ).first()
+        state = state_from_record(record)
+        seq = 0
+        if record:
+            seq += 1
+            rows.append(event_row(user_id, today, seq, "snapshot", now, state=state_values(state)))
+
+    state = punch_state(state, action, now, notes or None)
+    rows.append(event_row(user_id, today, seq + 1, action, now, notes=notes or None))
+
+    try:
+        event_ids = append_events(db, rows)
+    except IntegrityError:
+        # この打刻は何も書き込んでいないため、ロールバックは呼び出し側に任せる
+        raise HTTPException(status_code=409, detail="勤怠記録が同時に更新されました。再度お試しください")
+    return event_ids[-1]
+
+class PunchPlan:
+    """まとめて書き込む打刻（イベントと、打刻ごとの採否）"""
+    __slots__ = ("event_rows", "days", "accepted", "rejected", "_rows_by_punch")
+
+    def __init__(self):
+        self.event_rows: List[dict] = []
+        self.days: List[Tuple[int, str]] = []  # イベントを追記する (user_id, date)
+        self.accepted: list = []
+        self.rejected: List[tuple] = []  # (打刻, HTTPException)
+        self._rows_by_punch: Dict[int, int] = {}  # id(打刻) → event_rows の位置
+
+def plan_punches(db: Session, by_key: Dict[Tuple[int, str], list], now: datetime) -> PunchPlan:
+    """(user_id, date) ごとの打刻を並び順に検証し、書き込む内容をまとめる（DBは読み込みのみ）
+
+    打刻は action / timestamp / notes 属性を持つオブジェクト。now（現地時刻）は既存の記録から作る
+    スナップショットの時刻に使い、created_at は UTC で記録する。
+    """
+    plan = PunchPlan()
+    stamp = datetime.utcnow()
+    keys = list(by_key)
+    events = load_events(db, keys)
+    existing = load_records(db, [key for key in keys if key not in events])
+
+    for key, punches in by_key.items():
+        user_id, date = key
+        rows = []
+        if key in events:
+            state = derive_day(events[key])
+            seq = events[key][-1].seq
+        else:
+            record = existing.get(key)
+            state = state_from_record(record)
+            seq = 0
+            if record:
+                seq += 1
+                rows.append(event_row(user_id, date, seq, "snapshot", now, state=state_values(state)))
+
+        accepted = []
+        for punch in punches:
+            try:
+                state = punch_state(state, punch.action, punch.timestamp, punch.notes or None)
+            except HTTPException as e:
+                plan.rejected.append((punch, e))
+                continue
+            seq += 1
+            rows.append(event_row(user_id, date, seq, punch.action, punch.timestamp,
+                                  notes=punch.notes or None, created_at=stamp))
+            accepted.append((punch, len(rows) - 1))
+        if not accepted:
+            continue
+
+        offset = len(plan.event_rows)
+        plan.event_rows.extend(rows)
+        plan.days.append(key)
+        for punch, index in accepted:
+            plan.accepted.append(punch)
+            plan._rows_by_punch[id(punch)] = offset + index
+    return plan
+
+def write_punch_plan(db: Session, plan: PunchPlan) -> Dict[int, int]:
+    """plan_punches() の結果を書き込み、id(打刻) → イベントID を返す（コミットは呼び出し側、seq の競合は IntegrityError）"""
+    if not plan.event_rows:
+        return {}
+    event_ids = append_events(db, plan.event_rows)
+    return {key: event_ids[index] for key, index in plan._rows_by_punch.items()}
+
+def apply_punches(db: Session, punches: list) -> list:
+    """複数の打刻をまとめて適用し、打刻ごとにイベントIDまたは HTTPException を返す（コミットは呼び出し側）"""
+    by_key = {}
+    for punch in punches:
+        by_key.setdefault((punch.user_id, punch.timestamp.strftime("%Y-%m-%d")), []).append(punch)
+    plan = plan_punches(db, by_key, datetime.now())
+    results = write_punch_plan(db, plan)
+    results.update({id(punch): e for punch, e in plan.rejected})
+    return [results[id(punch)] for punch in punches]
@@ -0,0 +1,176 @@
+"""
+打刻のグループコミット（PUNCH_GROUP_COMMIT=true の場合）
+
+始業前後に打刻が集中すると、リクエストごとのコミット（WALへの同期書き込み）が
+順番待ちになる。この場合は各リクエストが打刻を待ち行列に入れて Future を待ち、
+1つの書き込みタスクが PUNCH_BATCH_WINDOW_MS ごと、または PUNCH_BATCH_MAX 件ごとに
+まとめて1トランザクションで apply_punches() を適用してコミットし、全員の Future を完了させる。
+まとめた打刻はイベントを1回の executemany で追記するため、1回あたりの文の数は
+バッチの件数によらない（勤怠記録・ロールアップへの反映は services/punch_projection.py）。
+Future はコミット後にのみ完了するため、レスポンスを返した打刻は必ずコミット済みになる。
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from .punch import apply_punch, apply_punches
+
+class _PendingPunch:
+    __slots__ = ("user_id", "action", "notes", "timestamp", "future")
+
+    def __init__(self, user_id: int, action: str, notes: Optional[str], timestamp: datetime, future: asyncio.Future):
+        self.user_id = user_id
+        self.action = action
+        self.notes = notes
+        self.timestamp = timestamp
+        self.future = future
+
+def _percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+class PunchWriteBuffer:
+    """打刻をまとめてコミットする書き込みバッファ（書き込みタスクはイベントループごとに1つ）"""
+
+    def __init__(self, max_batch: int = 64, window_ms: float = 5.0, history: int = 1000):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.batches = 0
+        self.punches = 0
+        self.fallbacks = 0
+        self._sizes: deque = deque(maxlen=history)
+        self._latencies_ms: deque = deque(maxlen=history)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    async def submit(self, user_id: int, action: str, notes: Optional[str] = None) -> Tuple[int, datetime]:
+        """打刻を待ち行列に入れ、コミット後に (イベントID, 打刻時刻) を返す（適用できない場合は例外）"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._start(loop)
+        pending = _PendingPunch(user_id, action, notes, datetime.now(), loop.create_future())
+        await self._queue.put(pending)
+        return await pending.future, pending.timestamp
+
+    async def start(self) -> None:
+        """現在のイベントループで書き込みタスクを開始（未開始でも最初の submit() で開始される）"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            self._start(loop)
+
+    def _start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """待ち行列に残った打刻を書き込んでから書き込みタスクを止める"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.join()
+        self._task.cancel()
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            try:
+                results = await run_in_threadpool(self._write, batch)
+            except Exception as e:
+                results = [e] * len(batch)
+            self._record(len(batch), (time.perf_counter() - started) * 1000)
+
+            for pending, result in zip(batch, results):
+                if not pending.future.done():
+                    if isinstance(result, BaseException):
+                        pending.future.set_exception(result)
+                    else:
+                        pending.future.set_result(result)
+                self._queue.task_done()
+
+    def _write(self, batch: List[_PendingPunch]) -> list:
+        """まとめて1トランザクションで適用し、打刻ごとのイベントIDまたは例外を返す"""
+        db = SessionLocal()
+        try:
+            # 検証エラーは打刻ごとの結果として返り、同じトランザクションの他の打刻には影響しない
+            results = apply_punches(db, batch)
+            db.commit()
+            return results
+        except Exception:
+            db.rollback()
+        finally:
+            db.close()
+
+        # まとめての書き込みに失敗した場合は1件ずつ書き込み、失敗を該当の打刻だけに限定する
+        with self._lock:
+            self.fallbacks += 1
+        return [self._write_one(pending) for pending in batch]
+
+    @staticmethod
+    def _write_one(pending: _PendingPunch):
+        db = SessionLocal()
+        try:
+            event_id = apply_punch(db, pending.user_id, pending.action, pending.notes, now=pending.timestamp)
+            db.commit()
+            return event_id
+        except Exception as e:
+            db.rollback()
+            return e
+        finally:
+            db.close()
+
+    def _record(self, size: int, latency_ms: float) -> None:
+        with self._lock:
+            self.batches += 1
+            self.punches += size
+            self._sizes.append(size)
+            self._latencies_ms.append(latency_ms)
+
+    def stats(self) -> dict:
+        """バッチサイズ・書き込み時間（直近のバッチ）などの統計情報"""
+        with self._lock:
+            sizes = list(self._sizes)
+            latencies = list(self._latencies_ms)
+            return {
+                "enabled": settings.PUNCH_GROUP_COMMIT,
+                "max_batch": self.max_batch,
+                "window_ms": self.window * 1000,
+                "queued": self._queue.qsize() if self._queue is not None else 0,
+                "batches": self.batches,
+                "punches": self.punches,
+                "fallbacks": self.fallbacks,
+                "batch_size_avg": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "batch_size_max": max(sizes, default=0),
+                "flush_ms_p50": round(_percentile(latencies, 50), 2),
+                "flush_ms_p95": round(_percentile(latencies, 95), 2),
+                "flush_ms_max": round(max(latencies, default=0.0), 2),
+            }
+
+punch_buffer = PunchWriteBuffer(max_batch=settings.PUNCH_BATCH_MAX, window_ms=settings.PUNCH_BATCH_WINDOW_MS)
@@ -0,0 +1,392 @@
+"""
+打刻イベントの畳み込みと再生（replay）
+
+punch_events を (user_id, date) ごとに seq 順に畳み込んだ DayState が1日の勤怠で、
+attendance_records はその結果のキャッシュ（反映は services/punch_projection.py）。
+1日に複数回の休憩は DayState.breaks に保持し、勤怠記録の break_start / break_end には
+実際の「最初の休憩開始」と「最後の休憩終了」を入れ、休憩が複数回の日は break_seconds に
+終了済みの休憩時間の合計を入れる（1回の日は NULL で、break_start〜break_end が休憩時間）。
+休憩時間・労働時間の集計（レポート・ロールアップ・NumPy一括計算）は break_seconds を使う。
+休憩中（最後の休憩が終わっていない間）は break_end を NULL にする。
+"""
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import and_, false, func, insert, or_, select, union_all
+from sqlalchemy.orm import Session
+
+from ..core.database import upsert_insert
+from ..models import AttendanceRecord, PunchEvent
+from .attendance_utils import validate_attendance_times
+from .rollup_deltas import SNAPSHOT_FIELDS, Snapshot
+
+PUNCH_ACTIONS = ("clock_in", "clock_out", "break_start", "break_end")
+
+# 記録全体の値を持つイベント（イベント導入前の記録の取り込み、管理者による修正）
+STATE_ACTIONS = ("snapshot", "correction")
+
+RECORD_FIELDS = ("clock_in", "clock_out", "break_start", "break_end", "break_seconds", "status", "notes")
+
+# IN句1回あたりの件数（SQLiteのパラメータ数上限に収める）
+_IN_CHUNK = 500
+
+class DayState:
+    """1ユーザー・1日分の勤怠（breaks は [開始, 終了] のリスト、休憩中は終了が None）
+
+    勤怠記録・修正の値から作った状態では、breaks[0] が複数回の休憩をまとめた
+    「最初の開始〜最後の終了」の場合があり、その休憩時間の合計を merged_break_seconds に持つ。
+    """
+    __slots__ = ("clock_in", "clock_out", "breaks", "status", "notes", "merged_break_seconds")
+
+    def __init__(self, clock_in: Optional[datetime] = None, clock_out: Optional[datetime] = None,
+                 breaks: Optional[list] = None, status: Optional[str] = None, notes: Optional[str] = None,
+                 merged_break_seconds: Optional[float] = None):
+        self.clock_in = clock_in
+        self.clock_out = clock_out
+        self.breaks = breaks or []
+        self.status = status
+        self.notes = notes
+        self.merged_break_seconds = merged_break_seconds
+
+    def copy(self) -> "DayState":
+        return DayState(self.clock_in, self.clock_out, [list(b) for b in self.breaks], self.status, self.notes,
+                        self.merged_break_seconds)
+
+    @property
+    def on_break(self) -> bool:
+        return bool(self.breaks) and self.breaks[-1][1] is None
+
+def _parse(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+def state_from_record(record) -> DayState:
+    """勤怠記録（ORM・行どちらでも可）から DayState を作成"""
+    if record is None:
+        return DayState()
+    breaks = [[record.break_start, record.break_end]] if record.break_start else []
+    return DayState(record.clock_in, record.clock_out, breaks, record.status, record.notes,
+                    getattr(record, "break_seconds", None) if breaks else None)
+
+def state_from_values(values: dict) -> DayState:
+    """snapshot / correction イベントの値（audit_state() と同じ形式）から DayState を作成"""
+    break_start = _parse(values.get("break_start"))
+    breaks = [[break_start, _parse(values.get("break_end"))]] if break_start else []
+    return DayState(_parse(values.get("clock_in")), _parse(values.get("clock_out")),
+                    breaks, values.get("status"), values.get("notes"),
+                    values.get("break_seconds") if breaks else None)
+
+def state_values(state: DayState) -> dict:
+    """DayState を snapshot イベントに保存する値（JSONに変換可能な形）に変換"""
+    values = record_values(state)
+    return {
+        field: value.isoformat() if isinstance(value, datetime) else value
+        for field, value in values.items()
+    }
+
+def break_seconds(state: DayState) -> Optional[float]:
+    """勤怠記録の break_seconds（終了済みの休憩時間の合計）
+
+    休憩が1回で break_start〜break_end と一致する場合は None（管理者の修正と同じ形）にする。
+    """
+    if len(state.breaks) <= 1 and state.merged_break_seconds is None:
+        return None
+    durations = []
+    for i, (start, end) in enumerate(state.breaks):
+        if i == 0 and state.merged_break_seconds is not None:
+            durations.append(state.merged_break_seconds)
+        elif end is not None:
+            durations.append((end - start).total_seconds())
+    return sum(durations) if durations else None
+
+def record_values(state: DayState) -> dict:
+    """勤怠記録に書き込む値（休憩は最初の開始・最後の終了と、休憩時間の合計）"""
+    return {
+        "clock_in": state.clock_in,
+        "clock_out": state.clock_out,
+        "break_start": state.breaks[0][0] if state.breaks else None,
+        "break_end": state.breaks[-1][1] if state.breaks else None,
+        "break_seconds": break_seconds(state),
+        "status": state.status,
+        "notes": state.notes,
+    }
+
+def rollup_snapshot(state: DayState) -> Snapshot:
+    """ロールアップの差分計算に渡す値"""
+    values = record_values(state)
+    return tuple(values[field] for field in SNAPSHOT_FIELDS)
+
+def apply_event(state: DayState, action: str, occurred_at: datetime,
+                notes: Optional[str] = None, values: Optional[dict] = None) -> None:
+    """イベントを1件適用（記録済みのイベントは検証せずにそのまま適用する）"""
+    if action in STATE_ACTIONS:
+        replaced = state_from_values(values or {})
+        for field in DayState.__slots__:
+            setattr(state, field, getattr(replaced, field))
+        return
+
+    if action == "clock_in":
+        state.clock_in = occurred_at
+        state.status = "present"
+    elif action == "clock_out":
+        state.clock_out = occurred_at
+    elif action == "break_start":
+        state.breaks.append([occurred_at, None])
+    elif action == "break_end" and state.on_break:
+        state.breaks[-1][1] = occurred_at
+    state.notes = notes or state.notes
+
+def _validate(state: DayState) -> None:
+    """各休憩について validate_attendance_times と同じ検証を行う"""
+    if not state.breaks:
+        validate_attendance_times(state.clock_in, state.clock_out, None, None)
+    previous_end = None
+    for start, end in state.breaks:
+        validate_attendance_times(state.clock_in, state.clock_out, start, end)
+        if previous_end and start < previous_end:
+            raise HTTPException(status_code=400, detail="休憩開始時刻は前の休憩終了時刻より後である必要があります")
+        previous_end = end
+
+def punch_state(state: DayState, action: str, now: datetime, notes: Optional[str] = None) -> DayState:
+    """打刻を適用した後の DayState を返す（元の state は変更しない）
+
+    適用できない場合は従来と同じエラーメッセージの HTTPException を送出する。
+    """
+    if action == "clock_in":
+        if state.clock_in:
+            raise HTTPException(status_code=400, detail="既に出勤記録があります")
+    elif action == "clock_out":
+        if not state.clock_in:
+            raise HTTPException(status_code=400, detail="出勤記録がありません")
+        if state.clock_out:
+            raise HTTPException(status_code=400, detail="既に退勤記録があります")
+    elif action == "break_start":
+        if not state.clock_in:
+            raise HTTPException(status_code=400, detail="出勤記録がありません")
+        if state.on_break:
+            raise HTTPException(status_code=400, detail="既に休憩中です")
+        if state.clock_out:
+            raise HTTPException(status_code=400, detail="既に退勤記録があります")
+    elif action == "break_end":
+        if not state.breaks:
+            raise HTTPException(status_code=400, detail="休憩開始記録がありません")
+        if not state.on_break:
+            raise HTTPException(status_code=400, detail="既に休憩終了記録があります")
+    else:
+        raise HTTPException(status_code=400, detail="無効なアクションです")
+
+    state = state.copy()
+    apply_event(state, action, now, notes)
+    _validate(state)
+    return state
+
+def derive_day(events: list) -> DayState:
+    """seq 順のイベントを畳み込む"""
+    state = DayState()
+    for event in events:
+        apply_event(state, event.action, event.occurred_at, event.notes, event.state)
+    return state
+
+def _event_columns():
+    t = PunchEvent
+    return (t.id, t.user_id, t.date, t.seq, t.action, t.occurred_at, t.notes, t.state, t.projected)
+
+def load_day_events(db: Session, user_id: int, date: str) -> list:
+    """1ユーザー・1日分のイベントを seq 順に読み込む"""
+    t = PunchEvent
+    return db.execute(
+        select(*_event_columns()).where(t.user_id == user_id, t.date == date).order_by(t.seq)
+    ).all()
+
+def _key_chunks(keys) -> List[List[Tuple[str, List[int]]]]:
+    """(user_id, date) の組を、日付ごとに user_id をまとめた [(日付, [user_id, ...]), ...] のチャンクに分ける
+
+    1チャンクのパラメータ数（日付 + user_id）は _IN_CHUNK 以下。
+    """
+    chunks, chunk, size = [], [], 0
+    for date, group in groupby(sorted(set(keys), key=itemgetter(1, 0)), key=itemgetter(1)):
+        user_ids = [user_id for user_id, _ in group]
+        while user_ids:
+            if size + 2 > _IN_CHUNK:
+                chunks.append(chunk)
+                chunk, size = [], 0
+            taken, user_ids = user_ids[:_IN_CHUNK - size - 1], user_ids[_IN_CHUNK - size - 1:]
+            chunk.append((date, taken))
+            size += len(taken) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _key_filter(t, chunk: List[Tuple[str, List[int]]]):
+    """_key_chunks() の1チャンクの組だけに一致する条件
+
+    (user_id, date) の行値INはインデックスが使われないため、日付ごとの「date = ? AND user_id IN (...)」のORにする
+    （各項は (user_id, date) のインデックスで引ける）。
+    """
+    return or_(*(and_(t.date == date, t.user_id.in_(user_ids)) for date, user_ids in chunk))
+
+def load_events(db: Session, keys: List[Tuple[int, str]]) -> Dict[Tuple[int, str], list]:
+    """(user_id, date) ごとのイベントを seq 順に読み込む"""
+    t = PunchEvent
+    events = {}
+    for chunk in _key_chunks(keys):
+        for row in db.execute(
+            select(*_event_columns()).where(_key_filter(t, chunk)).order_by(t.user_id, t.date, t.seq)
+        ):
+            events.setdefault((row.user_id, row.date), []).append(row)
+    return events
+
+def load_records(db: Session, keys: List[Tuple[int, str]]) -> Dict[Tuple[int, str], tuple]:
+    """(user_id, date) ごとの既存の勤怠記録を読み込む"""
+    t = AttendanceRecord
+    records = {}
+    for chunk in _key_chunks(keys):
+        for row in db.execute(
+            select(t.id, t.user_id, t.date, *[getattr(t, field) for field in RECORD_FIELDS])
+            .where(_key_filter(t, chunk))
+        ):
+            records[(row.user_id, row.date)] = row
+    return records
+
+def last_seqs(db: Session, keys: List[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    """(user_id, date) ごとの最後の seq（イベントがなければ含まない）"""
+    t = PunchEvent
+    seqs = {}
+    for chunk in _key_chunks(keys):
+        for user_id, date, seq in db.execute(
+            select(t.user_id, t.date, func.max(t.seq)).where(_key_filter(t, chunk)).group_by(t.user_id, t.date)
+        ):
+            seqs[(user_id, date)] = seq
+    return seqs
+
+def event_row(user_id: int, date: str, seq: int, action: str, occurred_at: datetime,
+              notes: Optional[str] = None, state: Optional[dict] = None,
+              actor_id: Optional[int] = None, created_at: Optional[datetime] = None) -> dict:
+    """append_events() に渡すイベント1件分"""
+    return {
+        "user_id": user_id,
+        "date": date,
+        "seq": seq,
+        "action": action,
+        "occurred_at": occurred_at,
+        "notes": notes,
+        "state": state,
+        "actor_id": actor_id,
+        "created_at": created_at or datetime.utcnow(),
+    }
+
+def append_events(db: Session, rows: List[dict]) -> List[int]:
+    """イベントを1回の executemany で追記し、行と同じ順のイベントIDを返す（seq の重複は IntegrityError になる）"""
+    if not rows:
+        return []
+    return list(db.scalars(insert(PunchEvent).returning(PunchEvent.id, sort_by_parameter_order=True), rows))
+
+def append_correction_events(db: Session, audit_events: List[dict]) -> None:
+    """管理者による修正を correction イベントとして追記（audit_event() の結果をそのまま使う）"""
+    if not audit_events:
+        return
+    keys = [(event["record"].user_id, event["record"].date) for event in audit_events]
+    seqs = last_seqs(db, keys)
+    rows = []
+    for (user_id, date), event in zip(keys, audit_events):
+        seqs[(user_id, date)] = seqs.get((user_id, date), 0) + 1
+        rows.append(event_row(
+            user_id, date, seqs[(user_id, date)], "correction", event["created_at"],
+            state=event["after"], actor_id=event["actor_id"], created_at=event["created_at"]
+        ))
+    append_events(db, rows)
+
+def upsert_record_statement(db: Session):
+    """畳み込んだ値で勤怠記録を作成・更新するUPSERT（executemany 可）"""
+    t = AttendanceRecord
+    stmt = upsert_insert(db, t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.user_id, t.date],
+        set_={
+            **{field: getattr(stmt.excluded, field) for field in RECORD_FIELDS},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+
+def user_days(db: Session, user_id: int, dates: List[str],
+              start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Tuple[DayState, bool]]:
+    """ユーザーの日ごとのイベントを畳み込んだ状態と、未反映のイベントがあるか（読み込みのみ）
+
+    dates の範囲の日（勤怠記録のある日）と、期間内で未反映のイベントがある日を1クエリで読む。
+    未反映の日は勤怠記録がまだ古い（またはない）ため、反映を待たずにこの状態を返すのに使う。
+    """
+    t = PunchEvent
+    pending = select(*_event_columns()).where(t.user_id == user_id, t.projected == false())
+    if start_date:
+        pending = pending.where(t.date >= start_date)
+    if end_date:
+        pending = pending.where(t.date <= end_date)
+    query = pending
+    if dates:
+        query = union_all(
+            select(*_event_columns()).where(t.user_id == user_id, t.date.between(min(dates), max(dates))),
+            pending,
+        )
+    # 各部分が別のインデックスを使えるよう、並べ替えと重複の除去はここで行う
+    rows = {row.id: row for row in db.execute(query)}
+    days = {}
+    for date, events in groupby(sorted(rows.values(), key=lambda row: (row.date, row.seq)), key=lambda row: row.date):
+        events = list(events)
+        days[date] = (derive_day(events), not all(event.projected for event in events))
+    return days
+
+def _record_differs(record, values: dict) -> List[str]:
+    return [field for field in RECORD_FIELDS if getattr(record, field) != values[field]]
+
+def replay_records(db: Session, rebuild: bool = False, chunk_size: int = 1000) -> List[str]:
+    """イベントを畳み込んで勤怠記録と比較し、差異の説明を返す
+
+    rebuild=True の場合は差異のある記録をイベントから作り直す（コミットと
+    ロールアップの再作成は呼び出し側）。イベントのない記録は対象外。
+    """
+    t = PunchEvent
+    problems = []
+    statement = upsert_record_statement(db)
+    stream = db.execute(
+        select(*_event_columns()).order_by(t.user_id, t.date, t.seq).execution_options(yield_per=10_000)
+    )
+
+    def flush(days: Dict[Tuple[int, str], DayState]) -> None:
+        r = AttendanceRecord
+        records = {}
+        for user_id in sorted({user_id for user_id, _ in days}):
+            dates = [date for uid, date in days if uid == user_id]
+            for record in db.execute(
+                select(r.user_id, r.date, *[getattr(r, field) for field in RECORD_FIELDS])
+                .where(r.user_id == user_id, r.date.between(min(dates), max(dates)))
+            ):
+                records[(record.user_id, record.date)] = record
+
+        now = datetime.utcnow()
+        params = []
+        for (user_id, date), state in days.items():
+            values = record_values(state)
+            record = records.get((user_id, date))
+            if record is None:
+                problems.append(f"ユーザーID {user_id} / {date}: 勤怠記録がありません")
+            else:
+                fields = _record_differs(record, values)
+                if not fields:
+                    continue
+                problems.append(f"ユーザーID {user_id} / {date}: {', '.join(fields)} がイベントと一致しません")
+            params.append({"user_id": user_id, "date": date, **values, "created_at": now, "updated_at": now})
+        if rebuild and params:
+            db.execute(statement, params)
+
+    days = {}
+    for key, events in groupby(stream, key=lambda row: (row.user_id, row.date)):
+        days[key] = derive_day(list(events))
+        if len(days) >= chunk_size:
+            flush(days)
+            days = {}
+    if days:
+        flush(days)
+    return problems
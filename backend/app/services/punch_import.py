@@ -0,0 +1,164 @@
+"""
+打刻データの一括取り込み（タイムレコーダーのバッファ送信・過去データの移行用）
+
+CSV / JSON / NDJSON の (ユーザー, 時刻, アクション) を解析し、(user_id, date) ごとに
+その日の打刻イベントを畳み込んだ状態へ時刻順で punch_state() の規則
+（validate_attendance_times を含む）を適用する（services/punch.py の plan_punches()）。
+書き込みは一定件数ごとのトランザクションで、打刻イベントの追記を1回の executemany で行う
+（勤怠記録・月別ロールアップへの反映は services/punch_projection.py）。
+取り込み中に同じ日へ打刻があった場合は seq の一意制約で検出し、そのチャンクを失敗として返す。
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import User
+from .punch import plan_punches, write_punch_plan
+
+IMPORT_FORMATS = ("csv", "json", "ndjson")
+
+# 1リクエストあたりの推奨件数（IMPORT_MAX_BYTES の既定 20MiB に、どの形式でも収まる件数）
+IMPORT_RECOMMENDED_ROWS = 100_000
+
+# IN句1回あたりの件数（SQLiteのパラメータ数上限に収める）
+_IN_CHUNK = 500
+
+class Punch:
+    __slots__ = ("row", "user_id", "username", "timestamp", "action", "notes")
+
+    def __init__(self, row: int, user_id: Optional[int], username: Optional[str],
+                 timestamp: datetime, action: str, notes: Optional[str]):
+        self.row = row
+        self.user_id = user_id
+        self.username = username
+        self.timestamp = timestamp
+        self.action = action
+        self.notes = notes
+
+def _iter_items(body: bytes, fmt: str) -> Iterator[Tuple[int, dict]]:
+    """(行番号, 項目の辞書) を返す（行番号はデータ行の1始まり）"""
+    text = body.decode("utf-8-sig")
+    if fmt == "csv":
+        for row, item in enumerate(csv.DictReader(io.StringIO(text)), start=1):
+            yield row, item
+    elif fmt == "ndjson":
+        for row, line in enumerate(text.splitlines(), start=1):
+            if line.strip():
+                yield row, json.loads(line)
+    else:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("punches", [])
+        for row, item in enumerate(data, start=1):
+            yield row, item
+
+def _parse_timestamp(value: str) -> datetime:
+    timestamp = datetime.fromisoformat(value.strip())
+    if timestamp.tzinfo is not None:
+        # タイムゾーン付きはサーバーのローカル時刻に揃える（打刻APIと同じ基準）
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
+
+def parse_punches(body: bytes, fmt: str, errors: List[dict]) -> List[Punch]:
+    """打刻データを解析（不正な行は errors に追加して読み飛ばす）"""
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="無効な形式です（csv, json, ndjson）")
+
+    punches = []
+    try:
+        for row, item in _iter_items(body, fmt):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("オブジェクトではありません")
+                user_id = item.get("user_id")
+                username = item.get("username")
+                if user_id in (None, "") and not username:
+                    raise ValueError("user_id または username が必要です")
+                punches.append(Punch(
+                    row=row,
+                    user_id=int(user_id) if user_id not in (None, "") else None,
+                    username=username or None,
+                    timestamp=_parse_timestamp(item["timestamp"]),
+                    action=item["action"],
+                    notes=item.get("notes") or None,
+                ))
+            except KeyError as e:
+                errors.append({"row": row, "error": f"{e.args[0]} がありません"})
+            except (TypeError, ValueError) as e:
+                errors.append({"row": row, "error": f"形式が正しくありません: {e}"})
+    except (UnicodeDecodeError, ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"データを解析できません: {e}")
+    return punches
+
+def _chunks(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _resolve_users(db: Session, punches: List[Punch], errors: List[dict]) -> List[Punch]:
+    """ユーザー名をIDに変換し、存在しないユーザーの打刻を除外"""
+    usernames = sorted({p.username for p in punches if p.user_id is None})
+    ids_by_name = {}
+    for chunk in _chunks(usernames, _IN_CHUNK):
+        ids_by_name.update(db.execute(
+            select(User.username, User.id).where(User.username.in_(chunk))
+        ).all())
+
+    user_ids = sorted({p.user_id for p in punches if p.user_id is not None})
+    known_ids = set(ids_by_name.values())
+    for chunk in _chunks(user_ids, _IN_CHUNK):
+        known_ids.update(db.scalars(select(User.id).where(User.id.in_(chunk))))
+
+    resolved = []
+    for punch in punches:
+        if punch.user_id is None:
+            punch.user_id = ids_by_name.get(punch.username)
+        if punch.user_id is None or punch.user_id not in known_ids:
+            errors.append({"row": punch.row, "error": "ユーザーが見つかりません"})
+            continue
+        resolved.append(punch)
+    return resolved
+
+def import_punches(db: Session, body: bytes, fmt: str) -> dict:
+    """打刻データを一括で取り込み、件数と行ごとのエラーを返す"""
+    errors: List[dict] = []
+    punches = _resolve_users(db, parse_punches(body, fmt, errors), errors)
+    received = len(punches) + len(errors)
+
+    by_key: Dict[Tuple[int, str], List[Punch]] = {}
+    for punch in punches:
+        by_key.setdefault((punch.user_id, punch.timestamp.date().isoformat()), []).append(punch)
+
+    applied = 0
+    records_written = 0
+    for keys in _chunks(sorted(by_key), settings.IMPORT_CHUNK_SIZE):
+        plan = plan_punches(db, {
+            key: sorted(by_key[key], key=lambda p: (p.timestamp, p.row)) for key in keys
+        }, datetime.now())
+        errors.extend({"row": punch.row, "error": e.detail} for punch, e in plan.rejected)
+        if not plan.days:
+            continue
+        try:
+            write_punch_plan(db, plan)
+            db.commit()
+        except Exception:
+            db.rollback()
+            errors.extend({"row": punch.row, "error": "データベースへの書き込みに失敗しました"} for punch in plan.accepted)
+            continue
+        applied += len(plan.accepted)
+        records_written += len(plan.days)
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "received": received,
+        "applied": applied,
+        "rejected": len(errors),
+        "records_written": records_written,
+        "errors": errors[:settings.IMPORT_MAX_ERRORS],
+        "errors_truncated": len(errors) > settings.IMPORT_MAX_ERRORS,
+    }
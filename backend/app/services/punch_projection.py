@@ -0,0 +1,171 @@
+"""
+打刻イベントの勤怠記録・月別ロールアップへの反映（projection）
+
+打刻（services/punch.py）は punch_events への INSERT だけを行い、勤怠記録と月別ロールアップは
+このモジュールが後から作る。未反映のイベント（projected が偽）がある (user_id, date) をイベントから
+畳み込み直して、変化した勤怠記録の UPSERT とロールアップの差分更新をそれぞれ1回の executemany で行い、
+畳み込んだイベントを同じトランザクションで反映済みにする。
+反映は畳み込んだ結果を書き込むだけなので冪等で、同じ日を何度反映しても結果は変わらない。
+
+反映済みの位置（イベントIDの最大値）ではなくイベントごとに反映済みかを持つのは、PostgreSQL では
+連番の採番順とコミット順が一致せず、大きいIDより後にコミットされたイベントを読み飛ばすため。
+畳み込んだ後にコミットされたイベントは反映済みにならず、次の反映で読まれる。
+
+反映するタイミング:
+- PunchProjector が PUNCH_PROJECTION_INTERVAL_MS ごとに未反映のイベントをまとめて反映する
+- 勤怠記録の取得（GET /attendance/・/today）は反映しない（書き込みロックを取らずに、未反映の日を
+  services/punch_events.py の user_days() でメモリ上で畳み込んで返す）
+- 管理者の修正・修正申請の承認は、対象の日を同じトランザクションで先に反映してから修正する
+レポート（月別ロールアップ）は最大で反映の間隔だけ遅れる（結果整合）。
+
+反映は書き込み用セッション（SQLiteでは BEGIN IMMEDIATE）で行い、PostgreSQL ではトランザクション単位の
+アドバイザリロックで1つずつ行う（同じ日を同時に反映してロールアップの差分を二重に加算しないように）。
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import false, select, text, update
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal, WriteSessionLocal
+from ..models import PunchEvent
+from .punch_events import (
+    RECORD_FIELDS, derive_day, load_events, load_records, record_values, rollup_snapshot, upsert_record_statement
+)
+from .rollups import add_rollup_delta, apply_rollup_deltas, snapshot
+
+logger = logging.getLogger(__name__)
+
+# PostgreSQL で反映を直列化するアドバイザリロックのキー
+PROJECTION_LOCK_KEY = 0x70756E6368
+
+# 反映済みにするIDの1回あたりの件数（SQLiteのパラメータ数上限に収める）
+_MARK_CHUNK = 500
+
+def _lock_projection(db: Session) -> None:
+    """PostgreSQL ではトランザクションの終わりまで他の反映を待たせる（SQLite は書き込みロックで直列化済み）"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PROJECTION_LOCK_KEY})
+
+def mark_projected(db: Session, event_ids: List[int]) -> None:
+    """イベントを反映済みにする（コミットは呼び出し側）"""
+    t = PunchEvent
+    for i in range(0, len(event_ids), _MARK_CHUNK):
+        db.execute(update(t).where(t.id.in_(event_ids[i:i + _MARK_CHUNK])).values(projected=True))
+
+def pending_days(db: Session, user_id: Optional[int] = None) -> List[Tuple[int, str]]:
+    """未反映のイベントがある (user_id, date)（user_id 指定時はそのユーザーのみ）"""
+    t = PunchEvent
+    query = select(t.user_id, t.date).where(t.projected == false()).distinct()
+    if user_id is not None:
+        query = query.where(t.user_id == user_id)
+    return [(row.user_id, row.date) for row in db.execute(query)]
+
+def project_days(db: Session, keys: List[Tuple[int, str]]) -> int:
+    """(user_id, date) ごとにイベントを畳み込んで勤怠記録・ロールアップに反映し、書き込んだ記録数を返す
+
+    畳み込んだ未反映のイベントは反映済みにする。コミットは呼び出し側。
+    イベントのない日と、既に反映済みの値と同じ日は書き込まない。
+    """
+    keys = list(set(keys))
+    if not keys:
+        return 0
+    _lock_projection(db)
+    events = load_events(db, keys)
+    if not events:
+        return 0
+    records = load_records(db, list(events))
+
+    stamp = datetime.utcnow()
+    params = []
+    deltas = {}
+    for (user_id, date), day_events in events.items():
+        state = derive_day(day_events)
+        values = record_values(state)
+        record = records.get((user_id, date))
+        if record is not None and all(getattr(record, field) == values[field] for field in RECORD_FIELDS):
+            continue
+        params.append({"user_id": user_id, "date": date, **values, "created_at": stamp, "updated_at": stamp})
+        add_rollup_delta(deltas, user_id, date, snapshot(record), rollup_snapshot(state))
+    if params:
+        db.execute(upsert_record_statement(db), params)
+        apply_rollup_deltas(db, deltas)
+    mark_projected(db, [event.id for day_events in events.values() for event in day_events if not event.projected])
+    return len(params)
+
+def project_pending(db: Session, batch_size: Optional[int] = None) -> int:
+    """未反映のイベントを最大 batch_size 件読み、その日を反映する（コミットは呼び出し側）
+
+    読んだイベント数を返す。
+    """
+    t = PunchEvent
+    rows = db.execute(
+        select(t.user_id, t.date).where(t.projected == false())
+        .order_by(t.id).limit(batch_size or settings.PUNCH_PROJECTION_BATCH)
+    ).all()
+    if not rows:
+        return 0
+    project_days(db, [(row.user_id, row.date) for row in rows])
+    return len(rows)
+
+def catch_up(batch_size: Optional[int] = None) -> int:
+    """未反映のイベントをすべて反映し、反映したイベント数を返す（1バッチごとにコミット）"""
+    batch_size = batch_size or settings.PUNCH_PROJECTION_BATCH
+    with SessionLocal() as db:
+        # 反映するものがなければ書き込みロックを取らない
+        if not pending_days(db):
+            return 0
+    total = 0
+    while True:
+        with WriteSessionLocal() as db:
+            count = project_pending(db, batch_size)
+            db.commit()
+        total += count
+        if count < batch_size:
+            return total
+
+class PunchProjector:
+    """未反映の打刻イベントを一定間隔で反映するバックグラウンドタスク"""
+
+    def __init__(self, interval_ms: float = 1000.0, batch_size: int = 5000):
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        self.runs = 0
+        self.projected = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """現在のイベントループで反映タスクを開始（interval が 0 の場合は何もしない）"""
+        if self.interval <= 0 or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """反映タスクを止める（未反映のイベントは次回の起動時に反映される）"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                projected = await run_in_threadpool(catch_up, self.batch_size)
+            except Exception:
+                # ロック待ちのタイムアウトなどは次の周期で再試行する
+                logger.exception("打刻イベントの反映に失敗しました")
+                continue
+            self.runs += 1
+            self.projected += projected
+
+punch_projector = PunchProjector(
+    interval_ms=settings.PUNCH_PROJECTION_INTERVAL_MS, batch_size=settings.PUNCH_PROJECTION_BATCH
+)
@@ -0,0 +1,61 @@
+"""
+月別ロールアップの差分計算（DBアクセスなし）
+
+勤怠記録1件がロールアップに寄与する値と、変更前後の差分を (user_id, 月) ごとに積み上げる処理。
+集計規則は services/aggregation.py のSQL集計と同じ。
+このモジュールは app.core.database に依存しないため、
+レガシーな backend/main.py からも利用できる（書き込みは services/rollups.py 参照）。
+"""
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+from .attendance_utils import calculate_work_hours, is_late
+
+COUNTERS = ("record_count", "worked_seconds", "break_seconds",
+            "days_present", "late_count", "absent_count")
+
+# (clock_in, clock_out, break_start, break_end, break_seconds, status)
+Snapshot = Tuple[Optional[datetime], Optional[datetime], Optional[datetime], Optional[datetime],
+                 Optional[float], Optional[str]]
+
+# スナップショットに含める勤怠記録の項目
+SNAPSHOT_FIELDS = ("clock_in", "clock_out", "break_start", "break_end", "break_seconds", "status")
+
+def snapshot(record) -> Optional[Snapshot]:
+    """勤怠記録の集計対象項目を取り出す（記録がなければ None）"""
+    if record is None:
+        return None
+    return tuple(getattr(record, field) for field in SNAPSHOT_FIELDS)
+
+def record_contribution(snap: Optional[Snapshot]) -> dict:
+    """勤怠記録1件がロールアップに寄与する値"""
+    if snap is None:
+        return dict.fromkeys(COUNTERS, 0)
+    clock_in, clock_out, break_start, break_end, break_seconds, status = snap
+    work_hours, break_hours = calculate_work_hours(clock_in, clock_out, break_start, break_end, break_seconds)
+    return {
+        "record_count": 1,
+        "worked_seconds": work_hours * 3600,
+        "break_seconds": break_hours * 3600,
+        "days_present": 1 if clock_in else 0,
+        "late_count": 1 if is_late(clock_in, status, settings.WORK_START_TIME) else 0,
+        "absent_count": 1 if status == "absent" or not clock_in else 0,
+    }
+
+def add_rollup_delta(deltas: Dict[Tuple[int, str], dict], user_id: int, date: str,
+                     before: Optional[Snapshot], after: Optional[Snapshot]) -> None:
+    """変更前後の差分を (user_id, 月) ごとの差分に積み上げる"""
+    old = record_contribution(before)
+    new = record_contribution(after)
+    total = deltas.setdefault((user_id, date[:7]), dict.fromkeys(COUNTERS, 0))
+    for key in COUNTERS:
+        total[key] += new[key] - old[key]
+
+def rollup_params(deltas: Dict[Tuple[int, str], dict], now: datetime) -> list:
+    """ロールアップに加算する行（差分のないものは除く）"""
+    return [
+        {"user_id": user_id, "month": month, "updated_at": now, **delta}
+        for (user_id, month), delta in deltas.items()
+        if any(delta.values())
+    ]
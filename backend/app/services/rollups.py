@@ -0,0 +1,87 @@
+"""
+ユーザー別・月別ロールアップの差分更新
+
+勤怠記録を変更する処理は、変更前後のスナップショットを apply_rollup_delta() に渡し、
+同じトランザクション内で monthly_attendance_rollups を差分更新する。
+差分の計算は services/rollup_deltas.py、集計規則は services/aggregation.py のSQL集計と同じ。
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, literal, select
+from sqlalchemy.orm import Session
+
+from ..core.database import upsert_insert
+from ..models import MonthlyAttendanceRollup
+from .aggregation import aggregate_work_hours, build_work_hours_query
+from .rollup_deltas import COUNTERS, Snapshot, add_rollup_delta, rollup_params, snapshot
+
+def apply_rollup_delta(db: Session, user_id: int, date: str,
+                       before: Optional[Snapshot], after: Optional[Snapshot]) -> None:
+    """変更前後の差分をロールアップに加算（コミットは呼び出し側）"""
+    deltas = {}
+    add_rollup_delta(deltas, user_id, date, before, after)
+    apply_rollup_deltas(db, deltas)
+
+def apply_rollup_deltas(db: Session, deltas: Dict[Tuple[int, str], dict]) -> None:
+    """積み上げた差分を1回の executemany でロールアップに加算（コミットは呼び出し側）"""
+    params = rollup_params(deltas, datetime.utcnow())
+    if not params:
+        return
+
+    t = MonthlyAttendanceRollup
+    stmt = upsert_insert(db, t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.user_id, t.month],
+        set_={
+            **{key: getattr(t, key) + getattr(stmt.excluded, key) for key in COUNTERS},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt, params)
+
+def rebuild_rollups(db: Session) -> int:
+    """ロールアップを勤怠記録から全件再作成し、作成件数を返す（コミットは呼び出し側）"""
+    dialect = db.get_bind().dialect.name
+    aggregated = build_work_hours_query(dialect, "month").subquery()
+    source = select(
+        aggregated.c.user_id,
+        aggregated.c.period,
+        *[aggregated.c[key] for key in COUNTERS],
+        literal(datetime.utcnow(), MonthlyAttendanceRollup.updated_at.type),
+    )
+    t = MonthlyAttendanceRollup
+    db.execute(delete(t))
+    result = db.execute(t.__table__.insert().from_select(
+        ["user_id", "month", *COUNTERS, "updated_at"], source
+    ))
+    return result.rowcount
+
+def verify_rollups(db: Session) -> List[str]:
+    """ロールアップと勤怠記録のSQL集計を比較し、差異の説明を返す"""
+    expected = {
+        (row["user_id"], row["period"]): row
+        for row in aggregate_work_hours(db, "month")
+    }
+    actual = {
+        (row.user_id, row.month): row
+        for row in db.query(MonthlyAttendanceRollup).all()
+    }
+
+    problems = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want, got = expected.get(key), actual.get(key)
+        if want is None:
+            if got.record_count:
+                problems.append(f"ユーザーID {key[0]} / {key[1]}: 勤怠記録のないロールアップがあります")
+            continue
+        if got is None:
+            problems.append(f"ユーザーID {key[0]} / {key[1]}: ロールアップがありません")
+            continue
+        for counter in COUNTERS:
+            # 秒数は浮動小数点の積み上げのため、1秒以内の差は許容
+            tolerance = 1 if counter.endswith("_seconds") else 0
+            if abs(want[counter] - getattr(got, counter)) > tolerance:
+                problems.append(
+                    f"ユーザーID {key[0]} / {key[1]}: {counter} {getattr(got, counter)} != {want[counter]}"
+                )
+    return problems
@@ -0,0 +1,215 @@
+"""
+勤怠時間の一括計算（NumPy）
+
+出勤・退勤・休憩の各時刻をDBから int64 のエポックミリ秒として取得し（休憩時間の合計 break_seconds はそのまま）、
+労働時間・休憩時間・残業時間・遅刻時間を結果セット全体の配列演算で計算する。
+計算規則は attendance_utils.calculate_work_hours / is_late と同じ。
+NumPyが利用できない環境では available() が False を返し、呼び出し側は行ごとの計算を使う。
+NumPyの読み込みは起動時間に影響するため、available() の初回呼び出し時に行う。
+"""
+from functools import lru_cache
+from operator import attrgetter
+from typing import TYPE_CHECKING, Dict, List, Optional
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import AttendanceRecord
+
+if TYPE_CHECKING:
+    import numpy as np
+
+TIMESTAMP_COLUMNS = ("clock_in", "clock_out", "break_start", "break_end")
+
+# NULLを表す値（有効な時刻とは衝突しない）
+MISSING = -(2 ** 63)
+
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 86_400_000
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """NumPyのモジュール（初回呼び出し時に読み込む。利用できなければ None）"""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - NumPyなしでも行ごとの計算で動作する
+        return None
+    return numpy
+
+def available() -> bool:
+    """NumPyが利用可能か（初回呼び出し時に読み込む）"""
+    return _numpy() is not None
+
+def round_hours(seconds: "np.ndarray", ndigits: int = 2) -> List[float]:
+    """秒の配列を時間に換算して丸めたリスト（行ごとの計算の round(値, 2) に対応）"""
+    return _numpy().round(seconds / 3600, ndigits).tolist()
+
+def epoch_ms(dialect: str, column):
+    """日時列をエポックミリ秒（整数）に変換するSQL式"""
+    if dialect == "postgresql":
+        return cast(func.round(func.extract("epoch", column) * 1000), Integer)
+    return cast(func.round((func.julianday(column) - 2440587.5) * MS_PER_DAY), Integer)
+
+def epoch_columns(dialect: str) -> list:
+    """SELECT句に加えるエポックミリ秒列（ラベルは <列名>_ms）"""
+    return [
+        epoch_ms(dialect, getattr(AttendanceRecord, name)).label(f"{name}_ms")
+        for name in TIMESTAMP_COLUMNS
+    ]
+
+def _parse_time_ms(time_str: str) -> int:
+    hour, minute = map(int, time_str.split(':'))
+    return (hour * 60 + minute) * 60_000
+
+def to_arrays(rows: List, columns=TIMESTAMP_COLUMNS) -> Dict[str, "np.ndarray"]:
+    """<列名>_ms を持つ行のリストを int64 配列（NULLは MISSING）に変換"""
+    if not available():
+        raise RuntimeError("NumPyがインストールされていません")
+    np = _numpy()
+    arrays = {}
+    for name in columns:
+        # None は float64 変換で NaN になる（エポックミリ秒は 2**53 未満のため誤差なし）
+        values = np.array(list(map(attrgetter(f"{name}_ms"), rows)), dtype=np.float64)
+        arrays[name] = np.where(np.isnan(values), MISSING, values).astype(np.int64)
+    # 休憩時間の合計（秒、NULLは NaN で break_start〜break_end を使う）
+    arrays["break_seconds"] = np.array(
+        [getattr(row, "break_seconds", None) for row in rows], dtype=np.float64
+    )
+    arrays["status"] = np.array(list(map(attrgetter("status"), rows)), dtype=object)
+    return arrays
+
+def compute_work_time(arrays: Dict[str, "np.ndarray"],
+                      work_start: Optional[str] = None,
+                      standard_hours: Optional[float] = None) -> Dict[str, "np.ndarray"]:
+    """配列全体の労働時間・休憩時間・残業時間・遅刻時間（秒）を計算"""
+    work_start = work_start or settings.WORK_START_TIME
+    standard_hours = settings.STANDARD_WORK_HOURS if standard_hours is None else standard_hours
+    np = _numpy()
+
+    clock_in = arrays["clock_in"]
+    clock_out = arrays["clock_out"]
+    break_start = arrays["break_start"]
+    break_end = arrays["break_end"]
+
+    has_in = clock_in != MISSING
+    has_work = has_in & (clock_out != MISSING)
+    has_break = has_work & (break_start != MISSING) & (break_end != MISSING)
+
+    break_ms = np.where(has_break, break_end - break_start, 0)
+    if "break_seconds" in arrays:
+        # 休憩時間の合計がある記録はそれを使う
+        total = arrays["break_seconds"]
+        total_ms = np.round(np.nan_to_num(total) * 1000).astype(np.int64)
+        break_ms = np.where(has_work & ~np.isnan(total), total_ms, break_ms)
+    work_ms = np.where(has_work, clock_out - clock_in - break_ms, 0)
+    overtime_ms = np.maximum(work_ms - int(standard_hours * MS_PER_HOUR), 0)
+
+    # 時刻部分（秒単位に切り捨て）が始業時刻より後なら遅刻
+    time_of_day_ms = np.where(has_in, np.mod(clock_in, MS_PER_DAY), 0)
+    late_ms = np.where(has_in, np.maximum(time_of_day_ms - _parse_time_ms(work_start), 0), 0)
+    is_late = (has_in & (time_of_day_ms // 1000 * 1000 > _parse_time_ms(work_start)))
+    if "status" in arrays:
+        is_late |= arrays["status"] == "late"
+
+    return {
+        "work_seconds": work_ms / 1000,
+        "break_seconds": break_ms / 1000,
+        "overtime_seconds": overtime_ms / 1000,
+        "late_seconds": late_ms / 1000,
+        "is_late": is_late,
+        "present": has_in,
+    }
+
+def fetch_work_time_rows(db: Session, filters: list) -> List:
+    """集計に必要な列（時刻はエポックミリ秒）のみをタプルで取得"""
+    dialect = db.get_bind().dialect.name
+    stmt = select(
+        AttendanceRecord.user_id,
+        AttendanceRecord.status,
+        AttendanceRecord.break_seconds,
+        *epoch_columns(dialect)
+    ).where(*filters)
+    return db.execute(stmt).all()
+
+def _totals_row_by_row(rows: List) -> List[dict]:
+    """NumPyが利用できない場合の行ごとの計算（規則は compute_work_time と同じ）"""
+    start_ms = _parse_time_ms(settings.WORK_START_TIME)
+    standard_ms = int(settings.STANDARD_WORK_HOURS * MS_PER_HOUR)
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(row.user_id, {
+            "record_count": 0, "days_present": 0, "work": 0, "break": 0,
+            "overtime": 0, "late": 0, "late_count": 0
+        })
+        total["record_count"] += 1
+        work_ms = break_ms = 0
+        if row.clock_in_ms is not None and row.clock_out_ms is not None:
+            if row.break_seconds is not None:
+                break_ms = round(row.break_seconds * 1000)
+            elif row.break_start_ms is not None and row.break_end_ms is not None:
+                break_ms = row.break_end_ms - row.break_start_ms
+            work_ms = row.clock_out_ms - row.clock_in_ms - break_ms
+        total["work"] += work_ms
+        total["break"] += break_ms
+        total["overtime"] += max(work_ms - standard_ms, 0)
+        late = row.status == "late"
+        if row.clock_in_ms is not None:
+            total["days_present"] += 1
+            time_of_day_ms = row.clock_in_ms % MS_PER_DAY
+            total["late"] += max(time_of_day_ms - start_ms, 0)
+            late = late or time_of_day_ms // 1000 * 1000 > start_ms
+        total["late_count"] += 1 if late else 0
+
+    return [
+        {
+            "user_id": user_id,
+            "record_count": total["record_count"],
+            "days_present": total["days_present"],
+            "work_hours": round(total["work"] / MS_PER_HOUR, 2),
+            "break_hours": round(total["break"] / MS_PER_HOUR, 2),
+            "overtime_hours": round(total["overtime"] / MS_PER_HOUR, 2),
+            "late_minutes": round(total["late"] / 60_000, 1),
+            "late_count": total["late_count"],
+        }
+        for user_id, total in sorted(totals.items())
+    ]
+
+def totals_from_rows(rows: List) -> List[dict]:
+    """fetch_work_time_rows() の結果からユーザー別の合計を計算（DBアクセスなし）"""
+    if not rows:
+        return []
+    if not available():
+        return _totals_row_by_row(rows)
+
+    np = _numpy()
+    arrays = to_arrays(rows)
+    result = compute_work_time(arrays)
+    user_ids, group = np.unique(
+        np.array(list(map(attrgetter("user_id"), rows)), dtype=np.int64),
+        return_inverse=True
+    )
+
+    def total(values):
+        return np.bincount(group, weights=values, minlength=len(user_ids))
+
+    work = total(result["work_seconds"])
+    breaks = total(result["break_seconds"])
+    overtime = total(result["overtime_seconds"])
+    late = total(result["late_seconds"])
+    late_count = np.bincount(group, weights=result["is_late"], minlength=len(user_ids))
+    days_present = np.bincount(group, weights=result["present"], minlength=len(user_ids))
+    record_count = np.bincount(group, minlength=len(user_ids))
+
+    return [
+        {
+            "user_id": int(user_ids[i]),
+            "record_count": int(record_count[i]),
+            "days_present": int(days_present[i]),
+            "work_hours": round(float(work[i]) / 3600, 2),
+            "break_hours": round(float(breaks[i]) / 3600, 2),
+            "overtime_hours": round(float(overtime[i]) / 3600, 2),
+            "late_minutes": round(float(late[i]) / 60, 1),
+            "late_count": int(late_count[i]),
+        }
+        for i in range(len(user_ids))
+    ]
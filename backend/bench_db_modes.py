@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+同期／非同期DBモードの負荷比較
+DB_ASYNC=false / true の各モードでAPIサーバー（uvicorn）を一時データベースで起動し、
+同じ同時接続数で打刻・今日の勤怠・勤怠履歴のリクエストを送って
+スループットとレイテンシ（p50 / p95 / p99）を比較します。
+続けて、同じユーザーの打刻の競合（各ユーザーが同じ出勤打刻を同時に送り、続けて種類の異なる打刻を
+同時に送る）でのステータスコードの内訳と最大レイテンシを比較します。
+競合した打刻は 200 / 400 / 409 のいずれかで応答し、5xx にならないことを確認してください。
+実行には httpx が必要です（requirements.txt）。
+
+使い方:
+    python bench_db_modes.py [同時接続数] [計測秒数] [競合ユーザー数]   # 既定: 200 10 20
+"""
+
+import sys
+import os
+import asyncio
+import subprocess
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from _bench_common import BACKEND_DIR, free_port, percentile, wait_until_ready
+
+# 競合シナリオで1ユーザーが同時に送る出勤打刻の数と、その後に同時に送る打刻
+CONTENTION_CLOCK_INS = 5
+CONTENTION_MIXED = ["break_start", "break_start", "break_end", "clock_out", "clock_out"]
+
+async def login(client: httpx.AsyncClient, index: int, prefix: str = "bench") -> dict:
+    """計測用ユーザーを登録してログインし、認証ヘッダーを返す"""
+    username = f"{prefix}{index}"
+    await client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com",
+        "password": "password", "full_name": username
+    })
+    response = await client.post("/auth/login", json={"username": username, "password": "password"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def virtual_user(client: httpx.AsyncClient, headers: dict, deadline: float,
+                       latencies: list, errors: list) -> None:
+    """1ユーザー分の操作（出勤打刻の後、期限まで今日の勤怠と履歴の参照を繰り返す）"""
+    requests = [("POST", "/attendance/", {"action": "clock_in"})]
+    step = 0
+    while time.monotonic() < deadline:
+        if requests:
+            method, path, body = requests.pop(0)
+        elif step % 2 == 0:
+            method, path, body = "GET", "/attendance/today", None
+        else:
+            method, path, body = "GET", "/attendance/?limit=20", None
+        step += 1
+
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body, headers=headers)
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+
+async def run_load(base_url: str, concurrency: int, seconds: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await wait_until_ready(client)
+        # ユーザー登録・ログインは計測に含めない
+        headers = []
+        for i in range(concurrency):
+            headers.append(await login(client, i))
+
+        latencies, errors = [], []
+        started = time.perf_counter()
+        deadline = time.monotonic() + seconds
+        await asyncio.gather(*[
+            virtual_user(client, h, deadline, latencies, errors) for h in headers
+        ])
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+async def run_contention(base_url: str, users: int) -> dict:
+    """同じユーザーの打刻を同時に送り、ステータスコードの内訳と最大レイテンシを返す"""
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        headers = [await login(client, i, prefix="race") for i in range(users)]
+        statuses = Counter()
+        latencies = []
+
+        async def punch(h: dict, action: str) -> None:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/attendance/", json={"action": action}, headers=h)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*[punch(h, "clock_in") for h in headers for _ in range(CONTENTION_CLOCK_INS)])
+        await asyncio.gather(*[punch(h, action) for h in headers for action in CONTENTION_MIXED])
+
+    return {"statuses": statuses, "max": max(latencies) if latencies else 0.0}
+
+def bench_mode(async_mode: bool, concurrency: int, seconds: float, contention_users: int) -> tuple:
+    """指定モードでサーバーを起動して計測"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        port = free_port()
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+            DB_ASYNC="true" if async_mode else "false",
+            AUTO_MIGRATE="true",
+            # 計測対象はDBアクセスのため、bcryptは最小コストにする
+            BCRYPT_ROUNDS="4",
+            BCRYPT_MAX_QUEUE=str(concurrency),
+        )
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            load = asyncio.run(run_load(base_url, concurrency, seconds))
+            contention = asyncio.run(run_contention(base_url, contention_users))
+            return load, contention
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    contention_users = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    print(f"同時接続数: {concurrency} / 計測時間: {seconds:.0f} 秒 / 競合ユーザー数: {contention_users}")
+    results = {}
+    for label, async_mode in (("同期", False), ("非同期", True)):
+        print(f"{label}モードを計測中...")
+        results[label] = bench_mode(async_mode, concurrency, seconds, contention_users)
+
+    print()
+    print(f"{'モード':<6} {'リクエスト/秒':>12} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'エラー':>6}")
+    for label, (r, _) in results.items():
+        print(f"{label:<6} {r['rps']:>12.1f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['errors']:>6}")
+
+    print()
+    print("同じユーザーの打刻の競合:")
+    print(f"{'モード':<6} {'200':>6} {'400':>6} {'409':>6} {'5xx':>6} {'その他':>6} {'最大(ms)':>9}")
+    failed = False
+    for label, (_, c) in results.items():
+        statuses = c["statuses"]
+        server_errors = sum(n for code, n in statuses.items() if isinstance(code, int) and code >= 500)
+        others = sum(statuses.values()) - statuses[200] - statuses[400] - statuses[409] - server_errors
+        failed = failed or server_errors > 0 or others > 0
+        print(f"{label:<6} {statuses[200]:>6} {statuses[400]:>6} {statuses[409]:>6} "
+              f"{server_errors:>6} {others:>6} {c['max']:>9.1f}")
+    if failed:
+        print("❌ 競合した打刻に 200 / 400 / 409 以外の応答があります。")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
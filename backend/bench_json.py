@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+一覧レスポンスのJSON出力のベンチマーク
+勤怠履歴（GET /attendance/）と全修正申請一覧（GET /correction-request/admin/all）について、
+従来の処理（ORMオブジェクト → Pydanticモデル → dict → 標準のjson、FastAPIの response_model と同じ手順）と、
+必要な列だけを取得して fast_json（orjson）で直接エンコードする処理の1行あたりの時間を
+一時SQLiteデータベースで比較し、出力されるJSONが一致することも確認します。
+
+使い方:
+    python bench_json.py [行数]   # 既定: 20000
+"""
+
+import sys
+import os
+import json
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import joinedload, sessionmaker
+from app.models import Base, User, AttendanceRecord, CorrectionRequest
+from app.routers.attendance import _find_records, _with_breaks
+from app.routers.corrections import get_all_correction_requests
+from app.schemas import AttendanceResponse, CorrectionRequestAdminResponse
+from app.services import fast_json
+
+REPEAT = 3
+
+def seed(db, count: int, seed: int = 42) -> None:
+    """1人分の勤怠記録と、複数ユーザーの修正申請を count 件ずつ作成"""
+    rng = random.Random(seed)
+    now = datetime(2024, 6, 1, 12, 0, 0, 123456)
+    users = [User(id=i, username=f"user{i}", email=f"user{i}@example.com", hashed_password="x",
+                  full_name=f"社員 {i}", is_admin=(i == 1)) for i in range(1, 51)]
+    db.add_all(users)
+    db.flush()
+
+    records = []
+    base = datetime(2000, 1, 1)
+    for i in range(count):
+        day = base + timedelta(days=i)
+        clock_in = day + timedelta(hours=8, seconds=rng.randint(0, 7200))
+        break_start = clock_in + timedelta(hours=3) if rng.random() > 0.2 else None
+        records.append({
+            "user_id": 2, "date": day.strftime("%Y-%m-%d"),
+            "clock_in": clock_in,
+            "clock_out": clock_in + timedelta(hours=9, seconds=rng.randint(0, 10800)) if rng.random() > 0.05 else None,
+            "break_start": break_start,
+            "break_end": break_start + timedelta(minutes=rng.randint(30, 75)) if break_start else None,
+            "notes": "電車遅延のため" if rng.random() < 0.1 else None,
+            "status": "present", "created_at": now, "updated_at": now,
+        })
+    db.execute(AttendanceRecord.__table__.insert(), records)
+
+    requests = []
+    for i in range(count):
+        status = rng.choice(["pending", "approved", "rejected"])
+        day = base + timedelta(days=i % 3650)
+        requests.append({
+            "user_id": rng.randint(2, 50), "requested_date": day.strftime("%Y-%m-%d"),
+            "requested_clock_in": day + timedelta(hours=9), "requested_clock_out": day + timedelta(hours=18),
+            "requested_notes": None, "reason": "打刻忘れ", "status": status,
+            "admin_notes": "確認済み" if status != "pending" else None,
+            "approved_by": 1 if status != "pending" else None,
+            "created_at": now + timedelta(seconds=i), "updated_at": now + timedelta(seconds=i),
+        })
+    db.execute(CorrectionRequest.__table__.insert(), requests)
+    db.commit()
+
+def legacy_body(models: list, schema) -> bytes:
+    """FastAPIが response_model で行う変換（検証 → dict → json）と同じ手順でJSONにする"""
+    adapter = TypeAdapter(List[schema])
+    validated = adapter.validate_python(models, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(validated, mode="json"))
+    return JSONResponse(content).body
+
+def legacy_attendance(db) -> bytes:
+    records = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).order_by(
+        AttendanceRecord.date.desc(), AttendanceRecord.id.desc()
+    ).all()
+    return legacy_body(_with_breaks(db, 2, records), AttendanceResponse)
+
+def legacy_corrections(db) -> bytes:
+    requests = db.query(CorrectionRequest).options(
+        joinedload(CorrectionRequest.requester),
+        joinedload(CorrectionRequest.approver)
+    ).order_by(CorrectionRequest.created_at.desc(), CorrectionRequest.id.desc()).all()
+    return legacy_body(requests, CorrectionRequestAdminResponse)
+
+def fast_attendance(db) -> bytes:
+    return _find_records(db, 2, None, None, None, None, Response())
+
+def fast_corrections(db) -> bytes:
+    return get_all_correction_requests(Response(), None, None, None, None, db).body
+
+def measure(db, fn) -> tuple:
+    """REPEAT 回実行した最短時間（秒）と出力"""
+    best, body = None, None
+    for _ in range(REPEAT):
+        db.expunge_all()
+        started = time.perf_counter()
+        body = fn(db)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def measure_encoding(items: list) -> tuple:
+    """同じ dict の一覧を標準のjson（JSONResponse）と fast_json でエンコードした時間"""
+    results = []
+    for encode in (lambda: JSONResponse(items).body, lambda: fast_json.dumps(items)):
+        best = None
+        for _ in range(REPEAT):
+            started = time.perf_counter()
+            encode()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(best)
+    return tuple(results)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    if not fast_json.available():
+        print("⚠️  orjsonがインストールされていないため、標準のjsonで計測します。")
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        print(f"合成データを作成中... ({count:,} 件ずつ)")
+        seed(db, count)
+
+        for label, legacy, fast in (
+            ("勤怠履歴 GET /attendance/", legacy_attendance, fast_attendance),
+            ("全修正申請 GET /correction-request/admin/all", legacy_corrections, fast_corrections),
+        ):
+            legacy_seconds, legacy_output = measure(db, legacy)
+            fast_seconds, fast_output = measure(db, fast)
+            items = json.loads(fast_output)
+            json_seconds, orjson_seconds = measure_encoding(items)
+
+            print()
+            print(label)
+            print(f"  従来（ORM+Pydantic+json）:      {legacy_seconds * 1e6 / count:8.2f} µs/行  ({legacy_seconds:.3f} 秒)")
+            print(f"  列の取得+fast_json:             {fast_seconds * 1e6 / count:8.2f} µs/行  ({fast_seconds:.3f} 秒)")
+            print(f"  高速化:                         {legacy_seconds / fast_seconds:8.1f} 倍")
+            print(f"  エンコードのみ json / fast_json: {json_seconds * 1e6 / count:.2f} / {orjson_seconds * 1e6 / count:.2f} µs/行")
+            if json.loads(legacy_output) != items:
+                print("  ❌ 出力されるJSONが一致しません。")
+                ok = False
+
+        db.close()
+        engine.dispose()
+
+    if not ok:
+        sys.exit(1)
+    print()
+    print("✅ 出力されるJSONは一致しています。")
+
+if __name__ == "__main__":
+    main()
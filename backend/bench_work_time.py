@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""
+勤怠時間計算のベンチマーク
+行ごとの計算（calculate_work_hours）と、NumPyによる一括計算（compute_work_time）の
+処理時間を同じ合成データで比較し、結果が一致することも確認します。
+一時SQLiteデータベースからの取得を含めた比較（ORMで取得して行ごとに計算する従来の
+レポート処理と、エポックミリ秒で取得して一括計算する処理）も行います。
+
+使い方:
+    python bench_work_time.py [行数]   # 既定: 1000000
+"""
+
+import sys
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, AttendanceRecord
+from app.services import work_time
+from app.services.attendance_utils import calculate_work_hours
+
+EPOCH = datetime(1970, 1, 1)
+
+def make_rows(count: int, seed: int = 42) -> list:
+    """出勤・退勤・休憩の欠損を含む合成データを作成"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        day = base + timedelta(days=i % 365)
+        clock_in = day + timedelta(hours=8, seconds=rng.randint(0, 7200)) if rng.random() > 0.05 else None
+        clock_out = clock_in + timedelta(hours=9, seconds=rng.randint(0, 10800)) if clock_in and rng.random() > 0.05 else None
+        break_start = clock_in + timedelta(hours=3) if clock_in and rng.random() > 0.2 else None
+        break_end = break_start + timedelta(minutes=rng.randint(30, 75)) if break_start and rng.random() > 0.05 else None
+        rows.append((clock_in, clock_out, break_start, break_end))
+    return rows
+
+def to_epoch_rows(rows: list) -> list:
+    """DBから取得した場合と同じ <列名>_ms 形式に変換"""
+    def ms(value):
+        return None if value is None else int((value - EPOCH) / timedelta(milliseconds=1))
+    return [
+        SimpleNamespace(clock_in_ms=ms(a), clock_out_ms=ms(b), break_start_ms=ms(c), break_end_ms=ms(d), status="present")
+        for a, b, c, d in rows
+    ]
+
+def bench_database(rows: list) -> None:
+    """一時データベースから取得して計算するまでの時間を比較"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(AttendanceRecord.__table__.insert(), [
+                {
+                    "user_id": i % 1000 + 1,
+                    "date": (datetime(2024, 1, 1) + timedelta(days=i // 1000)).strftime('%Y-%m-%d'),
+                    "clock_in": a, "clock_out": b, "break_start": c, "break_end": d,
+                    "status": "present"
+                }
+                for i, (a, b, c, d) in enumerate(rows)
+            ])
+        db = sessionmaker(bind=engine)()
+
+        started = time.perf_counter()
+        records = db.query(AttendanceRecord).all()
+        orm_total = sum(
+            calculate_work_hours(r.clock_in, r.clock_out, r.break_start, r.break_end)[0]
+            for r in records
+        )
+        orm_seconds = time.perf_counter() - started
+        del records
+        db.expunge_all()
+
+        started = time.perf_counter()
+        fetched = work_time.fetch_work_time_rows(db, [])
+        computed = work_time.compute_work_time(work_time.to_arrays(fetched))
+        vectorized_total = float(computed["work_seconds"].sum()) / 3600
+        vectorized_seconds = time.perf_counter() - started
+        db.close()
+        engine.dispose()
+
+    print(f"DB取得+行ごとの計算（ORM）:       {orm_seconds:8.3f} 秒")
+    print(f"DB取得+一括計算（エポック整数）:  {vectorized_seconds:8.3f} 秒")
+    print(f"高速化:                            {orm_seconds / vectorized_seconds:8.1f} 倍")
+    print(f"労働時間合計: 行ごと {orm_total:,.2f} 時間 / 一括 {vectorized_total:,.2f} 時間")
+    if abs(orm_total - vectorized_total) > 0.01 * len(rows) / 1000:
+        print("❌ 計算結果が一致しません。")
+        sys.exit(1)
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    if not work_time.available():
+        print("NumPyがインストールされていません。'pip install -r requirements.txt' を実行してください。")
+        sys.exit(1)
+
+    print(f"合成データを作成中... ({count:,} 行)")
+    rows = make_rows(count)
+    epoch_rows = to_epoch_rows(rows)
+
+    started = time.perf_counter()
+    per_row = [calculate_work_hours(*row) for row in rows]
+    per_row_total = sum(work for work, _ in per_row)
+    per_row_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    arrays = work_time.to_arrays(epoch_rows)
+    convert_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    computed = work_time.compute_work_time(arrays)
+    vectorized_total = float(computed["work_seconds"].sum()) / 3600
+    vectorized_seconds = time.perf_counter() - started
+
+    print(f"行ごとの計算:        {per_row_seconds:8.3f} 秒")
+    print(f"配列への変換:        {convert_seconds:8.3f} 秒")
+    print(f"NumPy一括計算:       {vectorized_seconds:8.3f} 秒")
+    print(f"高速化（計算のみ）:  {per_row_seconds / vectorized_seconds:8.1f} 倍")
+    print(f"高速化（変換込み）:  {per_row_seconds / (convert_seconds + vectorized_seconds):8.1f} 倍")
+    print(f"労働時間合計: 行ごと {per_row_total:,.2f} 時間 / 一括 {vectorized_total:,.2f} 時間")
+
+    if abs(per_row_total - vectorized_total) > 0.01:
+        print("❌ 計算結果が一致しません。")
+        sys.exit(1)
+
+    print()
+    print("一時データベースに書き込み中...")
+    bench_database(rows)
+    print("✅ 計算結果は一致しています。")
+
+if __name__ == "__main__":
+    main()
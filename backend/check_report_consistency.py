@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""
+集計レポート整合性チェックスクリプト
+SQL集計（/reports/work-hours）の結果を、勤怠記録ごとのPython計算
+（/reports/attendance-summary と同じ計算）を積み上げた結果と比較します。
+
+使い方:
+    python check_report_consistency.py [day|week|month] [開始日] [終了日]
+"""
+
+import sys
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import AttendanceRecord
+from app.services.aggregation import aggregate_work_hours
+from app.services.attendance_utils import calculate_work_hours, is_late
+
+def period_key(date_str: str, period: str) -> str:
+    """集計期間のキー（SQL側と同じ規則）"""
+    if period == "day":
+        return date_str
+    if period == "month":
+        return date_str[:7]
+    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    return (date_obj - timedelta(days=date_obj.weekday())).strftime('%Y-%m-%d')
+
+def aggregate_in_python(db, period: str, start_date=None, end_date=None) -> dict:
+    """勤怠記録を1件ずつ計算して集計"""
+    query = db.query(AttendanceRecord)
+    if start_date:
+        query = query.filter(AttendanceRecord.date >= start_date)
+    if end_date:
+        query = query.filter(AttendanceRecord.date <= end_date)
+
+    totals = defaultdict(lambda: {"worked_seconds": 0.0, "break_seconds": 0.0,
+                                  "days": set(), "late_count": 0, "absent_count": 0})
+    for record in query.yield_per(1000):
+        work_hours, break_hours = calculate_work_hours(
+            record.clock_in, record.clock_out, record.break_start, record.break_end, record.break_seconds
+        )
+        group = totals[(record.user_id, period_key(record.date, period))]
+        group["worked_seconds"] += work_hours * 3600
+        group["break_seconds"] += break_hours * 3600
+        if record.clock_in:
+            group["days"].add(record.date)
+        if is_late(record.clock_in, record.status, settings.WORK_START_TIME):
+            group["late_count"] += 1
+        if record.status == "absent" or not record.clock_in:
+            group["absent_count"] += 1
+    return totals
+
+def check_consistency(period: str = "month", start_date=None, end_date=None) -> bool:
+    """SQL集計とPython計算を比較し、差異を表示"""
+    db = SessionLocal()
+    try:
+        expected = aggregate_in_python(db, period, start_date, end_date)
+        actual = {
+            (row["user_id"], row["period"]): row
+            for row in aggregate_work_hours(db, period, start_date, end_date)
+        }
+
+        mismatches = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            if key not in expected or key not in actual:
+                mismatches.append((key, "集計グループの有無が一致しません"))
+                continue
+            want, got = expected[key], actual[key]
+            # SQL側は秒単位に丸めるため、1秒未満の差は許容
+            if abs(want["worked_seconds"] - got["worked_seconds"]) > 1:
+                mismatches.append((key, f"労働時間 {want['worked_seconds']:.0f} != {got['worked_seconds']}"))
+            if abs(want["break_seconds"] - got["break_seconds"]) > 1:
+                mismatches.append((key, f"休憩時間 {want['break_seconds']:.0f} != {got['break_seconds']}"))
+            if len(want["days"]) != got["days_present"]:
+                mismatches.append((key, f"出勤日数 {len(want['days'])} != {got['days_present']}"))
+            if want["late_count"] != got["late_count"]:
+                mismatches.append((key, f"遅刻件数 {want['late_count']} != {got['late_count']}"))
+            if want["absent_count"] != got["absent_count"]:
+                mismatches.append((key, f"欠勤件数 {want['absent_count']} != {got['absent_count']}"))
+
+        print(f"集計グループ数: {len(actual)}（期間: {period}）")
+        if mismatches:
+            for (user_id, key), message in mismatches:
+                print(f"  ユーザーID {user_id} / {key}: {message}")
+            print(f"❌ {len(mismatches)} 件の差異があります。")
+            return False
+
+        print("✅ SQL集計と行ごとの計算は一致しています。")
+        return True
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    period = args[0] if args else "month"
+    start_date = args[1] if len(args) > 1 else None
+    end_date = args[2] if len(args) > 2 else None
+    sys.exit(0 if check_consistency(period, start_date, end_date) else 1)
@@ -12,7 +12,9 @@ import bcrypt
 
 # メインモジュールからインポート
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from main import User, Base
+from main import User
+from app.core.migrations import migrate
+from app.core.principal_generation import bump_principal_generation
 
 def hash_password(password: str) -> str:
     """パスワードをハッシュ化"""
@@ -23,7 +25,7 @@ def create_admin_user():
     # データベース接続
     DATABASE_URL = "sqlite:///./attendance.db"
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
@@ -106,7 +108,7 @@ def list_users():
     """登録済みユーザー一覧を表示"""
     DATABASE_URL = "sqlite:///./attendance.db"
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
@@ -140,7 +142,7 @@ def promote_user_to_admin():
     """既存ユーザーを管理者に昇格"""
     DATABASE_URL = "sqlite:///./attendance.db"
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
@@ -182,8 +184,9 @@ def promote_user_to_admin():
             print("昇格をキャンセルしました。")
             return
         
-        # 管理者に昇格
+        # 管理者に昇格（起動中のAPIの認証ユーザーキャッシュも無効化する）
         user.is_admin = True
+        bump_principal_generation(db)
         db.commit()
         
         print()
@@ -197,6 +200,62 @@ def promote_user_to_admin():
     finally:
         db.close()
 
+def demote_admin_user():
+    """管理者の権限を解除"""
+    DATABASE_URL = "sqlite:///./attendance.db"
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    migrate(engine)
+    
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+    
+    try:
+        print("=== 管理者の権限を解除 ===")
+        print()
+        
+        admins = db.query(User).filter(User.is_admin == True).all()
+        if len(admins) <= 1:
+            print("管理者が1人以下のため、権限を解除できません。")
+            return
+        
+        print("管理者:")
+        for user in admins:
+            print(f"  {user.id}: {user.username} ({user.full_name})")
+        print()
+        
+        user_id = input("権限を解除するユーザーのID: ")
+        if not user_id.isdigit():
+            print("無効なユーザーIDです。")
+            return
+        
+        user = next((admin for admin in admins if admin.id == int(user_id)), None)
+        if not user:
+            print("管理者が見つかりません。")
+            return
+        
+        # 確認
+        print(f"ユーザー '{user.username}' ({user.full_name}) の管理者権限を解除しますか？ (y/N): ", end="")
+        confirm = input().lower()
+        
+        if confirm != 'y' and confirm != 'yes':
+            print("解除をキャンセルしました。")
+            return
+        
+        # 権限を解除（起動中のAPIの認証ユーザーキャッシュも無効化し、次のリクエストから管理機能を使えなくする）
+        user.is_admin = False
+        bump_principal_generation(db)
+        db.commit()
+        
+        print()
+        print("✅ 管理者権限を解除しました。")
+        print(f"   ユーザー名: {user.username}")
+        
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
 def main():
     """メイン関数"""
     print("勤怠管理システム - 管理者ユーザー管理ツール")
@@ -207,10 +266,11 @@ def main():
         print("1. 管理者ユーザーを新規作成")
         print("2. 登録済みユーザー一覧表示")
         print("3. 既存ユーザーを管理者に昇格")
-        print("4. 終了")
+        print("4. 管理者の権限を解除")
+        print("5. 終了")
         print()
         
-        choice = input("選択 (1-4): ")
+        choice = input("選択 (1-5): ")
         print()
         
         if choice == "1":
@@ -220,6 +280,8 @@ def main():
         elif choice == "3":
             promote_user_to_admin()
         elif choice == "4":
+            demote_admin_user()
+        elif choice == "5":
             print("終了します。")
             break
         else:
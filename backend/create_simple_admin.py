@@ -11,7 +11,8 @@ import bcrypt
 
 # メインモジュールからインポート
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from main import User, Base
+from main import User
+from app.core.migrations import migrate
 
 def hash_password(password: str) -> str:
     """パスワードをハッシュ化"""
@@ -22,7 +23,7 @@ def create_admin():
     # データベース接続
     DATABASE_URL = "sqlite:///./attendance.db"
     engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    Base.metadata.create_all(bind=engine)
+    migrate(engine)
     
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     db = SessionLocal()
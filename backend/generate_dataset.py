@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+"""
+容量試験用の合成データ作成スクリプト
+N人のユーザーと過去M日分の勤怠記録（遅刻・残業・退勤の打刻漏れ・複数回の休憩を含む）、
+修正申請（未処理・承認済み・却下）を DATABASE_URL のデータベースに追加し、
+最後に月別ロールアップを再作成します。
+同じシードからは同じデータが作成されます。パスワードのハッシュは全ユーザーで共通（1回だけ計算）です。
+行はSQLAlchemyの型変換を通さずDBAPIの executemany で書き込むため、数千万件でも数分で作成できます。
+--events を指定すると打刻イベント（punch_events）も作成します（件数は約4倍になります）。
+
+使い方:
+    python generate_dataset.py --users 40000 --days 365 [--admins 5] [--seed 42]
+                               [--correction-rate 0.01] [--pending-rate 0.3] [--events]
+                               [--prefix user] [--password password] [--batch-size 50000]
+"""
+
+import sys
+import os
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import func, select
+from app.core.config import settings
+from app.core.database import SessionLocal, create_tables
+from app.core.security import hash_password
+from app.models import AttendanceRecord, CorrectionRequest, PunchEvent, User
+from app.services.rollups import rebuild_rollups
+
+# 発生率（勤務日あたり）
+ABSENT_RATE = 0.03
+MISSING_CLOCK_OUT_RATE = 0.01
+NO_BREAK_RATE = 0.08
+SECOND_BREAK_RATE = 0.15
+MISSING_BREAK_END_RATE = 0.005
+NOTE_RATE = 0.05
+
+NOTES = ["在宅勤務", "客先訪問", "研修", "通院のため中抜け", "出張"]
+CORRECTION_REASONS = {
+    "clock_out": "退勤の打刻漏れ",
+    "clock_in": "出勤時の打刻遅れ",
+}
+LAST_SECOND = 86399
+
+# 秒 → 時刻文字列（SQLiteには SQLAlchemy の DateTime と同じ形式の文字列を直接渡す）
+_CLOCK = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)]
+
+RECORD_COLUMNS = ("id", "user_id", "date", "clock_in", "clock_out", "break_start", "break_end", "break_seconds",
+                  "notes", "status", "created_at", "updated_at")
+CORRECTION_COLUMNS = ("user_id", "attendance_record_id", "requested_date", "requested_clock_in",
+                      "requested_clock_out", "requested_break_start", "requested_break_end", "requested_notes",
+                      "reason", "status", "admin_notes", "approved_by", "created_at", "updated_at")
+EVENT_COLUMNS = ("user_id", "date", "seq", "action", "occurred_at", "notes", "state", "actor_id", "created_at")
+
+def _seconds(value: str) -> int:
+    hours, minutes = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60
+
+class DayPunches:
+    """1日分の打刻（時刻は0時からの秒、欠損は None）"""
+    __slots__ = ("clock_in", "clock_out", "breaks", "notes")
+
+    def __init__(self, clock_in, clock_out, breaks, notes):
+        self.clock_in = clock_in
+        self.clock_out = clock_out
+        self.breaks = breaks
+        self.notes = notes
+
+    def record_breaks(self):
+        """勤怠記録の break_start / break_end / break_seconds（打刻と同じ規則）
+
+        最初の休憩開始と最後の休憩終了、休憩が複数回の場合は終了済みの休憩時間の合計。
+        """
+        if not self.breaks:
+            return None, None, None
+        closed = [end - begin for begin, end in self.breaks if end is not None]
+        total = sum(closed) if len(self.breaks) > 1 and closed else None
+        return self.breaks[0][0], self.breaks[-1][1], total
+
+def user_profile(rng: random.Random, work_start: int) -> tuple:
+    """ユーザーごとの傾向（通常の出勤時刻・遅刻率・残業率）"""
+    return work_start - rng.randint(5 * 60, 45 * 60), rng.uniform(0.01, 0.12), rng.uniform(0.05, 0.5)
+
+def day_punches(rng: random.Random, profile: tuple, work_start: int) -> DayPunches:
+    """1日分の打刻を作成"""
+    arrival, late_rate, overtime_rate = profile
+    if rng.random() < late_rate:
+        clock_in = work_start + rng.randint(60, 90 * 60)
+    else:
+        clock_in = max(0, arrival + rng.randint(-10 * 60, 10 * 60))
+
+    clock_out = clock_in + 9 * 3600 + rng.randint(0, 15 * 60)
+    if rng.random() < overtime_rate:
+        clock_out += rng.randint(30 * 60, 4 * 3600)
+    clock_out = min(clock_out, LAST_SECOND)
+
+    breaks = []
+    if rng.random() >= NO_BREAK_RATE:
+        lunch = 12 * 3600 + rng.randint(-15 * 60, 15 * 60)
+        breaks.append([lunch, lunch + rng.randint(45 * 60, 65 * 60)])
+        if rng.random() < SECOND_BREAK_RATE:
+            rest = 15 * 3600 + rng.randint(0, 30 * 60)
+            breaks.append([rest, rest + rng.randint(10 * 60, 20 * 60)])
+    breaks = [b for b in breaks if clock_in < b[0] and b[1] < clock_out]
+
+    if rng.random() < MISSING_CLOCK_OUT_RATE:
+        clock_out = None
+        if breaks and rng.random() < 0.5:
+            breaks[-1][1] = None
+    elif breaks and rng.random() < MISSING_BREAK_END_RATE:
+        breaks[-1][1] = None
+    notes = rng.choice(NOTES) if rng.random() < NOTE_RATE else None
+    return DayPunches(clock_in, clock_out, breaks, notes)
+
+def corrected_punches(rng: random.Random, punches: DayPunches) -> tuple:
+    """修正申請の内容（修正後の打刻、理由）"""
+    if punches.clock_out is None:
+        clock_out = min(punches.clock_in + 9 * 3600 + rng.randint(0, 60 * 60), LAST_SECOND)
+        breaks = _single_break([[start, end if end is not None else start + 60 * 60] for start, end in punches.breaks])
+        return DayPunches(punches.clock_in, clock_out, breaks, punches.notes), CORRECTION_REASONS["clock_out"]
+    clock_in = max(0, punches.clock_in - rng.randint(5 * 60, 30 * 60))
+    breaks = _single_break(punches.breaks)
+    return DayPunches(clock_in, punches.clock_out, breaks, punches.notes), CORRECTION_REASONS["clock_in"]
+
+def _single_break(breaks: list) -> list:
+    """修正申請の休憩（申請は休憩1回のため、最初の休憩開始から休憩時間の合計分とする）"""
+    if not breaks:
+        return []
+    start = breaks[0][0]
+    return [[start, start + sum(end - begin for begin, end in breaks if end is not None)]]
+
+class Writer:
+    """行をバッチにためて DBAPI の executemany で書き込む"""
+
+    def __init__(self, db, batch_size: int):
+        self.db = db
+        self.batch_size = batch_size
+        self.conn = db.connection()
+        self.sqlite = self.conn.dialect.name == "sqlite"
+        mark = "?" if self.conn.dialect.paramstyle == "qmark" else "%s"
+        self.statements = {
+            table.name: f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([mark] * len(columns))})"
+            for table, columns in (
+                (User.__table__, ("id", "username", "email", "hashed_password", "full_name", "is_admin", "created_at")),
+                (AttendanceRecord.__table__, RECORD_COLUMNS),
+                (CorrectionRequest.__table__, CORRECTION_COLUMNS),
+                (PunchEvent.__table__, EVENT_COLUMNS),
+            )
+        }
+        self.rows = {name: [] for name in self.statements}
+        self.counts = {name: 0 for name in self.statements}
+        self._dates = {}
+
+    def timestamp(self, date: str, second: int):
+        """日付と秒からDBに渡す日時（SQLiteは文字列、それ以外は datetime）"""
+        if second is None:
+            return None
+        if self.sqlite:
+            return f"{date} {_CLOCK[second]}.000000"
+        day = self._dates.get(date)
+        if day is None:
+            day = self._dates[date] = datetime.strptime(date, "%Y-%m-%d")
+        return day + timedelta(seconds=second)
+
+    def add(self, table: str, row: tuple) -> None:
+        rows = self.rows[table]
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """たまった行を外部キーの順に書き込んでコミット"""
+        for name, rows in self.rows.items():
+            if rows:
+                self.conn.exec_driver_sql(self.statements[name], rows)
+                self.counts[name] += len(rows)
+                self.rows[name] = []
+        self.db.commit()
+        self.conn = self.db.connection()
+
+    def reset_sequences(self) -> None:
+        """明示したIDに合わせてPostgreSQLのシーケンスを進める"""
+        if self.conn.dialect.name != "postgresql":
+            return
+        for name in ("users", "attendance_records"):
+            self.conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))"
+            )
+
+def state_json(date: str, punches: DayPunches) -> str:
+    """correction イベントに保存する値（audit_state() と同じ形式）"""
+    def iso(second):
+        return None if second is None else f"{date}T{_CLOCK[second]}"
+    break_start, break_end, break_seconds = punches.record_breaks()
+    return json.dumps({
+        "clock_in": iso(punches.clock_in), "clock_out": iso(punches.clock_out),
+        "break_start": iso(break_start), "break_end": iso(break_end), "break_seconds": break_seconds,
+        "status": "present", "notes": punches.notes,
+    }, ensure_ascii=False)
+
+def write_events(writer: Writer, user_id: int, date: str, punches: DayPunches) -> int:
+    """打刻の順にイベントを追加し、最後の seq を返す"""
+    stamp = writer.timestamp
+    events = [(punches.clock_in, "clock_in", punches.notes)]
+    for start, end in punches.breaks:
+        events.append((start, "break_start", None))
+        if end is not None:
+            events.append((end, "break_end", None))
+    if punches.clock_out is not None:
+        events.append((punches.clock_out, "clock_out", None))
+    for seq, (second, action, notes) in enumerate(events, start=1):
+        occurred_at = stamp(date, second)
+        writer.add("punch_events", (user_id, date, seq, action, occurred_at, notes, None, None, occurred_at))
+    return len(events)
+
+def generate(db, users: int, days: int, admins: int, seed: int, correction_rate: float,
+             pending_rate: float, events: bool, prefix: str, password: str, batch_size: int) -> dict:
+    """合成データを追加し、テーブルごとの件数を返す"""
+    rng = random.Random(seed)
+    writer = Writer(db, batch_size)
+    stamp = writer.timestamp
+
+    if db.query(User.id).filter(User.username.in_([f"{prefix}0", f"{prefix}_admin0"])).first():
+        raise SystemExit(f"ユーザー名 '{prefix}0' は既に存在します。--prefix を変更してください")
+    next_user_id = db.execute(select(func.coalesce(func.max(User.id), 0))).scalar() + 1
+    next_record_id = db.execute(select(func.coalesce(func.max(AttendanceRecord.id), 0))).scalar() + 1
+
+    hashed = hash_password(password)
+    now = datetime.utcnow()
+    admin_ids = list(range(next_user_id, next_user_id + admins))
+    for i, user_id in enumerate(admin_ids):
+        writer.add("users", (user_id, f"{prefix}_admin{i}", f"{prefix}_admin{i}@example.com", hashed,
+                             f"管理者{i}", True, now))
+    user_ids = list(range(next_user_id + admins, next_user_id + admins + users))
+    for i, user_id in enumerate(user_ids):
+        writer.add("users", (user_id, f"{prefix}{i}", f"{prefix}{i}@example.com", hashed, f"ユーザー{i}", False, now))
+    writer.flush()
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [
+        (today - timedelta(days=day)).strftime("%Y-%m-%d")
+        for day in range(days, 0, -1)
+        if (today - timedelta(days=day)).weekday() < 5
+    ]
+    work_start = _seconds(settings.WORK_START_TIME)
+
+    record_id = next_record_id
+    for user_id in user_ids:
+        profile = user_profile(rng, work_start)
+        for date in dates:
+            if rng.random() < ABSENT_RATE:
+                continue
+            punches = day_punches(rng, profile, work_start)
+            seq = write_events(writer, user_id, date, punches) if events else 0
+
+            if punches.clock_out is None or rng.random() < correction_rate:
+                requested, reason = corrected_punches(rng, punches)
+                requested_at = stamp(date, LAST_SECOND)
+                if rng.random() < pending_rate:
+                    status, approver, decided_at = "pending", None, requested_at
+                else:
+                    status = "approved" if rng.random() < 0.85 else "rejected"
+                    approver, decided_at = rng.choice(admin_ids) if admin_ids else None, requested_at
+                requested_breaks = requested.record_breaks()
+                writer.add("correction_requests", (
+                    user_id, record_id, date, stamp(date, requested.clock_in), stamp(date, requested.clock_out),
+                    stamp(date, requested_breaks[0]), stamp(date, requested_breaks[1]), requested.notes,
+                    reason, status, None, approver, requested_at, decided_at
+                ))
+                if status == "approved":
+                    punches = requested
+                    if events:
+                        writer.add("punch_events", (user_id, date, seq + 1, "correction", requested_at, None,
+                                                    state_json(date, requested), approver, requested_at))
+
+            break_start, break_end, break_seconds = punches.record_breaks()
+            clock_in = stamp(date, punches.clock_in)
+            writer.add("attendance_records", (
+                record_id, user_id, date, clock_in, stamp(date, punches.clock_out),
+                stamp(date, break_start), stamp(date, break_end), break_seconds, punches.notes, "present",
+                clock_in, stamp(date, punches.clock_out if punches.clock_out is not None else punches.clock_in)
+            ))
+            record_id += 1
+    writer.flush()
+    writer.reset_sequences()
+
+    counts = dict(writer.counts)
+    counts["monthly_attendance_rollups"] = rebuild_rollups(db)
+    db.commit()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="容量試験用の合成データを作成")
+    parser.add_argument("--users", type=int, default=1000, help="一般ユーザー数")
+    parser.add_argument("--days", type=int, default=365, help="作成する過去の日数（土日は除く）")
+    parser.add_argument("--admins", type=int, default=5, help="管理者数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数のシード")
+    parser.add_argument("--correction-rate", type=float, default=0.01,
+                        help="修正申請を作成する割合（退勤の打刻漏れは常に申請）")
+    parser.add_argument("--pending-rate", type=float, default=0.3, help="修正申請のうち未処理の割合")
+    parser.add_argument("--events", action="store_true", help="打刻イベントも作成")
+    parser.add_argument("--prefix", default="user", help="ユーザー名の接頭辞（管理者は <接頭辞>_admin<番号>）")
+    parser.add_argument("--password", default="password", help="全ユーザー共通のパスワード")
+    parser.add_argument("--batch-size", type=int, default=50000, help="1回の executemany の行数")
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        counts = generate(db, args.users, args.days, args.admins, args.seed, args.correction_rate,
+                          args.pending_rate, args.events, args.prefix, args.password, args.batch_size)
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"  {table}: {count:,} 件")
+    print(f"✅ 合成データを作成しました（{elapsed:.1f} 秒）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+始業時の打刻集中を想定した負荷試験
+一時データベースにユーザー・過去の勤怠記録・未処理の修正申請を用意してAPIサーバー
+（app.main:app）を起動し、仮想ユーザーで次の段階を順に実行します。
+  1. ログイン集中    全員が同時にログイン
+  2. 出勤打刻の集中  全員が同時に出勤打刻
+  3. 通常時          一般ユーザーは今日の勤怠のポーリングと勤怠履歴の閲覧、
+                     管理者は修正申請の確認・一括承認とレポートの取得（--duration 秒）
+段階ごと・エンドポイントごとのスループットとレイテンシ（p50 / p95 / p99）、ステータスコードの内訳を
+JSONで出力します（errors は接続エラーと5xxの件数）。
+--env で設定を変えて（例: --env DB_ASYNC=true --env PUNCH_GROUP_COMMIT=true）比較できます。
+実行には httpx が必要です（requirements.txt）。
+
+使い方:
+    python load_test.py [--users 200] [--admins 2] [--duration 30] [--days 60]
+                        [--think-ms 100] [--env KEY=VALUE ...] [--output result.json]
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from _bench_common import BACKEND_DIR, free_port, git_revision, parse_env, percentile, wait_until_ready
+
+PASSWORD = "password"
+USER_PREFIX = "user"
+
+def seed_database(database_url: str, users: int, admins: int, days: int, bcrypt_rounds: int) -> None:
+    """generate_dataset.py でユーザー・過去の勤怠記録・修正申請を作成"""
+    # app の設定は読み込み時の環境変数で決まるため、一時データベースを指定してから読み込む
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["BCRYPT_ROUNDS"] = str(bcrypt_rounds)
+    from app.core.database import SessionLocal, create_tables
+    from generate_dataset import generate
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        generate(db, users, days, admins, seed=42, correction_rate=0.05, pending_rate=0.5, events=False,
+                 prefix=USER_PREFIX, password=PASSWORD, batch_size=50000)
+    finally:
+        db.close()
+
+class Recorder:
+    """エンドポイントごとのレイテンシとエラーを記録"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] = self.errors.get(label, 0) + 1
+            return None
+        self.latencies.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+        statuses = self.statuses.setdefault(label, {})
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        if response.status_code >= 500:
+            self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label in sorted(set(self.latencies) | set(self.errors)):
+            values = self.latencies.get(label, [])
+            endpoints[label] = {
+                "requests": len(values),
+                "errors": self.errors.get(label, 0),
+                "status_codes": self.statuses.get(label, {}),
+                "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(max(values, default=0.0), 2),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "rps": round(total / elapsed, 1) if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
+
+async def run_phase(tasks) -> tuple:
+    recorder = Recorder()
+    started = time.perf_counter()
+    await asyncio.gather(*[task(recorder) for task in tasks])
+    return recorder, time.perf_counter() - started
+
+async def employee(client: httpx.AsyncClient, headers: dict, deadline: float,
+                   think: float, recorder: Recorder) -> None:
+    """一般ユーザー（今日の勤怠のポーリング、ときどき勤怠履歴を2ページ閲覧）"""
+    step = 0
+    while time.monotonic() < deadline:
+        await recorder.request(client, "GET /attendance/today", "GET", "/attendance/today", headers=headers)
+        if step % 5 == 4:
+            response = await recorder.request(client, "GET /attendance/", "GET", "/attendance/?limit=20", headers=headers)
+            cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+            if cursor:
+                await recorder.request(client, "GET /attendance/", "GET", f"/attendance/?limit=20&cursor={cursor}",
+                                       headers=headers)
+        step += 1
+        await asyncio.sleep(think)
+
+async def administrator(client: httpx.AsyncClient, headers: dict, deadline: float,
+                        think: float, recorder: Recorder) -> None:
+    """管理者（未処理の修正申請の確認と一括承認、レポートの取得）"""
+    today = datetime.now()
+    month = today.strftime("%Y-%m")
+    start = (today - timedelta(days=30)).strftime("%Y-%m-%d")
+    end = today.strftime("%Y-%m-%d")
+    while time.monotonic() < deadline:
+        response = await recorder.request(client, "GET /correction-request/admin/all", "GET",
+                                          "/correction-request/admin/all?status=pending&limit=50", headers=headers)
+        pending = response.json() if response is not None and response.status_code == 200 else []
+        if pending:
+            await recorder.request(client, "POST /correction-request/batch-approve", "POST",
+                                   "/correction-request/batch-approve", headers=headers, json={
+                                       "decisions": [{"request_id": r["id"], "status": "approved"} for r in pending[:10]]
+                                   })
+        await recorder.request(client, "GET /reports/monthly", "GET", f"/reports/monthly?month={month}", headers=headers)
+        await recorder.request(client, "GET /reports/work-time", "GET",
+                               f"/reports/work-time?start_date={start}&end_date={end}", headers=headers)
+        await recorder.request(client, "GET /reports/attendance-summary", "GET",
+                               f"/reports/attendance-summary?start_date={end}&end_date={end}", headers=headers)
+        await asyncio.sleep(think)
+
+async def run_load(base_url: str, args) -> dict:
+    concurrency = args.users + args.admins
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await wait_until_ready(client)
+        admin_names = [f"{USER_PREFIX}_admin{i}" for i in range(args.admins)]
+        user_names = [f"{USER_PREFIX}{i}" for i in range(args.users)]
+        headers = {}
+        phases = {}
+
+        def login(username):
+            async def task(recorder):
+                response = await recorder.request(client, "POST /auth/login", "POST", "/auth/login",
+                                                  json={"username": username, "password": PASSWORD})
+                if response is not None and response.status_code == 200:
+                    headers[username] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            return task
+        recorder, elapsed = await run_phase([login(name) for name in admin_names + user_names])
+        phases["login_storm"] = recorder.summary(elapsed)
+
+        def clock_in(username):
+            async def task(recorder):
+                await recorder.request(client, "POST /attendance/", "POST", "/attendance/",
+                                       json={"action": "clock_in"}, headers=headers[username])
+            return task
+        employees = [name for name in user_names if name in headers]
+        recorder, elapsed = await run_phase([clock_in(name) for name in employees])
+        phases["clock_in_spike"] = recorder.summary(elapsed)
+
+        deadline = time.monotonic() + args.duration
+        think = args.think_ms / 1000
+        tasks = [
+            (lambda name: lambda recorder: employee(client, headers[name], deadline, think, recorder))(name)
+            for name in employees
+        ] + [
+            (lambda name: lambda recorder: administrator(client, headers[name], deadline, think, recorder))(name)
+            for name in admin_names if name in headers
+        ]
+        recorder, elapsed = await run_phase(tasks)
+        phases["steady"] = recorder.summary(elapsed)
+    return phases
+
+def main():
+    parser = argparse.ArgumentParser(description="始業時の打刻集中を想定した負荷試験")
+    parser.add_argument("--users", type=int, default=200, help="一般ユーザーの仮想ユーザー数")
+    parser.add_argument("--admins", type=int, default=2, help="管理者の仮想ユーザー数")
+    parser.add_argument("--duration", type=float, default=30, help="通常時の計測秒数")
+    parser.add_argument("--days", type=int, default=60, help="用意する過去の勤怠記録の日数")
+    parser.add_argument("--think-ms", type=float, default=100, help="操作の間隔（ミリ秒）")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="計測用ユーザーのbcryptコスト")
+    parser.add_argument("--env", action="append", default=[], help="サーバーの設定（KEY=VALUE、複数指定可）")
+    parser.add_argument("--output", help="結果のJSONを保存するファイル（省略時は標準出力）")
+    args = parser.parse_args()
+    overrides = parse_env(args.env)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database_url = f"sqlite:///{os.path.join(tmpdir, 'load_test.db')}"
+        print(f"データを作成中...（ユーザー {args.users} 人 / 過去 {args.days} 日）", file=sys.stderr)
+        seed_database(database_url, args.users, args.admins, args.days, args.bcrypt_rounds)
+
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+                   BCRYPT_MAX_QUEUE=str(args.users + args.admins))
+        env.update(overrides)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env
+        )
+        try:
+            print("負荷をかけています...", file=sys.stderr)
+            phases = asyncio.run(run_load(f"http://127.0.0.1:{port}", args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    result = {
+        "revision": git_revision(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "users": args.users, "admins": args.admins, "duration": args.duration, "days": args.days,
+            "think_ms": args.think_ms, "bcrypt_rounds": args.bcrypt_rounds, "env": overrides,
+        },
+        "phases": phases,
+    }
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        print(f"結果を保存しました: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,30 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, Text, JSON, Index, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import sessionmaker, Session, relationship, joinedload
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import Optional, List
 import jwt
 import bcrypt
 import os
+from contextlib import asynccontextmanager
+
+# スキーマのバージョン確認（テーブル作成・変更は python migrate.py で行う）
+from app.core.migrations import check_schema
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """起動時にスキーマのバージョンを確認（未適用のマイグレーションがあれば起動しない）"""
+    check_schema(engine, auto_migrate=os.getenv("AUTO_MIGRATE", "false").lower() == "true")
+    yield
 
 # FastAPIアプリケーション
-app = FastAPI(title="勤怠管理システム")
+app = FastAPI(title="勤怠管理システム", lifespan=lifespan)
 
 # CORS設定
 app.add_middleware(
@@ -59,11 +71,17 @@ class AttendanceRecord(Base):
     clock_out = Column(DateTime)
     break_start = Column(DateTime)
     break_end = Column(DateTime)
+    break_seconds = Column(Float)  # 休憩時間の合計（NULL の場合は break_start〜break_end）
     notes = Column(Text)
     status = Column(String, default="present")  # present, absent, late, early_leave
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # 1ユーザー1日1レコード（打刻はこの一意制約に対するUPSERTで行う）
+    __table_args__ = (
+        Index("ux_attendance_records_user_date", "user_id", "date", unique=True),
+    )
+
 class CorrectionRequest(Base):
     __tablename__ = "correction_requests"
     
@@ -82,9 +100,142 @@ class CorrectionRequest(Base):
     approved_by = Column(Integer)  # 承認した管理者のID
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 外部キー制約のない既存テーブルのため、結合条件を明示した参照専用の関連
+    user = relationship("User", primaryjoin="foreign(CorrectionRequest.user_id) == User.id", viewonly=True)
+
+class AuditEvent(Base):
+    """勤怠記録への管理操作の監査ログ（追記専用、app/models/audit.py と同じテーブル）"""
+    __tablename__ = "audit_events"
+    
+    id = Column(Integer, primary_key=True)
+    actor_id = Column(Integer)  # 操作した管理者のID
+    action = Column(String, nullable=False)
+    target_type = Column(String, nullable=False)
+    target_id = Column(Integer, nullable=False)
+    correction_request_id = Column(Integer)
+    reason = Column(Text)
+    before = Column(JSON(none_as_null=True))
+    after = Column(JSON(none_as_null=True))
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_audit_events_target", "target_type", "target_id", "created_at", "id"),
+        Index("ix_audit_events_created", "created_at", "id"),
+    )
+
+class PunchEvent(Base):
+    """打刻・修正のイベントログ（追記専用、app/models/punch_event.py と同じテーブル）"""
+    __tablename__ = "punch_events"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    date = Column(String, nullable=False)  # YYYY-MM-DD形式
+    seq = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    occurred_at = Column(DateTime, nullable=False)
+    notes = Column(Text)
+    state = Column(JSON(none_as_null=True))
+    actor_id = Column(Integer)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    projected = Column(Boolean, nullable=False, default=False)  # 勤怠記録に反映済みか
+    
+    __table_args__ = (
+        Index("ux_punch_events_user_date_seq", "user_id", "date", "seq", unique=True),
+    )
+
+class MonthlyAttendanceRollup(Base):
+    """ユーザー別・月別の勤怠集計（app/models/rollup.py と同じテーブル、勤怠記録と同じトランザクションで差分更新）"""
+    __tablename__ = "monthly_attendance_rollups"
+    
+    user_id = Column(Integer, primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM形式
+    record_count = Column(Integer, nullable=False, default=0)
+    worked_seconds = Column(Float, nullable=False, default=0)
+    break_seconds = Column(Float, nullable=False, default=0)
+    days_present = Column(Integer, nullable=False, default=0)
+    late_count = Column(Integer, nullable=False, default=0)
+    absent_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# 月別ロールアップの差分計算（backend/app と同じ規則）
+from app.services.rollup_deltas import COUNTERS, add_rollup_delta, rollup_params, snapshot
+# 打刻イベントの追記と勤怠記録・ロールアップへの反映（backend/app と同じ処理）
+from app.services.punch import apply_punch
+from app.services.punch_projection import project_days
+
+def audit_state(record):
+    """監査ログに残す勤怠記録の値"""
+    if record is None:
+        return None
+    state = {}
+    for field in ("clock_in", "clock_out", "break_start", "break_end", "break_seconds", "status", "notes"):
+        value = getattr(record, field)
+        state[field] = value.isoformat() if isinstance(value, datetime) else value
+    return state
+
+def add_correction_event(db: Session, record, actor_id: int):
+    """管理者による修正を、記録全体の値を持つ correction イベントとして追記"""
+    seq = db.query(func.max(PunchEvent.seq)).filter(
+        PunchEvent.user_id == record.user_id,
+        PunchEvent.date == record.date
+    ).scalar() or 0
+    db.add(PunchEvent(
+        user_id=record.user_id,
+        date=record.date,
+        seq=seq + 1,
+        action="correction",
+        occurred_at=datetime.now(),
+        state=audit_state(record),
+        actor_id=actor_id,
+    ))
+
+CONCURRENT_UPDATE_DETAIL = "勤怠記録が同時に更新されました。再度お試しください"
+
+def commit_punch_event(db: Session):
+    """打刻・修正のイベントを含む変更をコミット
 
-# テーブル作成
-Base.metadata.create_all(bind=engine)
+    同じ日のイベントを同時に追記すると seq が重複し、(user_id, date, seq) の一意制約で
+    IntegrityError になるため、ロールバックして 409 を返す（backend/app と同じ応答）。
+    """
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=CONCURRENT_UPDATE_DETAIL)
+
+def apply_rollup_delta(db: Session, user_id: int, date: str, before, after):
+    """勤怠記録の変更前後の差分を月別ロールアップに加算（コミットは呼び出し側）"""
+    deltas = {}
+    add_rollup_delta(deltas, user_id, date, before, after)
+    params = rollup_params(deltas, datetime.utcnow())
+    if not params:
+        return
+    t = MonthlyAttendanceRollup
+    stmt = sqlite_insert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.user_id, t.month],
+        set_={
+            **{key: getattr(t, key) + getattr(stmt.excluded, key) for key in COUNTERS},
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt, params)
+
+def add_audit_event(db: Session, actor_id: int, action: str, record, before,
+                    reason: Optional[str] = None, correction_request_id: Optional[int] = None):
+    """監査ログを追加（勤怠記録のメモには追記しない）"""
+    db.flush()  # 新規記録のIDを確定
+    db.add(AuditEvent(
+        actor_id=actor_id,
+        action=action,
+        target_type="attendance_record",
+        target_id=record.id,
+        correction_request_id=correction_request_id,
+        reason=reason,
+        before=before,
+        after=audit_state(record),
+    ))
 
 # Pydanticモデル（リクエスト/レスポンス）
 class UserCreate(BaseModel):
@@ -234,54 +385,24 @@ def login_user(user: UserLogin, db: Session = Depends(get_db)):
 # 勤怠記録（出勤・退勤・休憩開始・終了）
 @app.post("/attendance")
 def record_attendance(attendance: AttendanceCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    today = datetime.now().strftime("%Y-%m-%d")
     current_time = datetime.now()
+    today = current_time.strftime("%Y-%m-%d")
     
-    # 今日の勤怠記録を取得または作成
-    record = db.query(AttendanceRecord).filter(
+    # 打刻は backend/app と同じく打刻イベントとして記録し（同じ検証・エラーメッセージ）、
+    # 旧版にはバックグラウンドの反映がないため、その日の勤怠記録・ロールアップを同じトランザクションで反映する
+    try:
+        apply_punch(db, current_user.id, attendance.action, attendance.notes, now=current_time)
+        project_days(db, [(current_user.id, today)])
+    except HTTPException:
+        db.rollback()
+        raise
+    commit_punch_event(db)
+    
+    record_id = db.query(AttendanceRecord.id).filter(
         AttendanceRecord.user_id == current_user.id,
         AttendanceRecord.date == today
-    ).first()
-    
-    if not record:
-        record = AttendanceRecord(user_id=current_user.id, date=today)
-        db.add(record)
-    
-    # アクションに応じて記録を更新
-    if attendance.action == "clock_in":
-        if record.clock_in:
-            raise HTTPException(status_code=400, detail="既に出勤記録があります")
-        record.clock_in = current_time
-        record.status = "present"
-    elif attendance.action == "clock_out":
-        if not record.clock_in:
-            raise HTTPException(status_code=400, detail="出勤記録がありません")
-        if record.clock_out:
-            raise HTTPException(status_code=400, detail="既に退勤記録があります")
-        record.clock_out = current_time
-    elif attendance.action == "break_start":
-        if not record.clock_in:
-            raise HTTPException(status_code=400, detail="出勤記録がありません")
-        if record.break_start and not record.break_end:
-            raise HTTPException(status_code=400, detail="既に休憩中です")
-        record.break_start = current_time
-    elif attendance.action == "break_end":
-        if not record.break_start:
-            raise HTTPException(status_code=400, detail="休憩開始記録がありません")
-        if record.break_end:
-            raise HTTPException(status_code=400, detail="既に休憩終了記録があります")
-        record.break_end = current_time
-    else:
-        raise HTTPException(status_code=400, detail="無効なアクションです")
-    
-    if attendance.notes:
-        record.notes = attendance.notes
-    
-    record.updated_at = current_time
-    db.commit()
-    db.refresh(record)
-    
-    return {"message": f"{attendance.action}が記録されました", "record_id": record.id}
+    ).scalar()
+    return {"message": f"{attendance.action}が記録されました", "record_id": record_id}
 
 # 勤怠記録取得（自分の記録）
 @app.get("/attendance")
@@ -407,6 +528,9 @@ def update_attendance_record(
     record = db.query(AttendanceRecord).filter(AttendanceRecord.id == record_id).first()
     if not record:
         raise HTTPException(status_code=404, detail="勤怠記録が見つかりません")
+    # backend/app の未反映の打刻があれば先に反映する
+    if project_days(db, [(record.user_id, record.date)]):
+        db.refresh(record)
     
     # 時刻文字列をdatetimeオブジェクトに変換する関数
     def time_string_to_datetime(date_str: str, time_str: str) -> datetime:
@@ -419,6 +543,9 @@ def update_attendance_record(
         except ValueError:
             raise HTTPException(status_code=400, detail=f"無効な時刻形式です: {time_str}")
     
+    before = audit_state(record)
+    rollup_before = snapshot(record)
+    
     # 修正データを適用
     if correction.clock_in is not None:
         record.clock_in = time_string_to_datetime(correction.date, correction.clock_in) if correction.clock_in else None
@@ -428,19 +555,19 @@ def update_attendance_record(
         record.break_start = time_string_to_datetime(correction.date, correction.break_start) if correction.break_start else None
     if correction.break_end is not None:
         record.break_end = time_string_to_datetime(correction.date, correction.break_end) if correction.break_end else None
+    if correction.break_start is not None or correction.break_end is not None:
+        record.break_seconds = None  # 休憩時刻を指定した修正は1回の休憩として扱う
     if correction.notes is not None:
         record.notes = correction.notes
     
     record.updated_at = datetime.utcnow()
     
-    # 修正ログを記録（メモに追記）
-    correction_log = f"\n[修正 {datetime.now().strftime('%Y-%m-%d %H:%M')} by {admin_user.username}] {correction.reason}"
-    if record.notes:
-        record.notes += correction_log
-    else:
-        record.notes = correction_log
+    # 修正ログを監査ログに記録し、月別ロールアップを同じトランザクションで更新
+    add_audit_event(db, admin_user.id, "attendance_corrected", record, before, reason=correction.reason)
+    apply_rollup_delta(db, record.user_id, record.date, rollup_before, snapshot(record))
+    add_correction_event(db, record, admin_user.id)
     
-    db.commit()
+    commit_punch_event(db)
     db.refresh(record)
     
     return {"message": "勤怠記録を修正しました", "record_id": record.id}
@@ -456,7 +583,8 @@ def create_attendance_record(
     if not user:
         raise HTTPException(status_code=404, detail="ユーザーが見つかりません")
     
-    # 既存の記録があるかチェック
+    # 既存の記録があるかチェック（backend/app の未反映の打刻があれば先に反映する）
+    project_days(db, [(correction.user_id, correction.date)])
     existing_record = db.query(AttendanceRecord).filter(
         AttendanceRecord.user_id == correction.user_id,
         AttendanceRecord.date == correction.date
@@ -484,18 +612,17 @@ def create_attendance_record(
         clock_out=time_string_to_datetime(correction.date, correction.clock_out),
         break_start=time_string_to_datetime(correction.date, correction.break_start),
         break_end=time_string_to_datetime(correction.date, correction.break_end),
+        notes=correction.notes,
         status="present"
     )
     
-    # 作成ログを記録
-    creation_log = f"[作成 {datetime.now().strftime('%Y-%m-%d %H:%M')} by {admin_user.username}] {correction.reason}"
-    if correction.notes:
-        new_record.notes = f"{correction.notes}\n{creation_log}"
-    else:
-        new_record.notes = creation_log
-    
     db.add(new_record)
-    db.commit()
+    
+    # 作成ログを監査ログに記録し、月別ロールアップを同じトランザクションで更新
+    add_audit_event(db, admin_user.id, "attendance_created", new_record, None, reason=correction.reason)
+    apply_rollup_delta(db, new_record.user_id, new_record.date, None, snapshot(new_record))
+    add_correction_event(db, new_record, admin_user.id)
+    commit_punch_event(db)
     db.refresh(new_record)
     
     return {"message": "勤怠記録を作成しました", "record_id": new_record.id}
@@ -578,14 +705,17 @@ def get_all_correction_requests(
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
-    requests = db.query(CorrectionRequest).order_by(
+    # 申請者は同じSELECTでJOINして取得（申請ごとの追加クエリを発行しない）
+    requests = db.query(CorrectionRequest).options(
+        joinedload(CorrectionRequest.user)
+    ).order_by(
         CorrectionRequest.status.asc(),  # pending を最初に
         CorrectionRequest.created_at.desc()
     ).all()
     
     result = []
     for req in requests:
-        user = db.query(User).filter(User.id == req.user_id).first()
+        user = req.user
         result.append({
             "id": req.id,
             "user": {
@@ -635,25 +765,29 @@ def process_correction_request(
     
     # 承認の場合、実際の勤怠記録を更新または作成
     if approval.status == "approved":
+        # backend/app の未反映の打刻があれば先に反映する
+        project_days(db, [(correction_request.user_id, correction_request.requested_date)])
         if correction_request.attendance_record_id:
             # 既存記録の修正
             record = db.query(AttendanceRecord).filter(
                 AttendanceRecord.id == correction_request.attendance_record_id
             ).first()
             if record:
+                before = audit_state(record)
+                rollup_before = snapshot(record)
                 record.clock_in = correction_request.requested_clock_in
                 record.clock_out = correction_request.requested_clock_out
                 record.break_start = correction_request.requested_break_start
                 record.break_end = correction_request.requested_break_end
+                record.break_seconds = None
                 record.notes = correction_request.requested_notes
                 record.updated_at = datetime.utcnow()
                 
-                # 修正ログを追加
-                log_entry = f"\n[修正承認 {datetime.now().strftime('%Y-%m-%d %H:%M')} by {admin_user.username}] 申請ID: {request_id}"
-                if record.notes:
-                    record.notes += log_entry
-                else:
-                    record.notes = log_entry
+                # 修正ログを監査ログに記録し、月別ロールアップを同じトランザクションで更新
+                add_audit_event(db, admin_user.id, "correction_approved", record, before,
+                                reason=correction_request.reason, correction_request_id=request_id)
+                apply_rollup_delta(db, record.user_id, record.date, rollup_before, snapshot(record))
+                add_correction_event(db, record, admin_user.id)
         else:
             # 新規記録の作成
             new_record = AttendanceRecord(
@@ -667,16 +801,15 @@ def process_correction_request(
                 status="present"
             )
             
-            # 作成ログを追加
-            creation_log = f"[申請承認作成 {datetime.now().strftime('%Y-%m-%d %H:%M')} by {admin_user.username}] 申請ID: {request_id}"
-            if new_record.notes:
-                new_record.notes = f"{new_record.notes}\n{creation_log}"
-            else:
-                new_record.notes = creation_log
-            
             db.add(new_record)
+            
+            # 作成ログを監査ログに記録し、月別ロールアップを同じトランザクションで更新
+            add_audit_event(db, admin_user.id, "correction_approved", new_record, None,
+                            reason=correction_request.reason, correction_request_id=request_id)
+            apply_rollup_delta(db, new_record.user_id, new_record.date, None, snapshot(new_record))
+            add_correction_event(db, new_record, admin_user.id)
     
-    db.commit()
+    commit_punch_event(db)
     
     status_text = "承認" if approval.status == "approved" else "却下"
     return {"message": f"修正申請を{status_text}しました"}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+打刻イベント管理スクリプト
+打刻イベントを畳み込んだ結果と勤怠記録の差異を検出（verify）、
+または勤怠記録をイベントから作り直して月別ロールアップを再作成（rebuild）します。
+打刻イベントのない記録（イベント導入前の記録）は対象外です。
+verify はアプリが未反映の打刻イベント（反映待ち）も差異として表示します。
+
+使い方:
+    python manage_punch_events.py verify
+    python manage_punch_events.py rebuild
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import false, update
+
+from app.core.database import SessionLocal, create_tables
+from app.models import PunchEvent
+from app.services.punch_events import replay_records
+from app.services.punch_projection import pending_days
+from app.services.rollups import rebuild_rollups
+
+def rebuild():
+    """勤怠記録をイベントから作り直し、ロールアップを再作成"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        problems = replay_records(db, rebuild=True)
+        count = rebuild_rollups(db)
+        # 全イベントを反映済みにする（アプリの反映処理が同じ日を重ねて反映しないように）
+        db.execute(update(PunchEvent).where(PunchEvent.projected == false()).values(projected=True))
+        db.commit()
+        print(f"✅ 勤怠記録をイベントから作り直しました（{len(problems)} 件）")
+        print(f"✅ 月別ロールアップを再作成しました（{count} 件）")
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+    return True
+
+def verify():
+    """イベントと勤怠記録の差異を表示"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        problems = replay_records(db)
+        pending = len(pending_days(db))
+    finally:
+        db.close()
+
+    if problems:
+        for problem in problems:
+            print(f"  {problem}")
+        if pending:
+            print(f"ℹ️  {pending} 日分の打刻は反映待ちです（アプリの起動中は自動で反映されます）。")
+        print(f"❌ {len(problems)} 件の差異があります。'python manage_punch_events.py rebuild' で作り直してください。")
+        return False
+
+    print("✅ 勤怠記録は打刻イベントと一致しています。")
+    return True
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "rebuild":
+        sys.exit(0 if rebuild() else 1)
+    elif command == "verify":
+        sys.exit(0 if verify() else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+月別ロールアップ管理スクリプト
+勤怠記録から月別ロールアップを再作成（rebuild）、または差異を検出（verify）します。
+
+使い方:
+    python manage_rollups.py verify
+    python manage_rollups.py rebuild
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app.core.database import SessionLocal, create_tables
+from app.services.rollups import rebuild_rollups, verify_rollups
+
+def rebuild():
+    """ロールアップを全件再作成"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        count = rebuild_rollups(db)
+        db.commit()
+        print(f"✅ 月別ロールアップを再作成しました（{count} 件）")
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        db.rollback()
+        return False
+    finally:
+        db.close()
+    return True
+
+def verify():
+    """ロールアップと勤怠記録の差異を表示"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        problems = verify_rollups(db)
+    finally:
+        db.close()
+    
+    if problems:
+        for problem in problems:
+            print(f"  {problem}")
+        print(f"❌ {len(problems)} 件の差異があります。'python manage_rollups.py rebuild' で再作成してください。")
+        return False
+    
+    print("✅ 月別ロールアップは勤怠記録と一致しています。")
+    return True
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "rebuild":
+        sys.exit(0 if rebuild() else 1)
+    elif command == "verify":
+        sys.exit(0 if verify() else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+スキーママイグレーションスクリプト
+未適用のマイグレーションを適用（upgrade）、または適用状況を表示（status）します。
+アプリケーションは起動時にスキーマのバージョンを確認するだけなので、
+初回セットアップ時と更新のたびに実行してください。
+
+使い方:
+    python migrate.py
+    python migrate.py upgrade
+    python migrate.py status
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from app.core.database import engine
+from app.core.migrations import MIGRATIONS, LATEST_VERSION, current_version, migrate, schema_migrations
+
+def upgrade():
+    """未適用のマイグレーションを適用"""
+    try:
+        applied = migrate(engine)
+    except Exception as e:
+        print(f"エラーが発生しました: {e}")
+        return False
+
+    for name in applied:
+        print(f"  適用: {name}")
+    if applied:
+        print(f"✅ {len(applied)} 件のマイグレーションを適用しました（バージョン {LATEST_VERSION}）")
+    else:
+        print(f"✅ スキーマは最新です（バージョン {LATEST_VERSION}）")
+    return True
+
+def status():
+    """マイグレーションの適用状況を表示"""
+    try:
+        with engine.connect() as conn:
+            applied = {row.version: row.applied_at for row in conn.execute(select(schema_migrations))}
+    except DBAPIError:
+        applied = {}
+
+    for version, name, _ in MIGRATIONS:
+        applied_at = applied.get(version)
+        state = f"適用済み {applied_at:%Y-%m-%d %H:%M:%S}" if applied_at else "未適用"
+        print(f"  {version:>3} {name:<40} {state}")
+
+    version = current_version(engine)
+    if version < LATEST_VERSION:
+        print(f"❌ スキーマが古いです（バージョン {version} / 最新 {LATEST_VERSION}）。'python migrate.py' で適用してください。")
+        return False
+
+    print(f"✅ スキーマは最新です（バージョン {version}）")
+    return True
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "upgrade"
+    if command == "upgrade":
+        sys.exit(0 if upgrade() else 1)
+    elif command == "status":
+        sys.exit(0 if status() else 1)
+    else:
+        print(__doc__)
+        sys.exit(1)
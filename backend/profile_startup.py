@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+起動時間のプロファイル
+次の2つを計測して、起動が遅くなった原因（重いモジュールの読み込み・起動時の処理）を表示します。
+  1. import 時間   python -X importtime で app.main の読み込み時間を計測し、
+                   累積時間の大きいパッケージと自身の時間が大きいモジュールを表示
+  2. 起動時間      マイグレーション済みの一時データベースでAPIサーバー（uvicorn）を --runs 回起動し、
+                   プロセス起動から GET / が応答するまでの時間と、
+                   /metrics の app_startup_seconds（import・スキーマ確認・在席状況の作成・bcryptコスト調整）を表示
+--env で設定を変えて（例: --env BCRYPT_ROUNDS=12）比較できます。
+実行には httpx が必要です（requirements.txt）。
+
+使い方:
+    python profile_startup.py [--runs 5] [--top 15] [--env KEY=VALUE ...] [--output result.json]
+"""
+
+import sys
+import os
+import argparse
+import json
+import re
+import secrets
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from _bench_common import BACKEND_DIR, free_port, git_revision, parse_env
+
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+STARTUP_SAMPLE = re.compile(r'^app_startup_seconds\{phase="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+def profile_imports(env: dict, module: str = "app.main") -> dict:
+    """python -X importtime の結果を集計（時間はミリ秒）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} を読み込めませんでした:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append({
+                "module": name,
+                "depth": len(indent) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+
+    total = next((m["cumulative_ms"] for m in modules if m["module"] == module), 0.0)
+    # 最上位のパッケージごとの合計（同じパッケージが複数の場所から読み込まれても最初の1回だけ計上される）
+    packages = {}
+    for m in modules:
+        package = m["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + m["self_ms"]
+    return {
+        "total_ms": total,
+        "packages": sorted(({"package": p, "ms": ms} for p, ms in packages.items()),
+                           key=lambda d: d["ms"], reverse=True),
+        "modules": sorted(modules, key=lambda m: m["self_ms"], reverse=True),
+    }
+
+def migrate_database(env: dict) -> None:
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+
+def measure_startup(env: dict, timeout: float = 60) -> dict:
+    """APIサーバーを起動し、GET / が応答するまでの時間と起動処理の内訳を返す"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=5) as client:
+            deadline = time.monotonic() + timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("サーバーが起動中に終了しました（スキーマが古い場合は migrate.py を実行してください）")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("サーバーが起動しませんでした")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            ready_ms = (time.perf_counter() - started) * 1000
+
+            phases = {}
+            response = client.get("/metrics", headers={"Authorization": f"Bearer {env['METRICS_TOKEN']}"})
+            if response.status_code == 200:
+                phases = {phase: float(value) * 1000 for phase, value in STARTUP_SAMPLE.findall(response.text)}
+    finally:
+        server.terminate()
+        server.wait()
+    return {"ready_ms": ready_ms, "phases_ms": phases}
+
+def summarize_runs(runs: list) -> dict:
+    ready = [run["ready_ms"] for run in runs]
+    phases = {}
+    for run in runs:
+        for phase, ms in run["phases_ms"].items():
+            phases.setdefault(phase, []).append(ms)
+    return {
+        "ready_ms": {"min": min(ready), "median": statistics.median(ready), "max": max(ready)},
+        "phases_ms": {phase: statistics.median(values) for phase, values in phases.items()},
+    }
+
+def print_report(imports: dict, startup: dict, top: int) -> None:
+    print(f"app.main の import 時間: {imports['total_ms']:.1f} ms")
+    print()
+    print("パッケージ別（自身の時間の合計）:")
+    for entry in imports["packages"][:top]:
+        print(f"  {entry['ms']:8.1f} ms  {entry['package']}")
+    print()
+    print("モジュール別（自身の時間）:")
+    for entry in imports["modules"][:top]:
+        print(f"  {entry['self_ms']:8.1f} ms  {entry['module']}")
+    print()
+    ready = startup["ready_ms"]
+    print(f"起動から応答まで: 中央値 {ready['median']:.0f} ms（最小 {ready['min']:.0f} / 最大 {ready['max']:.0f}）")
+    if startup["phases_ms"]:
+        print("起動処理の内訳（中央値）:")
+        for phase, ms in startup["phases_ms"].items():
+            print(f"  {ms:8.1f} ms  {phase}")
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間のプロファイル")
+    parser.add_argument("--runs", type=int, default=5, help="サーバーを起動する回数")
+    parser.add_argument("--top", type=int, default=15, help="表示するパッケージ・モジュールの数")
+    parser.add_argument("--env", action="append", default=[], help="サーバーの設定（KEY=VALUE、複数指定可）")
+    parser.add_argument("--output", help="結果のJSONを保存するファイル")
+    args = parser.parse_args()
+    overrides = parse_env(args.env)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # /metrics の起動処理の内訳を読むため、METRICS_TOKEN が未指定なら一時的なトークンを設定する
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'startup.db')}",
+                   METRICS_TOKEN=os.environ.get("METRICS_TOKEN") or secrets.token_urlsafe(24))
+        env.update(overrides)
+
+        print("import 時間を計測中...", file=sys.stderr)
+        imports = profile_imports(env)
+
+        print(f"起動時間を計測中...（{args.runs} 回）", file=sys.stderr)
+        migrate_database(env)
+        # 1回目はバイトコードのコンパイル・ファイルキャッシュの影響を受けるため計測に含めない
+        measure_startup(env)
+        startup = summarize_runs([measure_startup(env) for _ in range(args.runs)])
+
+    print_report(imports, startup, args.top)
+
+    if args.output:
+        result = {
+            "revision": git_revision(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "config": {"runs": args.runs, "env": overrides},
+            "imports": {
+                "total_ms": imports["total_ms"],
+                "packages": imports["packages"][:args.top],
+                "modules": imports["modules"][:args.top],
+            },
+            "startup": startup,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
+        print(f"結果を保存しました: {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+テストの共通設定
+
+app の設定はモジュールの読み込み時に環境変数から決まるため、app を読み込む前に
+一時ディレクトリのデータベースとテスト用の設定を指定する。
+"""
+import os
+import shutil
+import tempfile
+
+_tmpdir = tempfile.mkdtemp(prefix="attendance-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["AUTO_MIGRATE"] = "true"
+os.environ["SLOW_QUERY_MS"] = "0"
+# 打刻の反映はテストから明示的に行う（バックグラウンドの反映タスクは起動しない）
+os.environ["PUNCH_PROJECTION_INTERVAL_MS"] = "0"
+# 認証ユーザーキャッシュの共有世代もテストから明示的に確認する
+os.environ["PRINCIPAL_GENERATION_CHECK_MS"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.database import Base, SessionLocal, create_tables, engine
+from app.core.security import create_access_token, principal_cache
+from app.models import User
+
+def pytest_sessionfinish(session, exitstatus):
+    engine.dispose()
+    shutil.rmtree(_tmpdir, ignore_errors=True)
+
+@pytest.fixture
+def db():
+    """マイグレーション済みのデータベースのセッション（テストごとに全テーブルを空にする）"""
+    create_tables()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        with engine.begin() as conn:
+            for table in reversed(Base.metadata.sorted_tables):
+                conn.execute(table.delete())
+        principal_cache.clear()
+
+@pytest.fixture
+def users(db):
+    """管理者（id=1, admin）と社員（id=2, alice / id=3, bob）"""
+    db.add_all([
+        User(id=1, username="admin", email="admin@example.com", hashed_password="x", full_name="管理者", is_admin=True),
+        User(id=2, username="alice", email="alice@example.com", hashed_password="x", full_name="Alice"),
+        User(id=3, username="bob", email="bob@example.com", hashed_password="x", full_name="Bob"),
+    ])
+    db.commit()
+
+def auth_headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+
+@pytest.fixture
+def client(users):
+    """backend/app のAPI（起動時の処理を含む）"""
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,127 @@
+"""
+SQL集計（aggregate_work_hours）と勤怠記録ごとのPython計算の一致を確認する
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models import AttendanceRecord, User
+from app.services.aggregation import aggregate_work_hours
+from app.services.attendance_utils import calculate_work_hours, is_late
+
+def _at(date: str, hhmm: str, days: int = 0) -> datetime:
+    return datetime.strptime(f"{date} {hhmm}", "%Y-%m-%d %H:%M") + timedelta(days=days)
+
+def _record(user_id, date, clock_in=None, clock_out=None, break_start=None, break_end=None, status="present",
+            break_seconds=None):
+    return AttendanceRecord(
+        user_id=user_id, date=date, status=status, break_seconds=break_seconds,
+        clock_in=_at(date, clock_in) if clock_in else None,
+        # 退勤・休憩は (時刻, 日数) で翌日にまたがる記録も表す
+        clock_out=_at(date, *clock_out) if clock_out else None,
+        break_start=_at(date, *break_start) if break_start else None,
+        break_end=_at(date, *break_end) if break_end else None,
+    )
+
+@pytest.fixture
+def records(db):
+    db.add_all([
+        User(id=1, username="alice", email="alice@example.com", hashed_password="x", full_name="Alice"),
+        User(id=2, username="bob", email="bob@example.com", hashed_password="x", full_name="Bob"),
+    ])
+    db.add_all([
+        # 通常の勤務（休憩あり）
+        _record(1, "2024-01-29", "08:55", ("18:00",), ("12:00",), ("13:00",)),
+        # 始業後の出勤（遅刻）
+        _record(1, "2024-01-30", "09:10", ("18:30",), ("12:00",), ("12:45",)),
+        # 日付をまたぐ夜勤（休憩も日付をまたぐ）
+        _record(1, "2024-01-31", "22:00", ("06:30", 1), ("23:30",), ("00:15", 1)),
+        # 月をまたいだ週（2024-02-01 は 2024-01-29 と同じ週）、休憩中のまま退勤
+        _record(1, "2024-02-01", "08:30", ("17:00",), ("12:00",)),
+        # 退勤していない（労働時間は計上しない）
+        _record(1, "2024-02-05", "08:45"),
+        # 欠勤・遅刻ステータス
+        _record(1, "2024-02-06", status="absent"),
+        _record(2, "2024-01-29", "08:00", ("12:00",), status="late"),
+        # 休憩終了のみ（休憩は計上しない）
+        _record(2, "2024-02-02", "08:50", ("17:50",), break_end=("13:00",)),
+        # 日付をまたぎ、休憩中のまま翌朝に退勤
+        _record(2, "2024-02-03", "20:00", ("05:00", 1), ("01:00", 1)),
+        # 複数回の休憩（最初の開始〜最後の終了ではなく休憩時間の合計を差し引く）
+        _record(2, "2024-02-05", "09:00", ("18:00",), ("10:00",), ("15:15",), break_seconds=75 * 60),
+    ])
+    db.commit()
+    return db
+
+def _period_key(date_str: str, period: str) -> str:
+    if period == "day":
+        return date_str
+    if period == "month":
+        return date_str[:7]
+    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
+    return (date_obj - timedelta(days=date_obj.weekday())).strftime("%Y-%m-%d")
+
+def _aggregate_in_python(db, period: str) -> dict:
+    """勤怠記録を1件ずつ計算して集計（/reports/attendance-summary と同じ計算）"""
+    totals = defaultdict(lambda: {"worked_seconds": 0.0, "break_seconds": 0.0, "days": set(),
+                                  "record_count": 0, "late_count": 0, "absent_count": 0})
+    for record in db.query(AttendanceRecord):
+        work_hours, break_hours = calculate_work_hours(
+            record.clock_in, record.clock_out, record.break_start, record.break_end, record.break_seconds
+        )
+        group = totals[(record.user_id, _period_key(record.date, period))]
+        group["record_count"] += 1
+        group["worked_seconds"] += work_hours * 3600
+        group["break_seconds"] += break_hours * 3600
+        if record.clock_in:
+            group["days"].add(record.date)
+        if is_late(record.clock_in, record.status, settings.WORK_START_TIME):
+            group["late_count"] += 1
+        if record.status == "absent" or not record.clock_in:
+            group["absent_count"] += 1
+    return {
+        key: {
+            "record_count": group["record_count"],
+            "worked_seconds": int(round(group["worked_seconds"])),
+            "break_seconds": int(round(group["break_seconds"])),
+            "days_present": len(group["days"]),
+            "late_count": group["late_count"],
+            "absent_count": group["absent_count"],
+        }
+        for key, group in totals.items()
+    }
+
+COMPARED_FIELDS = ("record_count", "worked_seconds", "break_seconds", "days_present", "late_count", "absent_count")
+
+@pytest.mark.parametrize("period", ["day", "week", "month"])
+def test_sql_aggregation_matches_per_row_computation(records, period):
+    expected = _aggregate_in_python(records, period)
+    actual = {
+        (row["user_id"], row["period"]): {name: row[name] for name in COMPARED_FIELDS}
+        for row in aggregate_work_hours(records, period)
+    }
+    assert actual == expected
+
+def test_cross_midnight_and_open_break_rows(records):
+    rows = {row["period"]: row for row in aggregate_work_hours(records, "day", user_id=1)}
+    # 22:00 〜 翌 06:30（8.5時間）から 23:30 〜 翌 00:15 の休憩を差し引く
+    assert rows["2024-01-31"]["worked_seconds"] == int(7.75 * 3600)
+    assert rows["2024-01-31"]["break_seconds"] == 45 * 60
+    # 休憩終了のない記録は休憩を差し引かない
+    assert rows["2024-02-01"]["worked_seconds"] == int(8.5 * 3600)
+    assert rows["2024-02-01"]["break_seconds"] == 0
+    # 退勤のない記録は出勤日数に数えるが労働時間は0
+    assert rows["2024-02-05"]["worked_seconds"] == 0
+    assert rows["2024-02-05"]["days_present"] == 1
+
+def test_break_seconds_overrides_break_span(records):
+    rows = {row["period"]: row for row in aggregate_work_hours(records, "day", user_id=2)}
+    assert rows["2024-02-05"]["break_seconds"] == 75 * 60
+    assert rows["2024-02-05"]["worked_seconds"] == int(7.75 * 3600)
+
+def test_date_range_filter(records):
+    rows = aggregate_work_hours(records, "month", start_date="2024-02-01", end_date="2024-02-29")
+    assert {(row["user_id"], row["period"]) for row in rows} == {(1, "2024-02"), (2, "2024-02")}
+    assert sum(row["record_count"] for row in rows) == 6
@@ -0,0 +1,135 @@
+"""
+打刻API（POST /attendance/）
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from app.core.config import settings
+from app.core.query_log import PROFILE_HEADER, QUERY_COUNT_HEADER
+from app.models import AttendanceRecord, MonthlyAttendanceRollup, PunchEvent
+from app.routers import attendance
+from app.services.pagination import NEXT_CURSOR_HEADER
+from app.services.punch_projection import catch_up, pending_days
+from app.services.rollups import verify_rollups
+from conftest import auth_headers
+
+def test_punch_sequence(client):
+    alice = auth_headers("alice")
+    for action in ("clock_in", "break_start", "break_end", "clock_out"):
+        response = client.post("/attendance/", json={"action": action}, headers=alice)
+        assert response.status_code == 200, response.text
+    response = client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+    assert response.status_code == 400
+
+def test_lock_timeout_returns_503(client, monkeypatch):
+    def locked(*args, **kwargs):
+        raise OperationalError("INSERT INTO punch_events ...", {}, sqlite3.OperationalError("database is locked"))
+
+    # 直接書き込む経路（_punch）を対象にする（PUNCH_GROUP_COMMIT=true の環境でも同じ経路を通す）
+    monkeypatch.setattr(settings, "PUNCH_GROUP_COMMIT", False)
+    monkeypatch.setattr(attendance, "_punch", locked)
+    response = client.post("/attendance/", json={"action": "clock_in"}, headers=auth_headers("alice"))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+def test_punch_only_inserts_an_event_until_records_are_read(client, db):
+    alice = auth_headers("alice")
+    response = client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+    assert response.status_code == 200
+    event = db.query(PunchEvent).one()
+    assert response.json()["event_id"] == event.id
+    # 勤怠記録・ロールアップは打刻では書き込まない
+    assert db.query(AttendanceRecord).count() == 0
+    assert db.query(MonthlyAttendanceRollup).count() == 0
+    assert pending_days(db) == [(2, event.date)]
+
+    # 勤怠記録の取得は反映せずに、未反映の打刻をイベントから求めて返す（書き込まない）
+    today = client.get("/attendance/today", headers=alice).json()
+    assert (today["id"], today["status"]) == (0, "present")
+    assert today["clock_in"] is not None
+    [item] = client.get("/attendance/", headers=alice).json()
+    assert (item["id"], item["date"], item["clock_in"]) == (0, event.date, today["clock_in"])
+    assert db.query(AttendanceRecord).count() == 0
+    assert pending_days(db) == [(2, event.date)]
+
+    # バックグラウンドの反映で勤怠記録・ロールアップが作られる
+    assert catch_up() == 1
+    assert pending_days(db) == []
+    assert verify_rollups(db) == []
+    assert client.get("/attendance/today", headers=alice).json()["clock_in"] == today["clock_in"]
+
+def test_records_show_pending_punches_without_projecting(client, db):
+    alice = auth_headers("alice")
+    client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+    catch_up()
+    client.post("/attendance/", json={"action": "break_start"}, headers=alice)
+
+    today = client.get("/attendance/today", headers=alice).json()
+    assert today["id"] != 0 and today["break_start"] is not None and today["break_end"] is None
+    assert len(today["breaks"]) == 1
+    record = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).one()
+    assert record.break_start is None
+
+def test_pending_day_without_record_respects_pagination(client, db):
+    alice = auth_headers("alice")
+    db.add_all([AttendanceRecord(user_id=2, date=f"2024-03-0{day}", status="present") for day in (1, 2, 3)])
+    db.commit()
+    client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+
+    first = client.get("/attendance/", params={"limit": 2}, headers=alice)
+    dates = [item["date"] for item in first.json()]
+    assert dates[1:] == ["2024-03-03", "2024-03-02"] and dates[0] > "2024-03-03"
+    second = client.get("/attendance/", params={"limit": 2, "cursor": first.headers[NEXT_CURSOR_HEADER]},
+                        headers=alice)
+    assert [item["date"] for item in second.json()] == ["2024-03-01"]
+
+def test_bookkeeping_timestamps_use_utc(client, db):
+    response = client.post("/attendance/", json={"action": "clock_in"}, headers=auth_headers("alice"))
+    assert response.status_code == 200
+    catch_up()
+    record = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).one()
+    event = db.query(PunchEvent).filter(PunchEvent.user_id == 2).one()
+    # 打刻時刻は現地時刻、created_at / updated_at は UTC
+    assert abs(record.clock_in - datetime.now()) < timedelta(minutes=1)
+    for stamp in (record.created_at, record.updated_at, event.created_at):
+        assert abs(stamp - datetime.utcnow()) < timedelta(minutes=1)
+
+def test_conditional_get_returns_304_until_records_change(client, db):
+    alice = auth_headers("alice")
+    client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+    for path in ("/attendance/today", "/attendance/?limit=20"):
+        first = client.get(path, headers=alice)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert client.get(path, headers={**alice, "If-None-Match": etag}).status_code == 304
+
+        client.post("/attendance/", json={"action": "break_start" if "today" in path else "break_end"},
+                    headers=alice)
+        changed = client.get(path, headers={**alice, "If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != etag
+
+def test_not_modified_is_served_from_a_single_query(client, db):
+    """304 は ETag の1クエリだけで返す（未反映の打刻もその1クエリで検出する）"""
+    admin = {**auth_headers("admin"), PROFILE_HEADER: "1"}
+    client.post("/attendance/", json={"action": "clock_in"}, headers=admin)
+    etag = client.get("/attendance/?limit=20", headers=admin).headers["ETag"]
+    cached = client.get("/attendance/?limit=20", headers={**admin, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers[QUERY_COUNT_HEADER] == "1"
+
+    client.post("/attendance/", json={"action": "break_start"}, headers=admin)
+    assert client.get("/attendance/?limit=20", headers={**admin, "If-None-Match": etag}).status_code == 200
+
+def test_etag_changes_when_record_is_updated_in_place(client, db):
+    """打刻以外の更新（管理者の修正）でも updated_at が進み、ETag が変わる"""
+    alice = auth_headers("alice")
+    client.post("/attendance/", json={"action": "clock_in"}, headers=alice)
+    catch_up()
+    etag = client.get("/attendance/today", headers=alice).headers["ETag"]
+    record = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).one()
+    record.notes = "修正"
+    db.commit()
+    assert client.get("/attendance/today", headers={**alice, "If-None-Match": etag}).status_code == 200
@@ -0,0 +1,51 @@
+"""
+勤怠記録の修正の監査ログ（GET /admin/audit-events）
+"""
+from datetime import datetime
+
+from app.models import AttendanceRecord, AuditEvent, CorrectionRequest
+from conftest import auth_headers
+
+def test_admin_correction_writes_audit_event(client, db):
+    db.add(AttendanceRecord(id=10, user_id=2, date="2024-03-04", status="present", notes="打刻",
+                            clock_in=datetime(2024, 3, 4, 9, 30)))
+    db.commit()
+
+    admin = auth_headers("admin")
+    response = client.post("/admin/attendance/correct", headers=admin, json={
+        "user_id": 2, "date": "2024-03-04", "clock_in": "09:00", "clock_out": "18:00", "reason": "打刻漏れ",
+    })
+    assert response.status_code == 200, response.text
+
+    response = client.get("/admin/audit-events", params={"target_id": 10}, headers=admin)
+    assert response.status_code == 200, response.text
+    [event] = response.json()
+    assert (event["actor_id"], event["action"], event["target_type"], event["reason"]) == (
+        1, "attendance_corrected", "attendance_record", "打刻漏れ"
+    )
+    assert event["correction_request_id"] is None
+    assert (event["before"]["clock_in"], event["before"]["clock_out"]) == ("2024-03-04T09:30:00", None)
+    assert (event["after"]["clock_in"], event["after"]["clock_out"]) == ("2024-03-04T09:00:00", "2024-03-04T18:00:00")
+    # 修正理由は監査ログにのみ残し、勤怠記録のメモには追記しない
+    db.expire_all()
+    assert db.get(AttendanceRecord, 10).notes == "打刻"
+
+    assert client.get("/admin/audit-events", headers=auth_headers("alice")).status_code == 403
+
+def test_approved_correction_request_writes_audit_event(client, db):
+    db.add(CorrectionRequest(id=1, user_id=2, requested_date="2024-03-05", reason="出勤の打刻忘れ",
+                             requested_clock_in=datetime(2024, 3, 5, 9, 0),
+                             requested_clock_out=datetime(2024, 3, 5, 18, 0)))
+    db.commit()
+
+    admin = auth_headers("admin")
+    response = client.put("/correction-request/1/approve", headers=admin, json={"status": "approved"})
+    assert response.status_code == 200, response.text
+
+    response = client.get("/admin/audit-events", params={"correction_request_id": 1}, headers=admin)
+    [event] = response.json()
+    record = db.query(AttendanceRecord).filter_by(user_id=2, date="2024-03-05").one()
+    assert (event["action"], event["target_id"], event["reason"]) == ("correction_approved", record.id, "出勤の打刻忘れ")
+    assert event["before"] is None
+    assert event["after"]["clock_out"] == "2024-03-05T18:00:00"
+    assert db.query(AuditEvent).count() == 1
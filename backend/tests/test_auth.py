@@ -0,0 +1,56 @@
+"""
+ログイン（POST /auth/login）とbcryptの専用プール（app/core/security.py）
+"""
+import threading
+
+import bcrypt
+
+from app.core import security
+from app.models import User
+
+def _set_password(db, user_id: int, password: str, rounds: int) -> str:
+    hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+    db.get(User, user_id).hashed_password = hashed
+    db.commit()
+    return hashed
+
+def _login(client, username: str, password: str):
+    return client.post("/auth/login", json={"username": username, "password": password})
+
+def test_login_returns_429_when_hashing_queue_is_full(client, db, monkeypatch):
+    _set_password(db, 2, "secret", security.bcrypt_rounds)
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(security, "_hash_slots", slots)
+
+    # 実行中・待ち行列の枠がすべて埋まっている間は、bcryptを待たずに即座に断る
+    slots.acquire()
+    response = _login(client, "alice", "secret")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    slots.release()
+    assert _login(client, "alice", "secret").status_code == 200
+
+def test_login_rehashes_password_after_cost_change(client, db):
+    old_rounds = security.bcrypt_rounds + 1
+    old_hash = _set_password(db, 2, "secret", old_rounds)
+    assert security.needs_rehash(old_hash)
+
+    assert _login(client, "alice", "secret").status_code == 200
+    db.expire_all()
+    new_hash = db.get(User, 2).hashed_password
+    assert new_hash != old_hash
+    assert new_hash.split("$")[2] == f"{security.bcrypt_rounds:02d}"
+    assert not security.needs_rehash(new_hash)
+    assert security.verify_password("secret", new_hash)
+
+    # 現在のコストのハッシュは書き換えない
+    assert _login(client, "alice", "secret").status_code == 200
+    db.expire_all()
+    assert db.get(User, 2).hashed_password == new_hash
+
+def test_wrong_password_does_not_rehash(client, db):
+    old_hash = _set_password(db, 2, "secret", security.bcrypt_rounds + 1)
+    assert _login(client, "alice", "wrong").status_code == 401
+    db.expire_all()
+    assert db.get(User, 2).hashed_password == old_hash
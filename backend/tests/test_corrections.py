@@ -0,0 +1,183 @@
+"""
+修正申請の承認（PUT /correction-request/{id}/approve・POST /correction-request/batch-approve）
+"""
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.query_log import PROFILE_HEADER, QUERY_COUNT_HEADER
+from app.models import AttendanceRecord, AuditEvent, CorrectionRequest, PunchEvent, User
+from app.routers import corrections
+from app.services import punch_events
+from app.services.rollups import rebuild_rollups, verify_rollups
+from conftest import auth_headers
+
+def _request(request_id, user_id, date, record_id=None):
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return CorrectionRequest(
+        id=request_id, user_id=user_id, attendance_record_id=record_id, requested_date=date,
+        requested_clock_in=day.replace(hour=9), requested_clock_out=day.replace(hour=18),
+        reason="打刻忘れ",
+    )
+
+def _batch_approve(client, decisions):
+    return client.post("/correction-request/batch-approve", headers=auth_headers("admin"), json={
+        "decisions": [{"request_id": request_id, "status": status} for request_id, status in decisions],
+    })
+
+def test_batch_approve_updates_and_creates_records(client, db):
+    db.add(AttendanceRecord(id=10, user_id=2, date="2024-03-04", status="present",
+                            clock_in=datetime(2024, 3, 4, 9, 30)))
+    db.add_all([
+        _request(1, 2, "2024-03-04", record_id=10),
+        _request(2, 2, "2024-03-05"),
+        _request(3, 3, "2024-03-05"),
+        _request(4, 3, "2024-03-06"),
+    ])
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+
+    response = _batch_approve(client, [(1, "approved"), (2, "approved"), (3, "approved"), (4, "rejected"), (99, "approved")])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["approved"], body["rejected"], body["failed"]) == (3, 1, 1)
+
+    records = {(r.user_id, r.date): r for r in db.query(AttendanceRecord)}
+    assert set(records) == {(2, "2024-03-04"), (2, "2024-03-05"), (3, "2024-03-05")}
+    assert records[(2, "2024-03-04")].clock_in == datetime(2024, 3, 4, 9, 0)
+    # 新規作成した記録の監査ログは変更前なし、既存の記録は変更前の値を残す
+    before = {event.target_id: event.before for event in db.query(AuditEvent)}
+    assert before[10] is not None
+    assert before[records[(2, "2024-03-05")].id] is None
+    assert verify_rollups(db) == []
+
+    # 処理済みの申請は再承認しない
+    assert _batch_approve(client, [(1, "approved")]).json()["failed"] == 1
+
+def test_record_created_concurrently_is_not_treated_as_new(client, db, monkeypatch):
+    db.add(_request(1, 2, "2024-03-05"))
+    # 一括承認が記録を読み込んだ後、作成する前に別の書き込みが同じ日付の記録を作成した状態
+    db.add(AttendanceRecord(id=20, user_id=2, date="2024-03-05", status="present",
+                            clock_in=datetime(2024, 3, 5, 10, 0)))
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+
+    records_by_key = corrections._records_by_key
+    calls = []
+
+    def stale_first_read(session, keys):
+        calls.append(keys)
+        return {} if len(calls) == 1 else records_by_key(session, keys)
+
+    monkeypatch.setattr(corrections, "_records_by_key", stale_first_read)
+    response = _batch_approve(client, [(1, "approved")])
+    assert response.status_code == 200, response.text
+    assert response.json()["approved"] == 1
+
+    event = db.query(AuditEvent).one()
+    assert event.target_id == 20
+    assert event.before is not None
+    assert verify_rollups(db) == []
+
+def test_single_approve_claims_request_once(client, db):
+    db.add(_request(1, 2, "2024-03-05"))
+    db.commit()
+    admin = auth_headers("admin")
+
+    response = client.put("/correction-request/1/approve", headers=admin, json={"status": "approved"})
+    assert response.status_code == 200, response.text
+    # 処理済みの申請（同時に処理された申請を含む）は反映せずに 409
+    response = client.put("/correction-request/1/approve", headers=admin, json={"status": "approved"})
+    assert response.status_code == 409
+    assert client.put("/correction-request/99/approve", headers=admin, json={"status": "approved"}).status_code == 404
+
+    assert db.query(AttendanceRecord).count() == 1
+    assert db.query(AuditEvent).count() == 1
+    assert verify_rollups(db) == []
+
+def test_single_approve_rejects_unknown_status(client, db):
+    db.add(_request(1, 2, "2024-03-05"))
+    db.commit()
+    response = client.put("/correction-request/1/approve", headers=auth_headers("admin"), json={"status": "pending"})
+    assert response.status_code == 400
+    db.expire_all()
+    assert db.get(CorrectionRequest, 1).status == "pending"
+
+def test_single_approve_falls_back_to_the_days_record(client, db):
+    """申請後に対象の記録が削除・作成し直された場合は、同じ日付の記録を修正する"""
+    db.add(AttendanceRecord(id=10, user_id=2, date="2024-03-05", status="present"))
+    db.add(_request(1, 2, "2024-03-05", record_id=10))
+    db.commit()
+    db.query(AttendanceRecord).filter(AttendanceRecord.id == 10).delete()
+    db.add(AttendanceRecord(id=20, user_id=2, date="2024-03-05", status="present",
+                            clock_in=datetime(2024, 3, 5, 10, 0)))
+    db.commit()
+    rebuild_rollups(db)
+    db.commit()
+
+    response = client.put("/correction-request/1/approve", headers=auth_headers("admin"), json={"status": "approved"})
+    assert response.status_code == 200, response.text
+    db.expire_all()
+    record = db.query(AttendanceRecord).one()
+    assert (record.id, record.clock_in) == (20, datetime(2024, 3, 5, 9, 0))
+    assert verify_rollups(db) == []
+
+def test_single_approve_conflict_returns_409_and_keeps_request_pending(client, db, monkeypatch):
+    db.add(_request(1, 2, "2024-03-05"))
+    db.commit()
+
+    def seq_collision(session, audit_events):
+        raise IntegrityError("INSERT INTO punch_events", {}, Exception("UNIQUE constraint failed"))
+
+    monkeypatch.setattr(corrections, "append_correction_events", seq_collision)
+    response = client.put("/correction-request/1/approve", headers=auth_headers("admin"), json={"status": "approved"})
+    assert response.status_code == 409
+    db.expire_all()
+    assert db.get(CorrectionRequest, 1).status == "pending"
+    assert db.query(AttendanceRecord).count() == 0
+
+def test_batch_approve_seq_collision_returns_409_and_keeps_requests_pending(client, db, monkeypatch):
+    """最後の seq を読んだ後に同じ日の打刻が書き込まれた場合、一意制約の違反で全件を取り消す"""
+    db.add(PunchEvent(user_id=2, date="2024-03-05", seq=1, action="clock_in",
+                      occurred_at=datetime(2024, 3, 5, 9, 0), projected=True))
+    db.add_all([_request(1, 2, "2024-03-05"), _request(2, 3, "2024-03-06")])
+    db.commit()
+    monkeypatch.setattr(punch_events, "last_seqs", lambda session, keys: {})
+
+    response = _batch_approve(client, [(1, "approved"), (2, "approved")])
+    assert response.status_code == 409
+    db.expire_all()
+    assert [r.status for r in db.query(CorrectionRequest).order_by(CorrectionRequest.id)] == ["pending", "pending"]
+    assert db.query(AttendanceRecord).count() == 0
+    assert db.query(PunchEvent).count() == 1
+
+def test_admin_list_query_count_does_not_grow_with_users(client, db):
+    """申請者・承認者は同じSELECTで取得する（ユーザー・申請の件数によらずクエリ数は一定）"""
+    admin = {**auth_headers("admin"), PROFILE_HEADER: "1"}
+
+    def query_count():
+        response = client.get("/correction-request/admin/all", headers=admin)
+        assert response.status_code == 200, response.text
+        return int(response.headers[QUERY_COUNT_HEADER]), response.json()
+
+    db.add(_request(1, 2, "2024-03-01"))
+    db.commit()
+    query_count()  # 認証済みユーザーをキャッシュに載せる
+    baseline, _ = query_count()
+
+    db.add_all([
+        User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", hashed_password="x",
+             full_name=f"User {user_id}")
+        for user_id in range(10, 40)
+    ])
+    db.add_all([_request(user_id, user_id, "2024-03-01") for user_id in range(10, 40)])
+    db.commit()
+    client.put("/correction-request/10/approve", headers=auth_headers("admin"), json={"status": "rejected"})
+
+    count, items = query_count()
+    assert count == baseline
+    assert len(items) == 31
+    rejected = next(item for item in items if item["id"] == 10)
+    assert (rejected["user"]["username"], rejected["approver"]["username"]) == ("user10", "admin")
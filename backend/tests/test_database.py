@@ -0,0 +1,34 @@
+"""
+SQLiteの接続設定（app/core/database.py の PRAGMA、GET /admin/database）
+"""
+from app.core.config import settings
+from app.core.database import engine
+from conftest import auth_headers
+
+def test_pragmas_are_applied_to_every_connection(db):
+    with engine.connect() as conn:
+        active = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                  for name in ("journal_mode", "busy_timeout", "synchronous", "cache_size", "temp_store", "mmap_size")}
+    assert active == {
+        "journal_mode": "wal",
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "synchronous": 1,  # NORMAL
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "temp_store": 2,  # MEMORY
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+    }
+
+def test_database_diagnostics_are_admin_only(client):
+    response = client.get("/admin/database", headers=auth_headers("admin"))
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["dialect"], body["async"]) == ("sqlite", settings.DB_ASYNC)
+    pragmas = body["pragmas"]
+    assert pragmas["journal_mode"] == {"configured": "WAL", "active": "wal"}
+    assert pragmas["synchronous"] == {"configured": "NORMAL", "active": "NORMAL"}
+    assert pragmas["temp_store"] == {"configured": "MEMORY", "active": "MEMORY"}
+    for name in ("busy_timeout", "cache_size", "mmap_size"):
+        assert pragmas[name]["active"] == pragmas[name]["configured"], name
+
+    assert client.get("/admin/database", headers=auth_headers("alice")).status_code == 403
+    assert client.get("/admin/database").status_code == 403
@@ -0,0 +1,75 @@
+"""
+一覧レスポンスの高速なJSON出力（app/services/fast_json.py）
+
+列の取得 + fast_json の応答が、従来の ORM → Pydantic → json（bench_json.legacy_body）とバイト単位で一致すること。
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.orm import joinedload
+
+from app.models import AttendanceRecord, CorrectionRequest
+from app.routers.attendance import _with_breaks
+from app.schemas import AttendanceResponse, CorrectionRequestAdminResponse
+from app.services import fast_json
+from bench_json import legacy_body
+from conftest import auth_headers
+
+def test_dumps_matches_the_default_encoder():
+    content = [{
+        "at": datetime(2024, 3, 4, 9, 0, 0, 123456),
+        "whole_second": datetime(2024, 3, 4, 9, 0),
+        "day": date(2024, 3, 4),
+        "none": None,
+        "float": 4500.5,
+        "integral_float": 3600.0,
+        "notes": "電車遅延のため",
+    }]
+    fallback = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=fast_json._default).encode("utf-8")
+    assert fast_json.dumps(content) == fallback
+    # Decimal はどちらのエンコーダーでも受け付けない（集計値は int / float に変換してから返す）
+    with pytest.raises(TypeError):
+        fast_json.dumps({"value": Decimal("1.5")})
+    with pytest.raises(TypeError):
+        json.dumps({"value": Decimal("1.5")}, default=fast_json._default)
+
+def test_attendance_list_matches_response_model(client, db):
+    db.add_all([
+        AttendanceRecord(user_id=2, date="2024-03-04", status="present", notes="電車遅延のため",
+                         clock_in=datetime(2024, 3, 4, 9, 0, 0, 123456), clock_out=datetime(2024, 3, 4, 18, 0),
+                         break_start=datetime(2024, 3, 4, 12, 0), break_end=datetime(2024, 3, 4, 13, 30),
+                         break_seconds=4500.5),
+        AttendanceRecord(user_id=2, date="2024-03-05", status="present", clock_in=datetime(2024, 3, 5, 9, 0),
+                         break_start=datetime(2024, 3, 5, 12, 0)),
+        AttendanceRecord(user_id=2, date="2024-03-06", status="absent"),
+    ])
+    db.commit()
+
+    response = client.get("/attendance/", headers=auth_headers("alice"))
+    assert response.status_code == 200
+    records = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).order_by(
+        AttendanceRecord.date.desc(), AttendanceRecord.id.desc()
+    ).all()
+    expected = legacy_body(_with_breaks(db, 2, records), AttendanceResponse)
+    assert response.content == expected
+
+def test_admin_correction_list_matches_response_model(client, db):
+    created = datetime(2024, 6, 1, 12, 0, 0, 123456)
+    db.add_all([
+        CorrectionRequest(user_id=2, requested_date="2024-03-04", requested_clock_in=datetime(2024, 3, 4, 9, 0),
+                          reason="打刻忘れ", status="approved", admin_notes="確認済み", approved_by=1,
+                          created_at=created, updated_at=created),
+        CorrectionRequest(user_id=3, requested_date="2024-03-05", requested_clock_out=datetime(2024, 3, 5, 18, 0),
+                          reason="退勤の打刻漏れ", created_at=datetime(2024, 6, 2), updated_at=None),
+    ])
+    db.commit()
+
+    response = client.get("/correction-request/admin/all", headers=auth_headers("admin"))
+    assert response.status_code == 200
+    requests = db.query(CorrectionRequest).options(
+        joinedload(CorrectionRequest.requester), joinedload(CorrectionRequest.approver)
+    ).order_by(CorrectionRequest.created_at.desc(), CorrectionRequest.id.desc()).all()
+    assert response.content == legacy_body(requests, CorrectionRequestAdminResponse)
@@ -0,0 +1,148 @@
+"""
+レガシーな backend/main.py の書き込みで月別ロールアップが勤怠記録と一致し続けること、
+打刻がイベントから勤怠記録を作ること、同時の書き込みでイベントの seq が競合した場合に
+409 を返すことを確認する
+"""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import main as legacy
+from app.core.database import engine
+from app.models import AttendanceRecord, CorrectionRequest, PunchEvent, User
+from app.services import punch
+from app.services.punch_events import replay_records
+from app.services.rollups import verify_rollups
+
+@pytest.fixture
+def client(db):
+    LegacySession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_test_db():
+        session = LegacySession()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    db.add_all([
+        User(id=1, username="admin", email="admin@example.com", hashed_password="x", full_name="Admin", is_admin=True),
+        User(id=2, username="alice", email="alice@example.com", hashed_password="x", full_name="Alice"),
+    ])
+    db.commit()
+    legacy.app.dependency_overrides[legacy.get_db] = get_test_db
+    try:
+        yield TestClient(legacy.app)
+    finally:
+        legacy.app.dependency_overrides.clear()
+
+def _headers(username: str) -> dict:
+    return {"Authorization": f"Bearer {legacy.create_access_token({'sub': username})}"}
+
+def test_punches_keep_rollups_in_sync(client, db):
+    alice = _headers("alice")
+    for action in ("clock_in", "break_start", "break_end", "clock_out"):
+        response = client.post("/attendance", json={"action": action}, headers=alice)
+        assert response.status_code == 200, response.text
+    assert client.post("/attendance", json={"action": "clock_out"}, headers=alice).status_code == 400
+    assert verify_rollups(db) == []
+
+def test_admin_corrections_keep_rollups_in_sync(client, db):
+    admin = _headers("admin")
+    response = client.post("/admin/attendance/create", headers=admin, json={
+        "user_id": 2, "date": "2024-03-01", "clock_in": "09:30", "clock_out": "18:00", "reason": "打刻忘れ",
+    })
+    assert response.status_code == 200, response.text
+    record_id = response.json()["record_id"]
+    response = client.put(f"/admin/attendance/{record_id}", headers=admin, json={
+        "user_id": 2, "date": "2024-03-01", "clock_in": "08:30", "break_start": "12:00", "break_end": "13:00",
+        "reason": "修正",
+    })
+    assert response.status_code == 200, response.text
+    assert verify_rollups(db) == []
+
+def test_approved_correction_requests_keep_rollups_in_sync(client, db):
+    db.add(AttendanceRecord(id=10, user_id=2, date="2024-03-04", status="present",
+                            clock_in=datetime(2024, 3, 4, 9, 0)))
+    db.add_all([
+        CorrectionRequest(id=1, user_id=2, attendance_record_id=10, requested_date="2024-03-04",
+                          requested_clock_in=datetime(2024, 3, 4, 9, 0),
+                          requested_clock_out=datetime(2024, 3, 4, 18, 0), reason="退勤忘れ"),
+        CorrectionRequest(id=2, user_id=2, requested_date="2024-04-01",
+                          requested_clock_in=datetime(2024, 4, 1, 10, 0),
+                          requested_clock_out=datetime(2024, 4, 1, 19, 0), reason="打刻忘れ"),
+    ])
+    db.commit()
+    # ロールアップを作成済みの状態から始める
+    from app.services.rollups import rebuild_rollups
+    rebuild_rollups(db)
+    db.commit()
+
+    admin = _headers("admin")
+    for request_id in (1, 2):
+        response = client.put(f"/admin/correction-requests/{request_id}", headers=admin,
+                              json={"status": "approved"})
+        assert response.status_code == 200, response.text
+    assert verify_rollups(db) == []
+
+def test_second_break_keeps_first_break_start(client, db):
+    alice = _headers("alice")
+    for action in ("clock_in", "break_start", "break_end", "break_start", "break_end", "clock_out"):
+        response = client.post("/attendance", json={"action": action}, headers=alice)
+        assert response.status_code == 200, response.text
+    assert client.post("/attendance", json={"action": "break_start"}, headers=alice).status_code == 400
+
+    record = db.query(AttendanceRecord).one()
+    first_break = db.query(PunchEvent).filter_by(action="break_start").order_by(PunchEvent.seq).first()
+    assert record.break_start == first_break.occurred_at
+    # 勤怠記録は backend/app と同じくイベントを畳み込んだ値
+    assert replay_records(db) == []
+    assert verify_rollups(db) == []
+
+def test_concurrent_punch_returns_409(client, db, monkeypatch):
+    append_events = punch.append_events
+
+    def racing_append_events(session, rows):
+        # seq を決めた後に、同じ seq のイベントが先に書き込まれた状態を作る
+        # （別の接続からは書き込みロックで待たされるため、同じセッションで書き込む）
+        session.execute(PunchEvent.__table__.insert().values(
+            user_id=rows[0]["user_id"], date=rows[0]["date"], seq=rows[0]["seq"],
+            action="clock_in", occurred_at=rows[0]["occurred_at"], created_at=rows[0]["created_at"],
+        ))
+        return append_events(session, rows)
+
+    monkeypatch.setattr(punch, "append_events", racing_append_events)
+    response = client.post("/attendance", json={"action": "clock_in"}, headers=_headers("alice"))
+    assert response.status_code == 409
+    assert response.json()["detail"] == legacy.CONCURRENT_UPDATE_DETAIL
+    # 打刻はロールバックされ、ロールアップも変わらない
+    assert db.query(PunchEvent).count() == 0
+    assert db.query(AttendanceRecord).count() == 0
+    assert verify_rollups(db) == []
+
+def test_concurrent_correction_event_seq_returns_409(client, db, monkeypatch):
+    admin = _headers("admin")
+    response = client.post("/admin/attendance/create", headers=admin, json={
+        "user_id": 2, "date": "2024-03-01", "clock_in": "09:30", "reason": "打刻忘れ",
+    })
+    record_id = response.json()["record_id"]
+    add_correction_event = legacy.add_correction_event
+
+    def racing_add_correction_event(session, record, actor_id):
+        add_correction_event(session, record, actor_id)
+        pending = next(obj for obj in session.new if isinstance(obj, legacy.PunchEvent))
+        session.execute(PunchEvent.__table__.insert().values(
+            user_id=pending.user_id, date=pending.date, seq=pending.seq,
+            action="clock_out", occurred_at=datetime(2024, 3, 1, 18, 0), created_at=datetime.utcnow(),
+        ))
+
+    monkeypatch.setattr(legacy, "add_correction_event", racing_add_correction_event)
+    response = client.put(f"/admin/attendance/{record_id}", headers=admin, json={
+        "user_id": 2, "date": "2024-03-01", "clock_out": "18:00", "reason": "退勤忘れ",
+    })
+    assert response.status_code == 409
+    assert response.json()["detail"] == legacy.CONCURRENT_UPDATE_DETAIL
+    assert db.query(AttendanceRecord).one().clock_out is None
+    assert verify_rollups(db) == []
@@ -0,0 +1,75 @@
+"""
+在席状況のライブフィード（app.services.live_feed、GET /admin/live）
+"""
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app.core.database import engine
+from app.routers import admin
+from app.services.live_feed import LiveFeed, LiveFeedFull, live_feed
+from conftest import auth_headers
+
+def test_subscribe_enforces_capacity():
+    feed = LiveFeed(queue_size=4, max_subscribers=2)
+
+    async def run():
+        first = feed.subscribe()
+        feed.subscribe()
+        with pytest.raises(LiveFeedFull):
+            feed.subscribe()
+        feed.unsubscribe(first)
+        feed.subscribe()
+        return feed.stats()["subscribers"]
+
+    assert asyncio.run(run()) == 2
+
+def test_slow_subscriber_is_dropped_without_blocking_others():
+    feed = LiveFeed(queue_size=2, max_subscribers=10)
+
+    async def run():
+        slow = feed.subscribe()
+        fast = feed.subscribe()
+        received = []
+        for i in range(3):
+            feed.publish("punch", {"n": i})
+            received.append(await fast.get(1))
+        return slow, received
+
+    slow, received = asyncio.run(run())
+    assert slow.dropped and slow.queue.get_nowait() is None
+    assert [b"event: punch" in message for message in received] == [True, True, True]
+    assert feed.stats() == {"subscribers": 1, "published": 3, "dropped": 1}
+
+def test_live_endpoint_returns_503_when_full(client, monkeypatch):
+    monkeypatch.setattr(live_feed, "max_subscribers", 0)
+    response = client.get("/admin/live", headers=auth_headers("admin"))
+    assert response.status_code == 503
+    assert client.get("/admin/live", headers=auth_headers("alice")).status_code == 403
+
+def test_snapshot_is_served_from_the_presence_index(client, db):
+    """接続時のスナップショットはインデックスから返し、DBを読まない"""
+    client.post("/attendance/", json={"action": "clock_in"}, headers=auth_headers("alice"))
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+
+    async def run():
+        stream = admin._live_stream(live_feed.subscribe())
+        try:
+            return await stream.__anext__()
+        finally:
+            await stream.aclose()
+
+    try:
+        message = asyncio.run(run())
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == []
+    assert message.startswith(b"event: snapshot\n")
+    data = json.loads(message.split(b"data: ", 1)[1])
+    assert data["counts"]["working"] == 1
+    assert [(u["user_id"], u["state"]) for u in data["users"]] == [(2, "working")]
+    assert live_feed.stats()["subscribers"] == 0
@@ -0,0 +1,20 @@
+"""
+メトリクス（GET /metrics）の認証
+"""
+from app.core.config import settings
+from conftest import auth_headers
+
+def test_metrics_requires_authentication(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer invalid"}).status_code == 401
+    assert client.get("/metrics", headers=auth_headers("alice")).status_code == 403
+
+def test_metrics_accepts_admin_token(client):
+    response = client.get("/metrics", headers=auth_headers("admin"))
+    assert response.status_code == 200
+    assert "principal_cache_hits_total" in response.text
+
+def test_metrics_accepts_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer other"}).status_code == 401
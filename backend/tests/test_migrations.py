@@ -0,0 +1,138 @@
+"""
+スキーマのマイグレーション（app.core.migrations）
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.migrations import LATEST_VERSION, MIGRATIONS, check_schema, current_version, migrate
+
+@pytest.fixture
+def empty_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    yield engine
+    engine.dispose()
+
+def test_migrate_creates_schema_once(empty_engine):
+    assert current_version(empty_engine) == 0
+    assert migrate(empty_engine) == [name for _, name, _ in MIGRATIONS]
+    assert current_version(empty_engine) == LATEST_VERSION
+    tables = set(inspect(empty_engine).get_table_names())
+    assert {"users", "attendance_records", "punch_events", "monthly_attendance_rollups"} <= tables
+    # 適用済みのマイグレーションは再実行しない
+    assert migrate(empty_engine) == []
+
+def test_check_schema_rejects_old_database(empty_engine):
+    with pytest.raises(RuntimeError):
+        check_schema(empty_engine)
+    assert check_schema(empty_engine, auto_migrate=True) == LATEST_VERSION
+    assert check_schema(empty_engine) == LATEST_VERSION
+
+def test_duplicate_records_are_merged_before_unique_index(empty_engine):
+    with empty_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE attendance_records (id INTEGER PRIMARY KEY, user_id INTEGER, date VARCHAR, "
+            "clock_in DATETIME, clock_out DATETIME, break_start DATETIME, break_end DATETIME, "
+            "notes TEXT, status VARCHAR, created_at DATETIME, updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO attendance_records (id, user_id, date, clock_in, clock_out, notes) VALUES "
+            "(1, 1, '2024-03-01', '2024-03-01 09:00:00.000000', NULL, 'a'), "
+            "(2, 1, '2024-03-01', '2024-03-01 08:50:00.000000', '2024-03-01 18:00:00.000000', 'b')"
+        ))
+    migrate(empty_engine)
+    with empty_engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, clock_in, clock_out FROM attendance_records")).all()
+    assert rows == [(1, "2024-03-01 08:50:00.000000", "2024-03-01 18:00:00.000000")]
+
+def test_future_updated_at_is_clamped_to_utc(empty_engine):
+    migrate(empty_engine)
+    local_ahead = datetime.utcnow() + timedelta(hours=9)
+    with empty_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO attendance_records (id, user_id, date, updated_at) VALUES (1, 1, '2024-03-01', :at)"
+        ), {"at": local_ahead.strftime("%Y-%m-%d %H:%M:%S.%f")})
+    apply = dict((name, fn) for _, name, fn in MIGRATIONS)["attendance_records_updated_at_utc"]
+    with empty_engine.begin() as conn:
+        apply(conn)
+        updated_at = conn.execute(text("SELECT updated_at FROM attendance_records")).scalar()
+    assert updated_at <= datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def test_baseline_migration_creates_only_initial_tables(empty_engine):
+    apply = dict((name, fn) for _, name, fn in MIGRATIONS)["create_tables"]
+    with empty_engine.begin() as conn:
+        apply(conn)
+    inspector = inspect(empty_engine)
+    assert set(inspector.get_table_names()) == {"users", "attendance_records", "correction_requests"}
+    assert "ux_attendance_records_user_date" not in {ix["name"] for ix in inspector.get_indexes("attendance_records")}
+
+def test_migrated_schema_matches_models(empty_engine):
+    # 各バージョンで追加したテーブル・列・インデックスが、最終的に現在のモデルと一致すること
+    from app.models import Base
+    migrate(empty_engine)
+    inspector = inspect(empty_engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == set(table.columns.keys()), table.name
+        indexes = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+def test_rollups_are_backfilled_with_pinned_sql(empty_engine):
+    """version 8 のロールアップ作成（固定したSQL）が、現在の集計と一致すること"""
+    from sqlalchemy.orm import Session
+    from app.services.rollups import verify_rollups
+    versions = dict((name, number) for number, name, _ in MIGRATIONS)
+    apply = dict((name, fn) for _, name, fn in MIGRATIONS)
+    for number, name, fn in MIGRATIONS:
+        if number >= versions["attendance_records_break_seconds"]:
+            break
+        with empty_engine.begin() as conn:
+            fn(conn)
+    with empty_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO users (id, username, email, hashed_password, full_name) VALUES "
+            "(1, 'alice', 'a@example.com', 'x', 'Alice'), (2, 'bob', 'b@example.com', 'x', 'Bob')"
+        ))
+        conn.execute(text(
+            "INSERT INTO attendance_records (id, user_id, date, clock_in, clock_out, break_start, break_end, status) VALUES "
+            "(1, 1, '2024-03-01', '2024-03-01 09:00:00.000000', '2024-03-01 18:00:00.000000', "
+            "'2024-03-01 12:00:00.000000', '2024-03-01 13:00:00.000000', 'present'), "
+            "(2, 1, '2024-03-04', '2024-03-04 09:30:00.000000', '2024-03-05 01:00:00.000000', NULL, NULL, 'present'), "
+            "(3, 1, '2024-04-01', '2024-04-01 08:55:00.000000', NULL, '2024-04-01 12:00:00.000000', NULL, 'present'), "
+            "(4, 2, '2024-03-01', NULL, NULL, NULL, NULL, 'absent')"
+        ))
+        apply["attendance_records_break_seconds"](conn)
+        rows = conn.execute(text(
+            "SELECT user_id, month, record_count, worked_seconds, late_count, absent_count "
+            "FROM monthly_attendance_rollups ORDER BY user_id, month"
+        )).all()
+    assert [(*row[:3], round(row[3]), *row[4:]) for row in rows] == [
+        (1, "2024-03", 2, (8 + 15.5) * 3600, 1, 0), (1, "2024-04", 1, 0, 0, 0), (2, "2024-03", 1, 0, 0, 1),
+    ]
+    with Session(empty_engine) as session:
+        assert verify_rollups(session) == []
+
+def test_existing_punch_events_are_marked_projected(empty_engine):
+    versions = dict((name, number) for number, name, _ in MIGRATIONS)
+    apply = dict((name, fn) for _, name, fn in MIGRATIONS)
+    for number, name, fn in MIGRATIONS:
+        if number >= versions["punch_events_projected"]:
+            break
+        with empty_engine.begin() as conn:
+            fn(conn)
+    with empty_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO punch_events (id, user_id, date, seq, action, occurred_at, created_at) VALUES "
+            "(1, 1, '2024-03-01', 1, 'clock_in', '2024-03-01 09:00:00', '2024-03-01 00:00:00')"
+        ))
+        apply["punch_events_projected"](conn)
+        # 以降に追記されるイベントは未反映
+        conn.execute(text(
+            "INSERT INTO punch_events (id, user_id, date, seq, action, occurred_at, created_at) VALUES "
+            "(2, 1, '2024-03-01', 2, 'clock_out', '2024-03-01 18:00:00', '2024-03-01 09:00:00')"
+        ))
+        rows = conn.execute(text("SELECT id, projected FROM punch_events ORDER BY id")).all()
+    assert rows == [(1, 1), (2, 0)]
+    inspector = inspect(empty_engine)
+    assert "ix_punch_events_unprojected" in {ix["name"] for ix in inspector.get_indexes("punch_events")}
@@ -0,0 +1,60 @@
+"""
+キーセット（カーソル）ページネーション（app/services/pagination.py）
+"""
+import base64
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models import CorrectionRequest
+from app.services.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from conftest import auth_headers
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 4, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42), datetime.fromisoformat) == (created_at, 42)
+    assert decode_cursor(encode_cursor("2024-03-04", 7)) == ("2024-03-04", 7)
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    base64.urlsafe_b64encode(b'{"a": 1}').decode("ascii"),
+    base64.urlsafe_b64encode(b'["2024-03-04T09:00:00"]').decode("ascii"),
+    base64.urlsafe_b64encode(b'["2024-03-04T09:00:00", "x"]').decode("ascii"),
+    encode_cursor("昨日", 1),
+])
+def test_malformed_cursor_is_rejected(client, cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, datetime.fromisoformat)
+    assert excinfo.value.status_code == 400
+
+    response = client.get("/correction-request/", params={"cursor": cursor}, headers=auth_headers("alice"))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "無効なカーソルです"
+
+def test_pages_break_created_at_ties_by_id(client, db):
+    same_time = datetime(2024, 3, 4, 9, 0)
+    later = datetime(2024, 3, 5, 9, 0)
+    db.add_all([
+        CorrectionRequest(id=request_id, user_id=2, requested_date="2024-03-01", reason="打刻忘れ",
+                          created_at=later if request_id in (2, 5) else same_time)
+        for request_id in range(1, 8)
+    ])
+    db.commit()
+
+    ids = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/correction-request/", params=params, headers=auth_headers("alice"))
+        assert response.status_code == 200, response.text
+        ids.extend(item["id"] for item in response.json())
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    # created_at の降順、同じ時刻は id の降順で、ページの境界をまたいでも重複・欠落がない
+    assert ids == [5, 2, 7, 6, 4, 3, 1]
+    assert pages == 4
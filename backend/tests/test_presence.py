@@ -0,0 +1,45 @@
+"""
+今日の在席状況のインデックス（app/services/presence.py、GET /admin/presence）
+"""
+from datetime import datetime
+
+from app.services.punch import apply_punch
+from app.services.punch_projection import catch_up
+from app.services.presence import presence_index
+from conftest import auth_headers
+
+def _today_at(hhmm: str) -> datetime:
+    return datetime.strptime(f"{datetime.now():%Y-%m-%d} {hhmm}", "%Y-%m-%d %H:%M")
+
+def test_presence_counts_follow_punches(client, db):
+    admin = auth_headers("admin")
+    for username, actions in (("alice", ["clock_in", "break_start"]), ("bob", ["clock_in"])):
+        for action in actions:
+            client.post("/attendance/", json={"action": action}, headers=auth_headers(username))
+
+    body = client.get("/admin/presence", headers=admin).json()
+    assert body["counts"] == {"working": 1, "on_break": 1, "clocked_out": 0}
+    assert [(u["user_id"], u["state"]) for u in body["users"]] == [(2, "on_break"), (3, "working")]
+
+    on_break = client.get("/admin/presence?state=on_break", headers=admin).json()
+    assert [u["user_id"] for u in on_break["users"]] == [2]
+    assert client.get("/admin/presence/1", headers=admin).json()["state"] == "not_clocked_in"
+    assert client.get("/admin/presence?state=away", headers=admin).status_code == 400
+    assert client.get("/admin/presence", headers=auth_headers("alice")).status_code == 403
+
+def test_rebuild_reports_the_current_break(client, db):
+    """2回目の休憩中は、最初の休憩ではなく今の休憩の開始を since にする"""
+    for hhmm, action in (("09:00", "clock_in"), ("10:00", "break_start"), ("11:00", "break_end"),
+                         ("12:00", "break_start")):
+        apply_punch(db, 2, action, now=_today_at(hhmm))
+    for hhmm, action in (("09:00", "clock_in"), ("10:00", "break_start"), ("10:30", "break_end")):
+        apply_punch(db, 3, action, now=_today_at(hhmm))
+    db.commit()
+    catch_up()
+
+    assert presence_index.rebuild() == 2
+    body = client.get("/admin/presence", headers=auth_headers("admin")).json()
+    assert body["counts"] == {"working": 1, "on_break": 1, "clocked_out": 0}
+    since = {u["user_id"]: (u["state"], u["since"]) for u in body["users"]}
+    assert since[2] == ("on_break", _today_at("12:00").isoformat())
+    assert since[3] == ("working", _today_at("10:30").isoformat())
@@ -0,0 +1,68 @@
+"""
+打刻のグループコミット（app.services.punch_buffer）
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.models import AttendanceRecord, PunchEvent
+from app.services.presence import presence_index
+from app.services.punch_buffer import PunchWriteBuffer
+from app.services.punch_projection import catch_up
+from app.services.rollups import verify_rollups
+from conftest import auth_headers
+
+def _submit_all(buffer: PunchWriteBuffer, punches: list) -> list:
+    async def run():
+        try:
+            return await asyncio.gather(*[buffer.submit(*punch) for punch in punches], return_exceptions=True)
+        finally:
+            await buffer.stop()
+    return asyncio.run(run())
+
+def test_batch_commits_valid_punches_and_rejects_invalid_ones(users, db):
+    buffer = PunchWriteBuffer(max_batch=16, window_ms=50)
+    results = _submit_all(buffer, [(2, "clock_in"), (3, "clock_in"), (2, "clock_in"), (3, "break_end")])
+
+    (alice_id, alice_at), (bob_id, bob_at) = results[0], results[1]
+    assert isinstance(results[2], HTTPException) and results[2].status_code == 400
+    assert isinstance(results[3], HTTPException) and results[3].status_code == 400
+    assert buffer.batches == 1 and buffer.punches == 4 and buffer.fallbacks == 0
+
+    events = {e.id: e for e in db.query(PunchEvent)}
+    assert (events[alice_id].user_id, events[alice_id].occurred_at) == (2, alice_at)
+    assert (events[bob_id].user_id, events[bob_id].occurred_at) == (3, bob_at)
+    assert len(events) == 2
+
+    catch_up()
+    records = {r.user_id: r for r in db.query(AttendanceRecord)}
+    assert (records[2].clock_in, records[3].clock_in) == (alice_at, bob_at)
+    assert verify_rollups(db) == []
+
+def test_failed_batch_falls_back_to_one_punch_at_a_time(users, db, monkeypatch):
+    def broken_batch(*args, **kwargs):
+        raise RuntimeError("まとめての書き込みに失敗")
+
+    monkeypatch.setattr("app.services.punch_buffer.apply_punches", broken_batch)
+    buffer = PunchWriteBuffer(max_batch=16, window_ms=50)
+    results = _submit_all(buffer, [(2, "clock_in"), (3, "clock_in")])
+
+    assert buffer.fallbacks == 1
+    assert [event_id for event_id, _ in results] == [
+        e.id for e in db.query(PunchEvent).order_by(PunchEvent.user_id)
+    ]
+    catch_up()
+    assert db.query(AttendanceRecord).count() == 2
+    assert verify_rollups(db) == []
+
+@pytest.mark.parametrize("group_commit", [False, True])
+def test_presence_uses_recorded_punch_time(client, db, monkeypatch, group_commit):
+    monkeypatch.setattr(settings, "PUNCH_GROUP_COMMIT", group_commit)
+    response = client.post("/attendance/", json={"action": "clock_in"}, headers=auth_headers("alice"))
+    assert response.status_code == 200, response.text
+
+    catch_up()
+    record = db.query(AttendanceRecord).filter(AttendanceRecord.user_id == 2).one()
+    assert presence_index.get(2)["since"] == record.clock_in
@@ -0,0 +1,114 @@
+"""
+打刻イベントの畳み込み（app/services/punch_events.py）と勤怠記録の休憩の値
+"""
+from datetime import datetime
+
+from app.models import AttendanceRecord, PunchEvent
+from app.services import punch_events, work_time
+from app.services.punch import apply_punch
+from app.services.punch_events import _key_chunks, last_seqs, load_events, load_records, replay_records
+from app.services.punch_projection import catch_up, pending_days
+from app.services.rollups import verify_rollups
+from conftest import auth_headers
+
+def _punch_day(db, user_id, punches):
+    for hhmm, action in punches:
+        apply_punch(db, user_id, action, now=datetime.strptime(f"2024-03-04 {hhmm}", "%Y-%m-%d %H:%M"))
+    db.commit()
+    catch_up()
+    return db.query(AttendanceRecord).filter_by(user_id=user_id, date="2024-03-04").one()
+
+def test_multiple_breaks_keep_real_boundaries(db, users):
+    record = _punch_day(db, 2, [
+        ("09:00", "clock_in"), ("10:00", "break_start"), ("10:15", "break_end"),
+        ("12:00", "break_start"), ("13:00", "break_end"), ("18:00", "clock_out"),
+    ])
+    assert record.break_start == datetime(2024, 3, 4, 10, 0)
+    assert record.break_end == datetime(2024, 3, 4, 13, 0)
+    assert record.break_seconds == 75 * 60
+    assert verify_rollups(db) == []
+    assert replay_records(db) == []
+
+    rows = work_time.fetch_work_time_rows(db, [AttendanceRecord.user_id == 2])
+    assert work_time.totals_from_rows(rows)[0]["break_hours"] == 1.25
+    assert work_time._totals_row_by_row(rows)[0]["break_hours"] == 1.25
+
+def test_single_break_is_the_break_span(db, users, client):
+    record = _punch_day(db, 2, [
+        ("09:00", "clock_in"), ("12:00", "break_start"), ("13:00", "break_end"), ("18:00", "clock_out"),
+    ])
+    # 1回の休憩は管理者の修正と同じく break_start〜break_end で表す
+    assert (record.break_start, record.break_end, record.break_seconds) == (
+        datetime(2024, 3, 4, 12, 0), datetime(2024, 3, 4, 13, 0), None
+    )
+    [item] = client.get("/attendance/", headers=auth_headers("alice")).json()
+    assert item["break_seconds"] == 3600
+
+def test_break_end_is_cleared_while_on_a_later_break(db, users):
+    record = _punch_day(db, 2, [
+        ("09:00", "clock_in"), ("10:00", "break_start"), ("10:15", "break_end"), ("12:00", "break_start"),
+    ])
+    assert (record.break_start, record.break_end) == (datetime(2024, 3, 4, 10, 0), None)
+    # 終了済みの休憩のみ合計する
+    assert record.break_seconds == 15 * 60
+
+def test_admin_correction_projects_pending_punches_first(db, client):
+    apply_punch(db, 2, "clock_in", now=datetime(2024, 3, 4, 9, 0))
+    db.commit()
+    response = client.post("/admin/attendance/correct", headers=auth_headers("admin"), json={
+        "user_id": 2, "date": "2024-03-04", "clock_out": "18:00", "reason": "退勤の打刻忘れ",
+    })
+    assert response.status_code == 200, response.text
+
+    catch_up()
+    record = db.query(AttendanceRecord).filter_by(user_id=2, date="2024-03-04").one()
+    assert (record.clock_in, record.clock_out) == (datetime(2024, 3, 4, 9, 0), datetime(2024, 3, 4, 18, 0))
+    assert verify_rollups(db) == []
+    assert replay_records(db) == []
+
+def test_admin_correction_seq_collision_returns_409(db, client, monkeypatch):
+    """最後の seq を読んだ後に同じ日の打刻が書き込まれた場合は、修正を取り消して 409"""
+    db.add(PunchEvent(user_id=2, date="2024-03-04", seq=1, action="clock_in",
+                      occurred_at=datetime(2024, 3, 4, 9, 0), projected=True))
+    db.commit()
+    monkeypatch.setattr(punch_events, "last_seqs", lambda session, keys: {})
+    response = client.post("/admin/attendance/correct", headers=auth_headers("admin"), json={
+        "user_id": 2, "date": "2024-03-04", "clock_out": "18:00", "reason": "退勤の打刻忘れ",
+    })
+    assert response.status_code == 409
+    db.expire_all()
+    assert db.query(AttendanceRecord).count() == 0
+    assert db.query(PunchEvent).count() == 1
+
+def test_event_committed_behind_a_larger_id_is_still_projected(db, users):
+    # PostgreSQL では小さいIDのイベントが大きいIDより後にコミットされることがある
+    db.add(PunchEvent(id=10, user_id=3, date="2024-03-04", seq=1, action="clock_in",
+                      occurred_at=datetime(2024, 3, 4, 9, 0)))
+    db.commit()
+    assert catch_up() == 1
+    db.add(PunchEvent(id=5, user_id=2, date="2024-03-04", seq=1, action="clock_in",
+                      occurred_at=datetime(2024, 3, 4, 9, 30)))
+    db.commit()
+
+    assert pending_days(db) == [(2, "2024-03-04")]
+    assert catch_up() == 1
+    assert pending_days(db) == []
+    record = db.query(AttendanceRecord).filter_by(user_id=2, date="2024-03-04").one()
+    assert record.clock_in == datetime(2024, 3, 4, 9, 30)
+
+def test_scattered_keys_read_only_the_requested_days(db, users, monkeypatch):
+    """離れた日付の (user_id, date) は、日付ごとに要求した user_id だけを条件にして読む（パラメータ数は _IN_CHUNK 以下）"""
+    for user_id, date in [(2, "2024-03-01"), (2, "2024-03-15"), (3, "2024-03-15"), (3, "2024-03-31"), (2, "2024-03-31")]:
+        apply_punch(db, user_id, "clock_in", now=datetime.strptime(f"{date} 09:00", "%Y-%m-%d %H:%M"))
+    db.commit()
+    catch_up()
+    keys = [(2, "2024-03-01"), (3, "2024-03-31"), (2, "2024-03-31"), (2, "2024-03-01")]
+    monkeypatch.setattr(punch_events, "_IN_CHUNK", 3)
+    chunks = _key_chunks(keys)
+    assert chunks == [[("2024-03-01", [2])], [("2024-03-31", [2, 3])]]
+    assert all(sum(len(user_ids) + 1 for _, user_ids in chunk) <= 3 for chunk in chunks)
+
+    requested = {(2, "2024-03-01"), (2, "2024-03-31"), (3, "2024-03-31")}
+    assert set(load_events(db, keys)) == requested
+    assert set(load_records(db, keys)) == requested
+    assert last_seqs(db, keys) == {key: 1 for key in requested}
@@ -0,0 +1,66 @@
+"""
+打刻データの一括取り込み（POST /admin/punches/import）
+"""
+import json
+
+from app.core.config import settings
+from app.models import AttendanceRecord, PunchEvent
+from app.services.rollups import verify_rollups
+from conftest import auth_headers
+
+CSV = """user_id,username,timestamp,action,notes
+2,,2024-03-04T18:00:00,clock_out,
+2,,2024-03-04T09:00:00,clock_in,朝
+,bob,2024-03-04T09:05:00,clock_in,
+,bob,2024-03-04T09:06:00,clock_in,
+,nobody,2024-03-04T09:00:00,clock_in,
+2,,not-a-time,clock_in,
+"""
+
+def _import(client, body, fmt="csv"):
+    return client.post(f"/admin/punches/import?format={fmt}", headers=auth_headers("admin"),
+                       content=body.encode("utf-8"))
+
+def test_csv_import_applies_valid_rows_in_time_order(client, db):
+    response = _import(client, CSV)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["received"], result["applied"], result["records_written"]) == (6, 3, 2)
+    # 2回目の出勤・存在しないユーザー・時刻の形式の誤りは行番号付きで返す
+    assert [error["row"] for error in result["errors"]] == [4, 5, 6]
+
+    records = {r.user_id: r for r in db.query(AttendanceRecord)}
+    assert records[2].clock_in.hour == 9 and records[2].clock_out.hour == 18
+    assert records[3].clock_out is None
+    assert db.query(PunchEvent).count() == 3
+    assert verify_rollups(db) == []
+
+def test_json_and_ndjson_formats(client, db):
+    punches = [
+        {"user_id": 2, "timestamp": "2024-03-05T09:00:00", "action": "clock_in"},
+        {"username": "bob", "timestamp": "2024-03-05T09:00:00", "action": "clock_in"},
+    ]
+    assert _import(client, json.dumps({"punches": punches[:1]}), "json").json()["applied"] == 1
+    assert _import(client, "\n".join(json.dumps(p) for p in punches[1:]), "ndjson").json()["applied"] == 1
+    assert db.query(AttendanceRecord).count() == 2
+    assert _import(client, "{", "json").status_code == 400
+    assert _import(client, "", "xml").status_code == 400
+
+def test_body_over_limit_is_rejected(client, db, monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_MAX_BYTES", 64)
+    response = _import(client, CSV)
+    assert response.status_code == 413
+    assert "100,000 件程度に分割" in response.json()["detail"]
+    assert db.query(AttendanceRecord).count() == 0
+
+    # Content-Length のない（チャンク転送の）ボディも読み込みの途中で打ち切る
+    def chunks():
+        for line in CSV.splitlines(keepends=True):
+            yield line.encode("utf-8")
+
+    response = client.post("/admin/punches/import?format=csv", headers=auth_headers("admin"), content=chunks())
+    assert response.status_code == 413
+
+def test_import_requires_admin(client):
+    response = client.post("/admin/punches/import?format=csv", headers=auth_headers("alice"), content=b"")
+    assert response.status_code == 403
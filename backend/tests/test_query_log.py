@@ -0,0 +1,33 @@
+"""
+リクエストごとのクエリプロファイル（X-Query-Profile ヘッダー、app/core/query_log.py）
+"""
+from app.core.query_log import PROFILE_HEADER, PROFILE_ID_HEADER, QUERY_COUNT_HEADER, query_profiles
+from conftest import auth_headers
+
+def test_profile_is_recorded_for_admin(client):
+    admin = auth_headers("admin")
+    response = client.get("/attendance/today", headers={**admin, PROFILE_HEADER: "1"})
+    assert response.status_code == 200
+    profile_id = response.headers[PROFILE_ID_HEADER]
+    assert int(response.headers[QUERY_COUNT_HEADER]) > 0
+
+    profile = client.get(f"/admin/query-profiles/{profile_id}", headers=admin).json()
+    assert (profile["route"], profile["user"]) == ("GET /attendance/today", "admin")
+    assert profile["query_count"] == int(response.headers[QUERY_COUNT_HEADER])
+
+    # ヘッダーなしのリクエストはプロファイルを作らない
+    assert PROFILE_ID_HEADER not in client.get("/attendance/today", headers=admin).headers
+
+def test_profile_header_is_ignored_for_non_admin(client):
+    query_profiles.clear()
+    alice = auth_headers("alice")
+    response = client.get("/attendance/today", headers={**alice, PROFILE_HEADER: "1"})
+    assert response.status_code == 200
+    assert PROFILE_ID_HEADER not in response.headers
+    assert QUERY_COUNT_HEADER not in response.headers
+    assert query_profiles.values() == []
+
+    # 未認証のリクエストも同様（プロファイルの一覧・内容も管理者のみ）
+    response = client.get("/attendance/today", headers={PROFILE_HEADER: "1"})
+    assert PROFILE_ID_HEADER not in response.headers
+    assert client.get("/admin/query-profiles", headers=alice).status_code == 403
@@ -0,0 +1,66 @@
+"""
+勤怠サマリーレポート（GET /reports/attendance-summary）
+"""
+import json
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models import AttendanceRecord
+from app.routers import reports
+from conftest import auth_headers
+
+def test_ndjson_rows_match_json_endpoint_bytes(client, db):
+    db.add_all([
+        AttendanceRecord(user_id=2, date="2024-03-04", status="present", notes="通常",
+                         clock_in=datetime(2024, 3, 4, 9, 0), clock_out=datetime(2024, 3, 4, 18, 0),
+                         break_start=datetime(2024, 3, 4, 12, 0), break_end=datetime(2024, 3, 4, 13, 0)),
+        AttendanceRecord(user_id=3, date="2024-03-04", status="absent"),
+    ])
+    db.commit()
+    admin = auth_headers("admin")
+
+    summary = client.get("/reports/attendance-summary", headers=admin).json()["summary"]
+    response = client.get("/reports/attendance-summary?format=ndjson", headers=admin)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.content.decode("utf-8").splitlines()
+    # JSONのエンドポイントと同じ区切り（空白なし）・非ASCIIはそのまま
+    assert lines == [json.dumps(row, ensure_ascii=False, separators=(",", ":")) for row in summary]
+    assert "通常" in lines[0]
+
+def test_vectorized_summary_matches_row_by_row(client, db, monkeypatch):
+    """VECTORIZE_MIN_ROWS 件ちょうどでNumPyの一括計算に切り替わっても、行ごとの計算と同じ結果になる"""
+    pytest.importorskip("numpy")
+    db.add_all([
+        AttendanceRecord(user_id=2, date="2024-03-04", status="present",
+                         clock_in=datetime(2024, 3, 4, 9, 0), clock_out=datetime(2024, 3, 4, 18, 0),
+                         break_start=datetime(2024, 3, 4, 12, 0), break_end=datetime(2024, 3, 4, 13, 0)),
+        # 休憩時間の合計がある記録（複数回の休憩）
+        AttendanceRecord(user_id=2, date="2024-03-05", status="present",
+                         clock_in=datetime(2024, 3, 5, 8, 55, 30), clock_out=datetime(2024, 3, 5, 17, 20, 10),
+                         break_start=datetime(2024, 3, 5, 15, 0), break_end=datetime(2024, 3, 5, 15, 10),
+                         break_seconds=4500.5),
+        # 退勤なし・休憩中
+        AttendanceRecord(user_id=2, date="2024-03-06", status="present",
+                         clock_in=datetime(2024, 3, 6, 9, 0), break_start=datetime(2024, 3, 6, 12, 0)),
+        AttendanceRecord(user_id=3, date="2024-03-04", status="late",
+                         clock_in=datetime(2024, 3, 4, 10, 17, 45, 250000), clock_out=datetime(2024, 3, 4, 19, 3)),
+        AttendanceRecord(user_id=3, date="2024-03-05", status="absent"),
+    ])
+    db.commit()
+    admin = auth_headers("admin")
+    calls = []
+    vectorized = reports._summary_rows_vectorized
+    monkeypatch.setattr(reports, "_summary_rows_vectorized", lambda rows: calls.append(len(rows)) or vectorized(rows))
+
+    monkeypatch.setattr(settings, "VECTORIZE_MIN_ROWS", 6)
+    row_by_row = client.get("/reports/attendance-summary", headers=admin).json()
+    monkeypatch.setattr(settings, "VECTORIZE_MIN_ROWS", 5)
+    response = client.get("/reports/attendance-summary", headers=admin).json()
+
+    assert calls == [5]
+    assert response == row_by_row
+    assert [(row["work_hours"], row["break_hours"]) for row in response["summary"]] == [
+        (8.0, 1.0), (7.16, 1.25), (0.0, 0.0), (8.75, 0.0), (0.0, 0.0)
+    ]
@@ -0,0 +1,68 @@
+"""
+認証ユーザーキャッシュ（app/core/security.py）
+"""
+import asyncio
+
+from app.core.principal_generation import bump_principal_generation
+from app.core.security import (
+    PrincipalGenerationWatcher, _load_principal, invalidate_principal, principal_cache, principal_watcher,
+)
+from app.models import User
+from conftest import auth_headers
+
+def test_principal_loaded_before_invalidation_is_not_cached(db, users):
+    # 読み込み中に管理者が権限を変更し invalidate_principal() が走った場合を再現
+    generation = principal_cache.generation
+    stale = _load_principal(db, "alice", generation)
+    db.get(User, 2).is_admin = True
+    db.commit()
+    invalidate_principal("alice")
+    _load_principal(db, "alice", generation)
+
+    assert stale.is_admin is False
+    assert principal_cache.get("alice") is None
+
+    fresh = _load_principal(db, "alice", principal_cache.generation)
+    assert fresh.is_admin is True
+    assert principal_cache.get("alice") == fresh
+
+def test_cached_principal_is_used_until_invalidated(client, db):
+    assert client.get("/admin/cache-stats", headers=auth_headers("alice")).status_code == 403
+    db.get(User, 2).is_admin = True
+    db.commit()
+    assert client.get("/admin/cache-stats", headers=auth_headers("alice")).status_code == 403
+
+    invalidate_principal("alice")
+    assert client.get("/admin/cache-stats", headers=auth_headers("alice")).status_code == 200
+
+def test_demoted_admin_loses_access_on_the_next_request(client, db):
+    """プロセス外（create_admin.py）で権限を解除して世代を進めると、世代の確認後のリクエストから 403"""
+    admin = auth_headers("admin")
+    assert client.get("/admin/cache-stats", headers=admin).status_code == 200
+    db.get(User, 1).is_admin = False
+    bump_principal_generation(db)
+    db.commit()
+
+    assert principal_watcher.check() is True
+    assert client.get("/admin/cache-stats", headers=admin).status_code == 403
+    # 世代が変わらなければキャッシュは空にしない
+    assert principal_watcher.check() is False
+    assert principal_cache.get("admin") is not None
+
+def test_watcher_task_clears_the_cache_when_the_generation_changes(db, users):
+    watcher = PrincipalGenerationWatcher(interval_ms=10)
+
+    async def run():
+        await watcher.start()
+        principal_cache.set("alice", "stale")
+        bump_principal_generation(db)
+        db.commit()
+        for _ in range(200):
+            if watcher.invalidations:
+                break
+            await asyncio.sleep(0.01)
+        await watcher.stop()
+
+    asyncio.run(run())
+    assert watcher.invalidations == 1
+    assert principal_cache.get("alice") is None